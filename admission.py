@@ -0,0 +1,148 @@
+"""
+Admission Module - per-client/per-patron rate limiting and a write concurrency cap
+
+init_app() installs a before_request hook that runs ahead of any database
+work. Requests to a rate-limited blueprint spend one token from the client's
+bucket (keyed by remote address) and, when the request names a patron, one
+from that patron's bucket; requests with a write method also need a free slot
+under the process-wide write concurrency cap. Rejected requests get an
+immediate 429 with Retry-After. Limits are process-local: with several
+worker processes each one enforces them separately.
+
+Configured through app.config:
+    ADMISSION_CONTROL            False turns every check off
+    RATE_LIMITS                  {blueprint: (tokens per second, burst)}
+    MAX_CONCURRENT_WRITES        write requests in progress at once (None: no cap)
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from flask import Response, current_app, g, jsonify, request
+
+from metrics import ADMISSION_DECISIONS
+
+WRITE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+# Buckets kept per limiter; the least recently used are dropped beyond this
+MAX_TRACKED_KEYS = 10000
+
+class TokenBucketLimiter:
+    """Token buckets refilled at `rate` per second up to `burst`, one per key."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last refill time]
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable) -> float:
+        """Take a token for `key`. Returns 0 if admitted, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate if self.rate > 0 else float('inf')
+
+class Admission:
+    """Limiter state for one app."""
+
+    def __init__(self):
+        self.limiters = {}
+        self.write_slots = None
+        self.write_slots_size = None
+        self._lock = threading.Lock()
+
+    def limiter(self, blueprint: str, rate: float, burst: float) -> TokenBucketLimiter:
+        limiter = self.limiters.get(blueprint)
+        if limiter is None or (limiter.rate, limiter.burst) != (rate, burst):
+            with self._lock:
+                limiter = self.limiters.get(blueprint)
+                if limiter is None or (limiter.rate, limiter.burst) != (rate, burst):
+                    limiter = self.limiters[blueprint] = TokenBucketLimiter(rate, burst)
+        return limiter
+
+    def write_semaphore(self, size: int) -> threading.BoundedSemaphore:
+        if self.write_slots_size != size:
+            with self._lock:
+                if self.write_slots_size != size:
+                    self.write_slots = threading.BoundedSemaphore(size)
+                    self.write_slots_size = size
+        return self.write_slots
+
+def _request_patron_id() -> Optional[str]:
+    """The patron a request acts for: from the URL, a form field or a JSON body."""
+    patron_id = (request.view_args or {}).get('patron_id')
+    if patron_id is None and request.method in WRITE_METHODS:
+        if request.is_json:
+            body = request.get_json(silent=True)
+            patron_id = body.get('patron_id') if isinstance(body, dict) else None
+        else:
+            patron_id = request.form.get('patron_id')
+    patron_id = str(patron_id).strip() if patron_id is not None else ''
+    return patron_id or None
+
+def _reject(blueprint: str, reason: str, retry_after: float) -> Response:
+    ADMISSION_DECISIONS.inc(blueprint=blueprint, decision='rejected', reason=reason)
+    seconds = max(1, math.ceil(retry_after))
+    if blueprint == 'api':
+        response = jsonify({'error': 'Too many requests', 'retry_after': seconds})
+    else:
+        response = Response('Too many requests, please retry shortly.\n', mimetype='text/plain')
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+def _admit():
+    config = current_app.config
+    if not config.get('ADMISSION_CONTROL', True):
+        return None
+    admission = current_app.extensions['admission']
+    blueprint = request.blueprint or ''
+
+    limits = (config.get('RATE_LIMITS') or {}).get(blueprint)
+    if limits is not None:
+        limiter = admission.limiter(blueprint, *limits)
+        wait = limiter.acquire(('client', request.remote_addr))
+        if wait:
+            return _reject(blueprint, 'client_rate', wait)
+        patron_id = _request_patron_id()
+        if patron_id is not None:
+            wait = limiter.acquire(('patron', patron_id))
+            if wait:
+                return _reject(blueprint, 'patron_rate', wait)
+
+    max_writes = config.get('MAX_CONCURRENT_WRITES')
+    if max_writes is not None and request.method in WRITE_METHODS:
+        slots = admission.write_semaphore(max_writes)
+        if not slots.acquire(blocking=False):
+            return _reject(blueprint, 'write_concurrency', 1)
+        g._admission_write_slot = slots
+
+    ADMISSION_DECISIONS.inc(blueprint=blueprint, decision='admitted', reason='')
+    return None
+
+def _release(exc=None):
+    slots = g.pop('_admission_write_slot', None)
+    if slots is not None:
+        slots.release()
+
+def init_app(app):
+    """Install the admission check; register it before hooks that touch the database."""
+    app.extensions['admission'] = Admission()
+    app.before_request(_admit)
+    app.teardown_request(_release)
@@ -5,26 +5,76 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+
 from flask import Flask
+import admission
+import database
+import fragments
+import metrics
 from database import init_database, add_sample_data
 from routes import register_blueprints
+from routes.encoding import DEFAULT_JSON_ENCODER
 
 
-def create_app():
+def create_app(init_db=True):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        init_db: Create/migrate the schema and add sample data. The production
+                 server (gunicorn.conf.py) does this once in the master process
+                 and passes False from each worker.
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.config['CATALOG_PAGE_SIZE'] = 50
+    app.config['CATALOG_MAX_PAGE_SIZE'] = 500
+    app.config['CATALOG_STREAM_BATCH_SIZE'] = 500
+    app.config['SLOW_REQUEST_THRESHOLD'] = 0.5  # seconds; None disables the slow-request log
+    
+    # Admission control (see admission.py): token buckets per client and per
+    # patron, as (requests per second, burst), and a cap on concurrent writes
+    app.config['ADMISSION_CONTROL'] = True
+    app.config['RATE_LIMITS'] = {
+        'api': (20.0, 40),
+        'borrowing': (2.0, 10),
+        'search': (10.0, 20),
+    }
+    app.config['MAX_CONCURRENT_WRITES'] = 32
+    
+    # Rendered-fragment caches and the on-disk template bytecode cache (see fragments.py)
+    app.config['FRAGMENT_CACHE_SIZE'] = 20000
+    app.config['SEARCH_RESULTS_CACHE_SIZE'] = 512
+    app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('LIBRARY_TEMPLATE_CACHE_DIR')
+    
+    # api blueprint responses (see routes/encoding.py): JSON encoder, and gzip/deflate
+    # for bodies of at least API_COMPRESSION_MIN_SIZE bytes at a latency-friendly level
+    app.config['API_JSON_ENCODER'] = DEFAULT_JSON_ENCODER
+    app.config['API_COMPRESSION_MIN_SIZE'] = 1024
+    app.config['API_COMPRESSION_LEVEL'] = 1
+    
+    if init_db:
+        # Initialize the database
+        init_database()
+        
+        # Add sample data for testing and demonstration
+        add_sample_data()
+    
+    # Cached row and search-result fragments, precompiled templates
+    fragments.init_app(app)
+    
+    # Per-request latency and SQL timing, exported on /metrics
+    metrics.init_app(app)
     
-    # Initialize the database
-    init_database()
+    # Shed excess load before a request checks out a database connection
+    admission.init_app(app)
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Reuse one pooled connection per request
+    database.init_app(app)
     
     # Register all route blueprints
     register_blueprints(app)
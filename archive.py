@@ -0,0 +1,33 @@
+"""
+Archive - move long-returned loans out of the hot borrow_records table
+
+Run it periodically (e.g. nightly from cron); it works in short batches, so it
+is safe to run while the app is serving.
+
+Usage:
+    python archive.py [--days 365] [--batch-size 500] [--pause 0.01]
+"""
+
+import argparse
+import sys
+
+from database import init_database
+from library_service import archive_old_loans, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archive loans returned more than N days ago.')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f'archive loans returned more than this many days ago (default: {ARCHIVE_AFTER_DAYS})')
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                        help='loans moved per write transaction')
+    parser.add_argument('--pause', type=float, default=0.01,
+                        help='seconds to sleep between batches, leaving the write lock to the app')
+    args = parser.parse_args(argv)
+
+    init_database()
+    moved = archive_old_loans(args.days, args.batch_size, args.pause)
+    print(f'Archived {moved} loans.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
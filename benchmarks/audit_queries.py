@@ -0,0 +1,76 @@
+"""
+Query-plan audit: EXPLAIN QUERY PLAN for every statement the service layer runs.
+
+Seeds a synthetic catalog and loan history in a temporary database, runs
+ANALYZE, exercises the service functions (query_audit.run_service_calls) and
+prints each distinct statement with its plan. Exits with status 1 when a
+hot-path statement scans a table instead of using an index, or a hot-path
+call runs more statements than its budget (query_audit.HOT_PATHS).
+
+Usage:
+    python benchmarks/audit_queries.py [--scale 1k|100k|1m] [--verbose]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from query_audit import QueryAudit, run_service_calls
+from seed import seed_database
+from suite import SCALES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Audit the query plans of the service layer.')
+    parser.add_argument('--scale', choices=SCALES, default='100k')
+    parser.add_argument('--verbose', action='store_true', help='print every statement and its plan')
+    args = parser.parse_args(argv)
+    scale = SCALES[args.scale]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db_connections()
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.CACHE_SIZE = 0  # every call must reach SQLite to be audited
+        database.init_database()
+        seed_start = time.perf_counter()
+        seed_database(scale['books'], scale['loans'], scale['patrons'])
+        conn = database.get_db_connection()
+        conn.execute('ANALYZE')
+        conn.commit()
+        conn.close()
+        print(f'Seeded {scale["books"]} books and {scale["loans"]} loans '
+              f'in {time.perf_counter() - seed_start:.1f}s')
+
+        with QueryAudit() as audit:
+            run_service_calls(audit, [1, 2, 3], ['100001', '100002'])
+        report = audit.report()
+        database.close_db_connections()
+
+    if args.verbose:
+        for sql, plan in report['plans'].items():
+            print(f'\n[{", ".join(sorted(audit.statements[sql]))}] {sql}')
+            for step in plan:
+                print(f'    {step}')
+        print()
+
+    print(f'{"call":<40} {"statements":>10} {"budget":>8}')
+    for name, count in audit.max_queries.items():
+        budget = audit.hot_paths.get(name)
+        print(f'{name:<40} {count:>10} {budget if budget is not None else "-":>8}')
+
+    for call, sql, step in report['scans']:
+        print(f'SCAN in {call}: {step}\n    {sql}')
+    for call, count, budget in report['over_budget']:
+        print(f'OVER BUDGET {call}: {count} statements, budget {budget}')
+    failed = bool(report['scans'] or report['over_budget'])
+    print(f'{len(report["plans"])} statements audited: {"FAILED" if failed else "ok"}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
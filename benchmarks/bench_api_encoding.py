@@ -0,0 +1,81 @@
+"""
+API encoding benchmark: serialization time and bytes on the wire for /api/search.
+
+Seeds a synthetic catalog, then requests broad searches through the test
+client with each JSON encoder, each content coding and compression level,
+and with a ?fields= projection. Prints the median time per request, the
+time spent serializing alone and the response size.
+
+Usage:
+    python benchmarks/bench_api_encoding.py [--books 100000] [--iterations 20]
+                                            [--levels 1,6,9] [--query the]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import create_app
+from routes.encoding import JSON_ENCODERS
+from seed import seed_database
+
+
+def median_ms(func, iterations):
+    func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='JSON encoder and compression comparison.')
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--levels', default='1,6,9', help='comma-separated compression levels')
+    parser.add_argument('--query', default='the', help='search term (broad terms give big payloads)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db_connections()
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        app = create_app()
+        app.config['ADMISSION_CONTROL'] = False  # one client issuing every request
+        seed_database(args.books)
+        client = app.test_client()
+        url = f'/api/search?q={args.query}&type=title'
+        payload = client.get(url).get_json()
+        print(f'{args.books} books, {url}: {payload["count"]} results')
+
+        print(f'\n{"encoder":<10} {"serialize ms":>14}')
+        with app.app_context():
+            for name, encoder in JSON_ENCODERS.items():
+                print(f'{name:<10} {median_ms(lambda: encoder(payload), args.iterations):>14.2f}')
+
+        cases = [('flask', None, 1, ''), ('orjson', None, 1, '')]
+        cases += [('orjson', coding, int(level), '') for coding in ('gzip', 'deflate')
+                  for level in args.levels.split(',')]
+        cases += [('orjson', None, 1, '&fields=id,title'), ('orjson', 'gzip', 1, '&fields=id,title')]
+        print(f'\n{"encoder":<8} {"coding":<9} {"level":>5} {"fields":<10} {"request ms":>11} {"bytes":>12}')
+        for encoder, coding, level, fields in cases:
+            app.config['API_JSON_ENCODER'] = encoder
+            app.config['API_COMPRESSION_LEVEL'] = level
+            headers = {'Accept-Encoding': coding or 'identity'}
+            request = lambda: client.get(url + fields, headers=headers)
+            elapsed = median_ms(request, args.iterations)
+            size = len(request().get_data())
+            print(f'{encoder:<8} {coding or "identity":<9} {level if coding else "-":>5} '
+                  f'{fields[8:] or "all":<10} {elapsed:>11.2f} {size:>12,}')
+        database.close_db_connections()
+
+
+if __name__ == '__main__':
+    main()
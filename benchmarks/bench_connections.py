@@ -0,0 +1,78 @@
+"""
+Connection overhead benchmark for the /catalog and /borrow paths.
+
+Runs the same requests through Flask's test client twice: once with pooling
+disabled (POOL_SIZE = 0, i.e. a fresh sqlite3.connect() per helper call, which
+is how the app used to behave) and once with the default connection pool.
+
+Usage:
+    python benchmarks/bench_connections.py [--books 500] [--requests 300]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import create_app
+
+
+def seed_books(count):
+    """Insert `count` synthetic books with plenty of copies to borrow."""
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(f'Book {i:06d}', f'Author {i % 97}', f'{9780000000000 + i}', 1000, 1000)
+          for i in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def time_requests(client, n, make_request):
+    """Return the mean latency in milliseconds of `n` calls to make_request."""
+    start = time.perf_counter()
+    for i in range(n):
+        make_request(client, i)
+    return (time.perf_counter() - start) * 1000 / n
+
+
+def run(pool_size, books, n):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db_connections()
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.POOL_SIZE = pool_size
+        app = create_app()
+        app.config['ADMISSION_CONTROL'] = False
+        seed_books(books)
+        client = app.test_client()
+
+        opened_before = database.get_pool().opened
+        catalog_ms = time_requests(client, n, lambda c, i: c.get('/catalog'))
+        borrow_ms = time_requests(client, n, lambda c, i: c.post('/borrow', data={
+            'patron_id': f'{100000 + i // 5:06d}',
+            'book_id': str(i % books + 1),
+        }))
+        opened = database.get_pool().opened - opened_before
+        database.close_db_connections()
+    return catalog_ms, borrow_ms, opened
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f'{"mode":<10} {"/catalog ms":>12} {"/borrow ms":>12} {"connections":>12}')
+    for label, size in (('unpooled', 0), ('pooled', database.POOL_SIZE)):
+        catalog_ms, borrow_ms, opened = run(size, args.books, args.requests)
+        print(f'{label:<10} {catalog_ms:>12.3f} {borrow_ms:>12.3f} {opened:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Group-commit benchmark: borrow/return throughput and latency under contention.
+
+Many threads borrow and return books as fast as they can, first with every
+write in its own transaction and then through the group-commit writer at
+several batching windows. Prints operations/second, p50/p99 latency, the
+average batch size and how many operations failed (e.g. "database is locked").
+
+Usage:
+    python benchmarks/bench_group_commit.py [--threads 32] [--duration 5]
+                                            [--windows 0,0.001,0.002,0.005]
+                                            [--synchronous NORMAL|FULL]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from library_service import borrow_book_by_patron, return_book_by_patron
+from suite import percentile
+
+
+def seed_books(count):
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(f'Book {i:06d}', 'Author', f'{9780000000000 + i}', 1000, 1000) for i in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def worker(index, books, deadline, latencies, failures):
+    patron_id = f'{700000 + index:06d}'
+    book_id = index % books + 1
+    while time.perf_counter() < deadline:
+        for operation in (borrow_book_by_patron, return_book_by_patron):
+            start = time.perf_counter()
+            success, message = operation(patron_id, book_id)
+            latencies.append(time.perf_counter() - start)
+            if not success:
+                failures.append(message)
+
+
+def run(group_commit, window, threads, duration, books):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db_connections()
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.GROUP_COMMIT = group_commit
+        database.GROUP_COMMIT_WINDOW = window
+        database.init_database()
+        seed_books(books)
+
+        latencies, failures = [], []
+        deadline = time.perf_counter() + duration
+        pool = [threading.Thread(target=worker, args=(i, books, deadline, latencies, failures))
+                for i in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+        writer = database.get_group_commit_writer()
+        batch = writer.jobs / writer.batches if writer and writer.batches else 1.0
+        database.close_db_connections()
+
+    latencies.sort()
+    return {
+        'ops_per_sec': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'batch': batch,
+        'failures': len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Group-commit throughput vs. latency.')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--books', type=int, default=100)
+    parser.add_argument('--windows', default='0,0.001,0.002,0.005',
+                        help='comma-separated group-commit windows in seconds')
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'],
+                        help='PRAGMA synchronous (FULL fsyncs every commit)')
+    args = parser.parse_args()
+
+    database.PRAGMAS = tuple((name, args.synchronous if name == 'synchronous' else value)
+                             for name, value in database.PRAGMAS)
+    print(f'{args.threads} threads, synchronous={args.synchronous}')
+    print(f'{"mode":<22} {"ops/s":>10} {"p50 ms":>10} {"p99 ms":>10} {"batch":>8} {"failed":>8}')
+    modes = [('per-transaction', False, 0.0)] + [
+        (f'group commit {float(w) * 1000:g} ms', True, float(w)) for w in args.windows.split(',')]
+    for name, group_commit, window in modes:
+        stats = run(group_commit, window, args.threads, args.duration, args.books)
+        print(f'{name:<22} {stats["ops_per_sec"]:>10.1f} {stats["p50_ms"]:>10.3f} '
+              f'{stats["p99_ms"]:>10.3f} {stats["batch"]:>8.1f} {stats["failures"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
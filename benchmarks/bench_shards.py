@@ -0,0 +1,77 @@
+"""
+Shard benchmark: scatter-gather search latency as the catalog is split across more shards.
+
+Builds the same synthetic catalog as one database and as 2, 4, 8 ... shard
+files, then times search_books() for a selective term, a broad term with a
+page limit, and the broad term unlimited. Prints the median and p95 latency
+per shard count.
+
+Usage:
+    python benchmarks/bench_shards.py [--books 100000] [--shards 1,2,4,8]
+                                      [--iterations 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from seed import book_rows
+
+QUERIES = (
+    ('selective', 'orchard 12', 20),
+    ('broad, limit 20', 'river', 20),
+    ('broad, all', 'river', None),
+)
+
+
+def build(tmp, shard_count, books):
+    """Point the database module at a fresh catalog of `shard_count` shards (1: unsharded)."""
+    database.close_db_connections()
+    database.DATABASE = os.path.join(tmp, f'single-{shard_count}.db')
+    database.SHARDS = () if shard_count == 1 else tuple(
+        os.path.join(tmp, f'shard{shard_count}-{index}.db') for index in range(shard_count))
+    database.init_database()
+    rows = [(title, author, isbn, copies) for title, author, isbn, copies, _ in book_rows(books, 10)]
+    for start in range(0, len(rows), 10000):
+        assert database.insert_books(rows[start:start + 10000]) == set()
+
+
+def latency_ms(term, limit, iterations):
+    database.search_books(term, 'title', limit)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        database.search_books(term, 'title', limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sharded search latency.')
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--shards', default='1,2,4,8', help='comma-separated shard counts')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    database.CACHE_SIZE = 0
+    print(f'{args.books} books, {os.cpu_count()} CPU(s)')
+    print(f'\n{"shards":>6} ' + ' '.join(f'{name:>26}' for name, _, _ in QUERIES))
+    print(f'{"":>6} ' + ' '.join(f'{"p50 ms":>12} {"p95 ms":>13}' for _ in QUERIES))
+    with tempfile.TemporaryDirectory() as tmp:
+        for shard_count in (int(count) for count in args.shards.split(',')):
+            build(tmp, shard_count, args.books)
+            cells = [latency_ms(term, limit, args.iterations) for _, term, limit in QUERIES]
+            print(f'{shard_count:>6} ' + ' '.join(f'{p50:>12.2f} {p95:>13.2f}' for p50, p95 in cells))
+        database.close_db_connections()
+        database.SHARDS = ()
+
+
+if __name__ == '__main__':
+    main()
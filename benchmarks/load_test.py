@@ -0,0 +1,126 @@
+"""
+Load test for the production (gunicorn) serving mode.
+
+Seeds a temporary database, then for each worker count starts
+`gunicorn -c gunicorn.conf.py wsgi:app` against it and drives a read-heavy
+request mix from several client processes for a fixed duration. Prints
+requests/second per worker count so throughput scaling across cores is
+visible.
+
+Usage:
+    python benchmarks/load_test.py [--workers 1,2,4] [--threads 4] [--clients 8]
+                                   [--duration 10] [--books 10000]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import database
+from seed import seed_database
+
+PATHS = [
+    '/catalog',
+    '/api/search?q=garden&type=title&limit=20',
+    '/api/search?q=novak&type=author&limit=20',
+    '/api/late_fee/100001/1',
+    '/search?q=river&type=title',
+]
+
+
+def client_worker(port, duration, seed):
+    """Issue requests over one keep-alive connection until `duration` elapses."""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    done = errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            conn.request('GET', rng.choice(PATHS))
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+            done += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+    return done, errors
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/metrics')
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run(workdir, workers, threads, clients, duration, port):
+    env = dict(os.environ, PYTHONPATH=REPO, LIBRARY_BIND=f'127.0.0.1:{port}',
+               LIBRARY_WORKERS=str(workers), LIBRARY_THREADS=str(threads),
+               LIBRARY_ADMISSION_CONTROL='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, 'gunicorn.conf.py'), 'wsgi:app'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError('gunicorn did not start')
+        with ProcessPoolExecutor(clients) as pool:
+            results = list(pool.map(client_worker, [port] * clients, [duration] * clients,
+                                    range(clients)))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    done = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return done / duration, errors
+
+
+def main():
+    cores = multiprocessing.cpu_count()
+    default_workers = sorted({1, 2, 4, cores} & set(range(1, cores + 1))) or [1]
+    parser = argparse.ArgumentParser(description='Throughput vs. worker processes under gunicorn.')
+    parser.add_argument('--workers', default=','.join(map(str, default_workers)),
+                        help='comma-separated worker counts to test')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=max(4, 2 * cores), help='client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database.DATABASE = os.path.join(workdir, database.DATABASE)
+        database.init_database()
+        seed_database(args.books, loans=args.books, patrons=1000)
+        database.close_db_connections()
+
+        print(f'{cores} CPU cores, {args.clients} client processes, {args.threads} threads/worker')
+        print(f'{"workers":>8} {"req/s":>10} {"errors":>8} {"speedup":>8}')
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(',')]:
+            rps, errors = run(workdir, workers, args.threads, args.clients, args.duration, args.port)
+            baseline = baseline or rps
+            print(f'{workers:>8} {rps:>10.1f} {errors:>8} {rps / baseline:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Synthetic data for benchmarks - deterministic catalogs and loan histories
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import database
+
+FIRST_WORDS = ['The', 'A', 'Silent', 'Lost', 'Hidden', 'Last', 'Broken', 'Golden', 'Winter', 'Northern']
+SECOND_WORDS = ['River', 'Garden', 'Empire', 'Signal', 'Harbor', 'Archive', 'Orchard', 'Machine', 'Voyage', 'Song']
+SURNAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Tanaka', 'Kowalski', 'Haddad', 'Moreau']
+
+
+def book_rows(count, copies, seed=327):
+    """Yield `count` (title, author, isbn, total, available) tuples."""
+    rng = random.Random(seed)
+    for i in range(count):
+        title = f'{rng.choice(FIRST_WORDS)} {rng.choice(SECOND_WORDS)} {i}'
+        author = f'{chr(65 + i % 26)}. {rng.choice(SURNAMES)}'
+        yield title, author, f'{9790000000000 + i}', copies, copies
+
+
+def loan_rows(count, books, patrons, open_ratio=0.05, seed=327):
+    """
+    Yield `count` (patron_id, book_id, borrow_date, due_date, return_date, due_ts)
+    tuples spread over the last two years; about `open_ratio` stay open.
+    Open loans are skipped for patrons already at the borrowing limit.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    open_per_patron = {}
+    for _ in range(count):
+        patron_id = f'{100000 + rng.randrange(patrons):06d}'
+        borrowed = now - timedelta(days=rng.randrange(730), minutes=rng.randrange(1440))
+        due = borrowed + timedelta(days=14)
+        returned = borrowed + timedelta(days=rng.randrange(1, 30))
+        if rng.random() < open_ratio and open_per_patron.get(patron_id, 0) < 4:
+            open_per_patron[patron_id] = open_per_patron.get(patron_id, 0) + 1
+            returned = None
+        elif returned > now:
+            returned = now
+        yield (patron_id, rng.randrange(books) + 1, borrowed.isoformat(), due.isoformat(),
+               returned.isoformat() if returned else None, database.to_timestamp(due))
+
+
+def seed_database(books, loans=0, patrons=1000, copies=10, batch_size=10000):
+    """Fill the current DATABASE (already initialized) with synthetic books and loans."""
+    conn = database.get_db_connection()
+    rows = book_rows(books, copies)
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+
+    rows = loan_rows(loans, books, patrons)
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date, due_ts)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+
+    # Reflect the open loans in availability
+    conn.execute('''
+        UPDATE books SET available_copies = MAX(0, total_copies - (
+            SELECT COUNT(*) FROM borrow_records
+            WHERE book_id = books.id AND return_date IS NULL))
+        WHERE id IN (SELECT book_id FROM borrow_records WHERE return_date IS NULL)
+    ''')
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
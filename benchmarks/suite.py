@@ -0,0 +1,201 @@
+"""
+Benchmark suite for library_service functions and HTTP endpoints.
+
+Seeds a synthetic catalog and loan history in a temporary database, times
+every case, and reports p50/p95/p99 latency and throughput. Results can be
+saved as a JSON baseline and compared against a previous run; cases whose
+p50 or p95 got slower than the threshold are flagged as regressions and the
+run exits with status 1.
+
+Usage:
+    python benchmarks/suite.py [--scale 1k|100k|1m] [--iterations 200]
+                               [--only PATTERN] [--save FILE] [--compare FILE]
+                               [--threshold 0.20]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import library_service
+from app import create_app
+from seed import seed_database
+
+SCALES = {
+    '1k': {'books': 1000, 'loans': 5000, 'patrons': 500},
+    '100k': {'books': 100000, 'loans': 300000, 'patrons': 20000},
+    '1m': {'books': 1000000, 'loans': 2000000, 'patrons': 200000},
+}
+
+WARMUP = 5
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'mean_ms': total / len(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'ops_per_sec': len(samples) / total if total else 0.0,
+    }
+
+
+def build_cases(client, books, iterations):
+    """
+    Return (name, func(i)) pairs. Borrow cases use a fresh patron per call
+    and the matching return cases give the same copies back, so the catalog
+    state is unchanged after each borrow/return pair of cases.
+    """
+    def book_for(i):
+        return (i * 7919) % books + 1
+
+    def patron_for(prefix, i):
+        return f'{prefix}{i:05d}'
+
+    isbn_base = 9800000000000
+    return [
+        ('service.add_book_to_catalog', lambda i: library_service.add_book_to_catalog(
+            f'Benchmark Title {i}', 'Benchmark Author', str(isbn_base + i), 1)),
+        ('service.search_books_in_catalog[title]',
+         lambda i: library_service.search_books_in_catalog('garden', 'title', limit=50)),
+        ('service.search_books_in_catalog[author]',
+         lambda i: library_service.search_books_in_catalog('novak', 'author', limit=50)),
+        ('service.search_books_in_catalog[isbn]',
+         lambda i: library_service.search_books_in_catalog(str(9790000000000 + book_for(i) - 1), 'isbn')),
+        ('service.borrow_book_by_patron',
+         lambda i: library_service.borrow_book_by_patron(patron_for('8', i), book_for(i))),
+        ('service.calculate_late_fee_for_book',
+         lambda i: library_service.calculate_late_fee_for_book(patron_for('8', i), book_for(i))),
+        ('service.get_patron_status_report',
+         lambda i: library_service.get_patron_status_report(f'{100000 + i % 500:06d}')),
+        ('service.return_book_by_patron',
+         lambda i: library_service.return_book_by_patron(patron_for('8', i), book_for(i))),
+        ('http.GET /catalog', lambda i: client.get('/catalog')),
+        ('http.GET /search', lambda i: client.get('/search?q=orchard&type=title')),
+        ('http.GET /api/search', lambda i: client.get('/api/search?q=chen&type=author&limit=50')),
+        ('http.POST /borrow', lambda i: client.post('/borrow', data={
+            'patron_id': patron_for('9', i), 'book_id': str(book_for(i))})),
+        ('http.GET /api/late_fee',
+         lambda i: client.get(f'/api/late_fee/{patron_for("9", i)}/{book_for(i)}')),
+        ('http.POST /return', lambda i: client.post('/return', data={
+            'patron_id': patron_for('9', i), 'book_id': str(book_for(i))})),
+    ]
+
+
+def run_case(func, iterations):
+    for i in range(WARMUP):
+        func(iterations + i)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def compare(results, baseline, threshold):
+    """Print deltas against a baseline; returns the names of regressed cases."""
+    regressions = []
+    print(f'\n{"case":<44} {"base p50":>10} {"p50":>10} {"base p95":>10} {"p95":>10}  status')
+    for name, current in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:<44} {"-":>10} {current["p50_ms"]:>10.3f} {"-":>10} {current["p95_ms"]:>10.3f}  new')
+            continue
+        slower = [metric for metric in ('p50_ms', 'p95_ms')
+                  if current[metric] > base[metric] * (1 + threshold)]
+        status = 'REGRESSION' if slower else 'ok'
+        if slower:
+            regressions.append(name)
+        print(f'{name:<44} {base["p50_ms"]:>10.3f} {current["p50_ms"]:>10.3f} '
+              f'{base["p95_ms"]:>10.3f} {current["p95_ms"]:>10.3f}  {status}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Library service and endpoint benchmarks.')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--books', type=int, help='override the number of books for the scale')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--only', help='run only cases matching this glob, e.g. "http.*"')
+    parser.add_argument('--save', help='write results to this JSON baseline file')
+    parser.add_argument('--compare', help='compare against this JSON baseline file')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='allowed slowdown before flagging a regression (default: 0.20)')
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES[args.scale])
+    if args.books:
+        scale['books'] = args.books
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_db_connections()
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        app = create_app()
+        app.config['ADMISSION_CONTROL'] = False  # one client issuing every request
+        seed_start = time.perf_counter()
+        seed_database(scale['books'], scale['loans'], scale['patrons'])
+        print(f'Seeded {scale["books"]} books and {scale["loans"]} loans '
+              f'in {time.perf_counter() - seed_start:.1f}s')
+
+        client = app.test_client()
+        print(f'{"case":<44} {"p50 ms":>10} {"p95 ms":>10} {"p99 ms":>10} {"ops/s":>10}')
+        for name, func in build_cases(client, scale['books'], args.iterations):
+            if args.only and not fnmatch.fnmatch(name, args.only):
+                continue
+            stats = run_case(func, args.iterations)
+            results[name] = stats
+            print(f'{name:<44} {stats["p50_ms"]:>10.3f} {stats["p95_ms"]:>10.3f} '
+                  f'{stats["p99_ms"]:>10.3f} {stats["ops_per_sec"]:>10.1f}')
+        database.close_db_connections()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'scale': args.scale,
+            **scale,
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nSaved baseline to {args.save}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
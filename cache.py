@@ -0,0 +1,86 @@
+"""
+Cache Module - bounded, thread-safe LRU/TTL cache for database reads
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+# Returned by ReadCache.get() on a miss (None is a cacheable value)
+MISSING = object()
+
+class ReadCache:
+    """
+    Least-recently-used cache with a per-entry time-to-live.
+
+    Writers call invalidate() with the keys they changed. Every invalidation
+    bumps `generation`; readers take the generation before querying the
+    database and pass it to put(), which drops the value if an invalidation
+    happened meanwhile, so a slow reader cannot re-cache a stale row.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Get a cached value, or `default` if it is absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Cache a value unless the cache was invalidated since `generation`."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable]):
+        """Drop the given keys."""
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction/invalidation counters and the current size."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,98 @@
+"""
+Bulk catalog import - streams CSV or JSON Lines book feeds into the catalog
+
+Rows are read one at a time and handed to library_service.import_books_to_catalog,
+which validates them and inserts them in batched transactions.
+
+Usage:
+    python catalog_import.py feed.csv [--format csv|jsonl] [--batch-size N] [--rejects rejects.jsonl]
+"""
+
+import argparse
+import csv
+import json
+import sys
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple
+
+from database import init_database
+from library_service import import_books_to_catalog, IMPORT_BATCH_SIZE
+
+FORMATS = ('csv', 'jsonl')
+
+class FeedError(ValueError):
+    """A feed that cannot be read past `line` (bad encoding or CSV syntax)."""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f'line {line}: {message}')
+        self.line = line
+
+def iter_lines(raw: BinaryIO, encoding: str = 'utf-8') -> Iterator[str]:
+    """Decode a binary feed line by line; raises FeedError at the first line that is not `encoding`."""
+    for line_num, line in enumerate(raw, start=1):
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError as e:
+            raise FeedError(line_num, f'not valid {encoding} ({e.reason})') from None
+
+def iter_csv_rows(stream: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, row) for a CSV feed with a title,author,isbn,total_copies header."""
+    reader = csv.DictReader(stream)
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as e:
+        # line_num is where the last good record ended; the bad one starts after it
+        raise FeedError(reader.line_num + 1, str(e)) from None
+
+def iter_jsonl_rows(stream: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, row) for a JSON Lines feed; unparseable lines become empty rows."""
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else {}
+
+def iter_rows(stream: Iterable[str], fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, row) pairs from a feed in the given format."""
+    if fmt == 'csv':
+        return iter_csv_rows(stream)
+    if fmt == 'jsonl':
+        return iter_jsonl_rows(stream)
+    raise ValueError(f'Unsupported import format: {fmt}')
+
+def guess_format(filename: str) -> str:
+    """Guess the feed format from a file name, defaulting to CSV."""
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import books into the library catalog.')
+    parser.add_argument('path', help='CSV or JSON Lines file, or - for stdin')
+    parser.add_argument('--format', choices=FORMATS, help='feed format (default: from file extension)')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--rejects', help='write rejected rows here as JSON Lines (default: stderr)')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or guess_format(args.path)
+    init_database()
+
+    rejects_out = open(args.rejects, 'w', encoding='utf-8') if args.rejects else sys.stderr
+    source = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    try:
+        report = import_books_to_catalog(
+            iter_rows(source, fmt), args.batch_size,
+            on_reject=lambda reject: rejects_out.write(json.dumps(reject) + '\n')
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if rejects_out is not sys.stderr:
+            rejects_out.close()
+
+    print(f"Imported {report['inserted']} books, rejected {report['rejected']} rows.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
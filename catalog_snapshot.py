@@ -0,0 +1,212 @@
+"""
+Catalog Snapshot Module - compact, process-local in-memory copy of the books table
+
+Books are held in parallel arrays indexed by slot (one slot per book) rather
+than one dict per book: integer columns live in `array`s, author strings are
+interned, and lowercased title/author columns are precomputed for substring
+search. Dicts are built only for the rows a caller actually returns.
+
+The snapshot refreshes incrementally: every insert, update or delete on books
+writes the book ID to the book_changes log with a new, increasing seq, and
+refresh() applies only the rows logged after its seq watermark. Whether
+anything changed at all is learned from PRAGMA data_version, which costs no
+table read.
+"""
+
+import sqlite3
+import sys
+import threading
+from array import array
+from bisect import bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BOOK_COLUMNS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+
+# Above this share of the catalog, changes are applied in bulk and the title
+# order is re-sorted once instead of being maintained row by row
+BULK_REFRESH_RATIO = 0.125
+
+class CatalogSnapshot:
+    """In-memory books table, ordered by (title, id) like the SQL catalog queries."""
+
+    __slots__ = ('database', 'timeout', 'watermark', 'ids', 'titles', 'authors', 'isbns',
+                 'total_copies', 'available_copies', 'titles_lower', 'authors_lower',
+                 'full_loads', 'refreshes', '_slots', '_free', '_keys', '_conn',
+                 '_data_version', '_lock')
+
+    def __init__(self, database: str, timeout: float = 5.0):
+        self.database = database
+        self.timeout = timeout
+        self.watermark = None  # last book_changes.seq applied; None until loaded
+        self.full_loads = 0
+        self.refreshes = 0
+        self._conn = None
+        self._data_version = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = array('q')
+        self.titles = []
+        self.authors = []
+        self.isbns = []
+        self.total_copies = array('q')
+        self.available_copies = array('q')
+        self.titles_lower = []
+        self.authors_lower = []
+        self._slots = {}  # book id -> slot
+        self._free = []   # slots of deleted books, reused by inserts
+        self._keys = []   # sorted (title, id) of every live book
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    # Refreshing
+
+    def refresh(self):
+        """Bring the snapshot up to date with the database."""
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.database, timeout=self.timeout,
+                                             check_same_thread=False, isolation_level=None)
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version and self.watermark is not None:
+                return
+            # One read transaction, so the rows and the watermark agree
+            self._conn.execute('BEGIN')
+            try:
+                if self.watermark is None:
+                    self._load_all()
+                else:
+                    self._apply_changes()
+            finally:
+                self._conn.execute('COMMIT')
+            self._data_version = data_version
+
+    def _load_all(self):
+        self.watermark = self._conn.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM book_changes').fetchone()[0]
+        self._reset()
+        cursor = self._conn.execute(
+            'SELECT id, title, author, isbn, total_copies, available_copies FROM books')
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                self._store(*row)
+        self._keys = sorted((self.titles[slot], book_id) for book_id, slot in self._slots.items())
+        self.full_loads += 1
+
+    def _apply_changes(self):
+        changes = self._conn.execute('''
+            SELECT c.seq, c.book_id, b.title, b.author, b.isbn, b.total_copies, b.available_copies
+            FROM book_changes c LEFT JOIN books b ON b.id = c.book_id
+            WHERE c.seq > ?
+            ORDER BY c.seq
+        ''', (self.watermark,)).fetchall()
+        if not changes:
+            return
+        bulk = len(changes) > len(self._slots) * BULK_REFRESH_RATIO
+        for seq, book_id, title, author, isbn, total, available in changes:
+            slot = self._slots.get(book_id)
+            if title is None:
+                if slot is not None:
+                    self._delete(book_id, slot, bulk)
+            elif slot is None:
+                slot = self._store(book_id, title, author, isbn, total, available)
+                if not bulk:
+                    insort(self._keys, (title, book_id))
+            else:
+                if not bulk and self.titles[slot] != title:
+                    self._keys.pop(bisect_right(self._keys, (self.titles[slot], book_id)) - 1)
+                    insort(self._keys, (title, book_id))
+                self._write(slot, book_id, title, author, isbn, total, available)
+        if bulk:
+            self._keys = sorted((self.titles[slot], book_id) for book_id, slot in self._slots.items())
+        self.watermark = changes[-1][0]
+        self.refreshes += 1
+
+    def _store(self, book_id, title, author, isbn, total, available) -> int:
+        """Put a new book into a free slot (or a new one at the end)."""
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self.ids)
+            self.ids.append(0)
+            self.total_copies.append(0)
+            self.available_copies.append(0)
+            for column in (self.titles, self.authors, self.isbns, self.titles_lower, self.authors_lower):
+                column.append(None)
+        self._slots[book_id] = slot
+        self._write(slot, book_id, title, author, isbn, total, available)
+        return slot
+
+    def _write(self, slot, book_id, title, author, isbn, total, available):
+        author = sys.intern(author)
+        self.ids[slot] = book_id
+        self.titles[slot] = title
+        self.authors[slot] = author
+        self.isbns[slot] = isbn
+        self.total_copies[slot] = total
+        self.available_copies[slot] = available
+        self.titles_lower[slot] = title.lower()
+        self.authors_lower[slot] = sys.intern(author.lower())
+
+    def _delete(self, book_id, slot, bulk):
+        if not bulk:
+            self._keys.pop(bisect_right(self._keys, (self.titles[slot], book_id)) - 1)
+        del self._slots[book_id]
+        self.ids[slot] = 0
+        for column in (self.titles, self.authors, self.isbns, self.titles_lower, self.authors_lower):
+            column[slot] = None
+        self._free.append(slot)
+
+    # Reading
+
+    def _row(self, slot: int) -> Dict:
+        return {
+            'id': self.ids[slot],
+            'title': self.titles[slot],
+            'author': self.authors[slot],
+            'isbn': self.isbns[slot],
+            'total_copies': self.total_copies[slot],
+            'available_copies': self.available_copies[slot],
+        }
+
+    def get_all_books(self) -> List[Dict]:
+        """Every book, ordered by title."""
+        with self._lock:
+            return [self._row(self._slots[book_id]) for _, book_id in self._keys]
+
+    def get_books_page(self, after: Optional[Tuple[str, int]] = None, limit: int = 50) -> List[Dict]:
+        """Up to `limit` books ordered by (title, id), after the keyset cursor `after`."""
+        with self._lock:
+            start = bisect_right(self._keys, tuple(after)) if after is not None else 0
+            return [self._row(self._slots[book_id]) for _, book_id in self._keys[start:start + limit]]
+
+    def iter_books(self, batch_size: int = 500) -> Iterator[Dict]:
+        """Yield every book ordered by title, `batch_size` rows per lock acquisition."""
+        after = None
+        while True:
+            books = self.get_books_page(after, batch_size)
+            yield from books
+            if len(books) < batch_size:
+                return
+            after = (books[-1]['title'], books[-1]['id'])
+
+    def search(self, term: str, field: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Case-insensitive substring search on 'title' or 'author', ordered by (title, id)."""
+        needle = term.lower()
+        with self._lock:
+            column = self.titles_lower if field == 'title' else self.authors_lower
+            matches = [slot for slot, text in enumerate(column) if text is not None and needle in text]
+            matches.sort(key=lambda slot: (self.titles[slot], self.ids[slot]))
+            end = None if limit is None or limit < 0 else offset + limit
+            return [self._row(slot) for slot in matches[offset:end]]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
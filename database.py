@@ -3,21 +3,659 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import heapq
+import logging
+import os
+import queue
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from cache import MISSING, ReadCache
+from catalog_snapshot import CatalogSnapshot
+from group_commit import GroupCommitWriter
+from shards import (allocate_book_ids, shard_for_book, shard_for_isbn, shard_for_patron,
+                    trigram_bm25)
+from suggest import SuggestIndex, merge_completions
+
+logger = logging.getLogger(__name__)
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Connection pool configuration (POOL_SIZE = 0 disables pooling)
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT = 5.0
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),       # negative value is KiB, i.e. ~16 MB page cache
+    ('mmap_size', 134217728),     # 128 MB memory-mapped I/O
+    ('temp_store', 'MEMORY'),
+)
+
+# Book read cache configuration (CACHE_SIZE = 0 disables caching). Writes by
+# other processes are noticed within CACHE_POLL_INTERVAL seconds.
+CACHE_SIZE = 4096
+CACHE_TTL = 30.0
+CACHE_POLL_INTERVAL = 0.005
+
+# Serve catalog listings and title/author searches from a process-local
+# in-memory copy of books (see catalog_snapshot.py) instead of SQL
+CATALOG_SNAPSHOT = False
+
+# Type-ahead index (see suggest.py): seconds between checks for books changed
+# by other processes; this process's own inserts show up immediately
+SUGGEST_REFRESH_INTERVAL = 1.0
+
+# Batch concurrent borrow/return transactions on one writer thread (see
+# group_commit.py). A batch takes every job queued while the previous one was
+# committing, plus any arriving within GROUP_COMMIT_WINDOW seconds.
+GROUP_COMMIT = False
+GROUP_COMMIT_WINDOW = 0.0
+GROUP_COMMIT_MAX_BATCH = 256
+
+# Split the catalog across per-branch SQLite files (see shards.py): one
+# database path per shard, or empty to keep everything in DATABASE. Book and
+# loan operations are routed to the shard owning the book; catalog-wide reads
+# run on every shard concurrently, on up to SHARD_WORKERS threads (0: four per
+# shard), and are merged. A search gives up on shards that have not answered
+# within SHARD_TIMEOUT seconds and returns the other shards' results. A
+# patron's borrows take a lock on their home shard for the limit check, held
+# for at most PATRON_LOCK_TTL seconds (so a crashed holder cannot keep it).
+# The book cache, catalog snapshot and group commit are not available with shards.
+SHARDS = ()
+SHARD_TIMEOUT = 2.0
+SHARD_WORKERS = 0
+PATRON_LOCK_TTL = 30.0
+
+# Called as observer(sql, seconds) after every statement; see set_query_observer()
+_query_observer = None
+
+def set_query_observer(observer: Optional[Callable[[str, float], None]]):
+    """Install a callback timing every execute()/executemany() on app connections."""
+    global _query_observer
+    _query_observer = observer
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection owned by a ConnectionPool.
+
+    close() hands the connection back to the pool instead of closing it, so the
+    existing "open, query, close" helpers below reuse connections transparently.
+    """
+    pool = None
+
+    def execute(self, sql, parameters=()):
+        observer = _query_observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        observer = _query_observer
+        if observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer(sql, time.perf_counter() - start)
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            _release_db_connection(self)
+
+    def close_for_real(self):
+        """Close the underlying SQLite handle."""
+        super().close()
+
+def _unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+def register_sql_functions(conn: sqlite3.Connection):
+    """
+    Add the SQL functions app queries use: unicode_lower(), since SQLite's
+    lower() and LIKE only fold ASCII letters, and trigram_bm25() for ranking
+    searches across shards.
+    """
+    conn.create_function('unicode_lower', 1, _unicode_lower, deterministic=True)
+    conn.create_function('trigram_bm25', 4, trigram_bm25, deterministic=True)
+
+class ConnectionPool:
+    """Bounded LIFO pool of idle, pre-configured SQLite connections."""
+
+    def __init__(self, database: str, size: int):
+        self.database = database
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size) if size > 0 else None
+        self.opened = 0
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.database,
+            timeout=BUSY_TIMEOUT,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            factory=PooledConnection,
+        )
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        register_sql_functions(conn)
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self._idle is not None:
+            conn.pool = self
+        self.opened += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """Take an idle connection, opening a new one if none is available."""
+        if self._idle is not None:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        return self._connect()
+
+    def release(self, conn: PooledConnection):
+        """Return a connection to the pool, closing it if the pool is full."""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle is not None:
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close_for_real()
+
+    def close_all(self):
+        """Close every idle connection held by the pool."""
+        while self._idle is not None:
+            try:
+                self._idle.get_nowait().close_for_real()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def get_pool() -> ConnectionPool:
+    """Get the connection pool for the current DATABASE, creating it on first use."""
+    global _pool
+    pool = _pool
+    if pool is None or pool.database != DATABASE or pool.size != POOL_SIZE:
+        with _pool_lock:
+            if _pool is None or _pool.database != DATABASE or _pool.size != POOL_SIZE:
+                if _pool is not None:
+                    _pool.close_all()
+                _pool = ConnectionPool(DATABASE, POOL_SIZE)
+            pool = _pool
+    return pool
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
+    """
+    Get a database connection.
+
+    Nested calls on the same thread share one connection; it goes back to the
+    pool once every caller has closed it (or, inside a Flask request, when the
+    app context is torn down). Inside a routed call (see _on_shard) the
+    connection comes from that shard's pool and is held until the call ends.
+    """
+    shard = getattr(_local, 'shard', None)
+    if shard is not None:
+        conn = _get_shard_pool(shard).acquire()
+        if conn.pool is not None:
+            _local.shard_conns.append(conn)
+        return conn
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = get_pool().acquire()
+        if conn.pool is None:
+            return conn  # pooling disabled: plain one-shot connection
+        _local.conn = conn
+        _local.refs = 0
+    _local.refs += 1
     return conn
 
+def _release_db_connection(conn):
+    """Drop one reference to the thread's connection, pooling it when unused."""
+    if conn in getattr(_local, 'shard_conns', ()):
+        return  # pooled when the routed call ends
+    if getattr(_local, 'conn', None) is not conn:
+        conn.pool.release(conn)
+        return
+    _local.refs -= 1
+    if _local.refs <= 0 and not getattr(_local, 'pinned', False):
+        _local.conn = None
+        conn.pool.release(conn)
+
+def pin_db_connection():
+    """Keep this thread's connection checked out until unpin_db_connection()."""
+    if getattr(_local, 'pinned', False) or SHARDS:
+        return
+    conn = get_db_connection()
+    if conn.pool is None:
+        conn.close()
+        return
+    _local.pinned = True
+
+def unpin_db_connection(exc=None):
+    """Release the connection pinned by pin_db_connection() back to the pool."""
+    if not getattr(_local, 'pinned', False):
+        return
+    _local.pinned = False
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _release_db_connection(conn)
+
+def close_db_connections():
+    """Close all pooled connections and the book cache (e.g. at shutdown or before fork)."""
+    global _pool, _book_cache, _catalog_snapshot, _suggest_index, _group_commit_writer
+    global _shard_executor
+    if _group_commit_writer is not None:
+        _group_commit_writer.close()
+        _group_commit_writer = None
+    if _shard_executor is not None:
+        _shard_executor.shutdown()
+        _shard_executor = None
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+        for pool in _shard_pools.values():
+            pool.close_all()
+        _shard_pools.clear()
+        for index in _shard_suggest_indexes.values():
+            index.close()
+        _shard_suggest_indexes.clear()
+    _local.__dict__.clear()
+    if _book_cache is not None:
+        _book_cache.close()
+        _book_cache = None
+    if _catalog_snapshot is not None:
+        _catalog_snapshot.close()
+        _catalog_snapshot = None
+    if _suggest_index is not None:
+        _suggest_index.close()
+        _suggest_index = None
+
+# Connections opened before a fork belong to the parent; SQLite must not use
+# or close them in the child. Keep them referenced (so they are never
+# finalized here) and start the child with a fresh pool, cache and locks.
+_inherited = []
+
+def _reset_after_fork():
+    global _pool, _book_cache, _catalog_snapshot, _suggest_index, _group_commit_writer
+    global _pool_lock, _local, _shard_pools, _shard_suggest_indexes, _shard_executor, _interrupt_lock
+    _inherited.append((_pool, _book_cache, _catalog_snapshot, _suggest_index, _group_commit_writer, _local,
+                       _shard_pools, _shard_suggest_indexes, _shard_executor))
+    _pool = None
+    _shard_pools = {}
+    _shard_suggest_indexes = {}
+    _group_commit_writer = None  # its thread does not exist in the child
+    _shard_executor = None  # nor do its workers
+    _interrupt_lock = threading.Lock()
+    _book_cache = None
+    _catalog_snapshot = None
+    _suggest_index = None
+    _pool_lock = threading.Lock()
+    _local = threading.local()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Shard routing
+#
+# With SHARDS set, each public function below first checks _sharded() and, if
+# so, routes the call: to the owning shard for one book (_route), or to every
+# shard concurrently (_scatter) followed by a merge. The routed call runs the
+# function's ordinary single-database code with get_db_connection() pointed
+# at the shard.
+
+_shard_pools = {}
+_shard_suggest_indexes = {}
+_shard_executor = None
+_interrupt_lock = threading.Lock()
+
+def _sharded() -> bool:
+    """True if SHARDS is set and this thread is not already inside a routed call."""
+    return bool(SHARDS) and getattr(_local, 'shard', None) is None
+
+def _get_shard_pool(index: int) -> ConnectionPool:
+    path = SHARDS[index]
+    pool = _shard_pools.get(path)
+    if pool is None or pool.size != POOL_SIZE:
+        with _pool_lock:
+            pool = _shard_pools.get(path)
+            if pool is None or pool.size != POOL_SIZE:
+                if pool is not None:
+                    pool.close_all()
+                pool = _shard_pools[path] = ConnectionPool(path, POOL_SIZE)
+    return pool
+
+def _get_shard_executor() -> ThreadPoolExecutor:
+    global _shard_executor
+    executor = _shard_executor
+    if executor is None:
+        with _pool_lock:
+            if _shard_executor is None:
+                _shard_executor = ThreadPoolExecutor(SHARD_WORKERS or 4 * len(SHARDS),
+                                                     thread_name_prefix='shard')
+            executor = _shard_executor
+    return executor
+
+@contextmanager
+def _shard_context(index: int, conns: list):
+    """Point this thread's get_db_connection() at shard `index` for the block, collecting its connections in `conns`."""
+    _local.shard, _local.shard_conns = index, conns
+    try:
+        yield
+    finally:
+        _local.shard, _local.shard_conns = None, ()
+
+def _release_shard_connections(conns: list):
+    with _interrupt_lock:
+        held = list(conns)
+        conns.clear()
+    for conn in held:
+        conn.pool.release(conn)
+
+@contextmanager
+def _on_shard(index: int, conns: Optional[list] = None):
+    """
+    Point this thread's get_db_connection() at shard `index` for the block.
+    The connections it hands out are collected in `conns` (so a scatter can
+    interrupt them) and go back to the shard's pool when the block ends.
+    """
+    conns = [] if conns is None else conns
+    try:
+        with _shard_context(index, conns):
+            yield
+    finally:
+        _release_shard_connections(conns)
+
+def _route(index: int, fn: Callable, *args):
+    """Call fn(*args) against shard `index`."""
+    with _on_shard(index):
+        return fn(*args)
+
+def _iter_on_shard(index: int, fn: Callable, *args):
+    """
+    Iterate the generator fn(*args) against shard `index`, routing only while
+    it is being advanced, so generators for several shards can be interleaved
+    on one thread (e.g. by heapq.merge). Its connection is held until it ends.
+    """
+    conns = []
+    iterator = fn(*args)
+    try:
+        while True:
+            with _shard_context(index, conns):
+                item = next(iterator, MISSING)
+            if item is MISSING:
+                return
+            yield item
+    finally:
+        with _shard_context(index, conns):
+            iterator.close()
+        _release_shard_connections(conns)
+
+def _book_shard(book_id: int) -> int:
+    return shard_for_book(book_id, len(SHARDS))
+
+def _isbn_shard(isbn: str) -> int:
+    return shard_for_isbn(isbn, len(SHARDS))
+
+def _patron_shard(patron_id: str) -> int:
+    return shard_for_patron(patron_id, len(SHARDS))
+
+def _scatter(fn: Callable, *args, timeout: Optional[float] = None,
+             missing: Optional[List[int]] = None, shards: Optional[List[int]] = None) -> List:
+    """
+    Call fn(*args) against every shard (or the `shards` listed) concurrently;
+    returns the results in shard order.
+
+    Without a timeout this waits for every shard and re-raises a shard's
+    error. With one, a shard that fails or has not answered after `timeout`
+    seconds has its running statement interrupted, gives None, and its index
+    is appended to `missing`.
+    """
+    executor = _get_shard_executor()
+    shards = range(len(SHARDS)) if shards is None else shards
+    conns = {index: [] for index in shards}
+    def call(index):
+        with _on_shard(index, conns[index]):
+            return fn(*args)
+    futures = [executor.submit(call, index) for index in shards]
+    if timeout is None:
+        return [future.result() for future in futures]
+    done, _ = wait(futures, timeout)
+    results = []
+    for index, future in zip(shards, futures):
+        if future in done and future.exception() is None:
+            results.append(future.result())
+            continue
+        with _interrupt_lock:
+            for conn in conns[index]:
+                conn.interrupt()
+        if future in done:
+            logger.warning('shard %s (%s) failed: %r', index, SHARDS[index], future.exception())
+        else:
+            logger.warning('shard %s (%s) timed out after %.3fs', index, SHARDS[index], timeout)
+        if missing is not None:
+            missing.append(index)
+        results.append(None)
+    return results
+
+def init_app(app):
+    """Pin one pooled connection per request for the lifetime of the app context."""
+    app.before_request(pin_db_connection)
+    app.teardown_appcontext(unpin_db_connection)
+
+class BookCache(ReadCache):
+    """
+    ReadCache for books lookups that also notices writes made elsewhere.
+
+    Local writers report the catalog_version range their transaction covered
+    (note_write), which invalidates exactly the keys they touched. Writes by
+    other connections or processes are detected by polling PRAGMA data_version
+    on a dedicated read-only connection, at most every `poll_interval` seconds;
+    when it moves, catalog_version is re-read and the whole cache is dropped
+    if books changed behind our back.
+    """
+
+    def __init__(self, database: str, max_size: int, ttl: float, poll_interval: float = 0.0):
+        super().__init__(max_size, ttl)
+        self.database = database
+        self.poll_interval = poll_interval
+        self.version = None  # catalog_version every cached entry reflects
+        self._watcher = None
+        self._data_version = None
+        self._next_poll = 0.0
+        self._watch_lock = threading.Lock()
+
+    def sync(self) -> int:
+        """Drop stale entries if another writer changed books; returns the generation to read at."""
+        # Between polls, and while another thread polls, reads go straight to the cache
+        if time.monotonic() < self._next_poll or not self._watch_lock.acquire(blocking=False):
+            return self.generation
+        try:
+            self._next_poll = time.monotonic() + self.poll_interval
+            if self._watcher is None:
+                self._watcher = sqlite3.connect(self.database, timeout=BUSY_TIMEOUT,
+                                                check_same_thread=False)
+            data_version = self._watcher.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                version = _catalog_version(self._watcher)
+                with self._lock:
+                    if version is None or version != self.version:
+                        self.version = version
+                        self.generation += 1
+                        self.invalidations += len(self._entries)
+                        self._entries.clear()
+        finally:
+            self._watch_lock.release()
+        return self.generation
+
+    def note_write(self, keys: Iterable[Hashable], start_version: Optional[int],
+                   end_version: Optional[int]):
+        """Invalidate `keys` after a committed write that moved catalog_version from start to end."""
+        self.invalidate(keys)
+        with self._lock:
+            if start_version is None or end_version is None:
+                self.version = None
+            elif self.version == start_version:
+                self.version = end_version  # no unseen writes in between
+            elif self.version is None or end_version > self.version:
+                self.version = end_version
+                self._entries.clear()
+        
+    def close(self):
+        with self._watch_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+_book_cache = None
+
+def get_book_cache() -> Optional[BookCache]:
+    """Get the book read cache for the current DATABASE, or None if caching is disabled (or sharded)."""
+    global _book_cache
+    cache = _book_cache
+    if CACHE_SIZE <= 0 or SHARDS:
+        return None
+    if cache is None or cache.database != DATABASE or cache.max_size != CACHE_SIZE:
+        with _pool_lock:
+            if _book_cache is None or _book_cache.database != DATABASE or _book_cache.max_size != CACHE_SIZE:
+                if _book_cache is not None:
+                    _book_cache.close()
+                _book_cache = BookCache(DATABASE, CACHE_SIZE, CACHE_TTL, CACHE_POLL_INTERVAL)
+            cache = _book_cache
+    return cache
+
+def get_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the book read cache."""
+    cache = get_book_cache()
+    return cache.stats() if cache is not None else {}
+
+_catalog_snapshot = None
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """Get the up-to-date in-memory books snapshot for DATABASE, or None if it is disabled."""
+    global _catalog_snapshot
+    if not CATALOG_SNAPSHOT or SHARDS:
+        return None
+    snapshot = _catalog_snapshot
+    if snapshot is None or snapshot.database != DATABASE:
+        with _pool_lock:
+            if _catalog_snapshot is None or _catalog_snapshot.database != DATABASE:
+                if _catalog_snapshot is not None:
+                    _catalog_snapshot.close()
+                _catalog_snapshot = CatalogSnapshot(DATABASE, BUSY_TIMEOUT)
+            snapshot = _catalog_snapshot
+    snapshot.refresh()
+    return snapshot
+
+_suggest_index = None
+
+def get_suggest_index() -> SuggestIndex:
+    """Get the title/author type-ahead index for DATABASE."""
+    global _suggest_index
+    index = _suggest_index
+    if index is None or index.database != DATABASE:
+        with _pool_lock:
+            if _suggest_index is None or _suggest_index.database != DATABASE:
+                if _suggest_index is not None:
+                    _suggest_index.close()
+                _suggest_index = SuggestIndex(DATABASE, BUSY_TIMEOUT, SUGGEST_REFRESH_INTERVAL)
+            index = _suggest_index
+    return index
+
+def suggest_books(prefix: str, field: str, limit: int = 10) -> List[str]:
+    """Complete `prefix` to up to `limit` distinct titles or authors, from memory."""
+    if _sharded():
+        return _sharded_suggest_books(prefix, field, limit)
+    if field not in ('title', 'author'):
+        raise ValueError(f'Unsupported suggest field: {field}')
+    return get_suggest_index().suggest(prefix, field, limit)
+
+_group_commit_writer = None
+
+def get_group_commit_writer() -> Optional[GroupCommitWriter]:
+    """Get the group-commit writer for DATABASE, or None if GROUP_COMMIT is disabled."""
+    global _group_commit_writer
+    if not GROUP_COMMIT or SHARDS:
+        return None
+    writer = _group_commit_writer
+    if writer is None or writer.database != DATABASE:
+        with _pool_lock:
+            if _group_commit_writer is None or _group_commit_writer.database != DATABASE:
+                if _group_commit_writer is not None:
+                    _group_commit_writer.close()
+                _group_commit_writer = GroupCommitWriter(
+                    DATABASE, get_db_connection, _begin_books_write, _commit_books_write,
+                    GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH)
+            writer = _group_commit_writer
+    return writer
+
+# A book_changes position: a seq, or with SHARDS a tuple of one seq per shard
+Watermark = Union[int, Tuple[int, ...]]
+
+def _catalog_version(conn) -> Optional[int]:
+    """Read the trigger-maintained books change counter (None before migration v3)."""
+    try:
+        return conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        return None
+
+def get_catalog_version() -> Tuple[int, datetime]:
+    """
+    Get the books change counter and when it last changed (UTC).
+    Any insert, update or delete on books moves both.
+    """
+    if _sharded():
+        return _sharded_catalog_version()
+    conn = get_db_connection()
+    row = conn.execute('SELECT version, updated_at FROM catalog_version WHERE id = 1').fetchone()
+    conn.close()
+    return row['version'], datetime.fromtimestamp(row['updated_at'], timezone.utc)
+
+def _begin_books_write(conn) -> Optional[int]:
+    """Start a write transaction that changes books; returns the starting catalog_version."""
+    conn.execute('BEGIN IMMEDIATE')
+    return _catalog_version(conn)
+
+def _commit_books_write(conn, start_version: Optional[int], keys: Iterable[Hashable]):
+    """Commit a transaction begun with _begin_books_write and invalidate cached reads."""
+    end_version = _catalog_version(conn)
+    conn.commit()
+    cache = get_book_cache()
+    if cache is not None:
+        cache.note_write(keys, start_version, end_version)
+
+def _book_keys(book_id: int) -> Tuple[Hashable, ...]:
+    """Cache keys to invalidate when the row of `book_id` changes."""
+    return (('id', book_id), ('all',))
+
 def init_database():
-    """Initialize the database with required tables."""
+    """Initialize the database with required tables, then apply pending migrations."""
+    if _sharded():
+        for index in range(len(SHARDS)):
+            _route(index, init_database)
+        return
     conn = get_db_connection()
     
     # Create books table
@@ -46,10 +684,313 @@ def init_database():
     ''')
     
     conn.commit()
+    migrate_database(conn)
     conn.close()
 
+# Schema migrations
+#
+# Each migration upgrades the schema by one version and runs in its own
+# transaction together with the PRAGMA user_version bump, so an existing
+# library.db is brought up to date in place at startup. Append new migrations
+# to the end of MIGRATIONS; never edit or reorder ones that have shipped.
+
+def _migration_catalog_indexes(conn):
+    """v1: (title, id) index for keyset pagination and the FTS5 search index."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)')
+    init_search_index(conn)
+
+def _migration_borrow_record_indexes(conn):
+    """v2: indexes for the open-loan lookups on borrow_records."""
+    # Open loans per patron: borrow count, borrowed books, return lookup
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_patron
+        ON borrow_records (patron_id, book_id) WHERE return_date IS NULL
+    ''')
+    # Loans per book (joins and per-book lookups)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_borrow_records_book ON borrow_records (book_id)')
+
+def _migration_catalog_version(conn):
+    """v3: catalog_version counter, bumped by triggers on every change to books."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS books_version_{event.lower()} AFTER {event} ON books BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+def _migration_patron_summary(conn):
+    """
+    v4: per-patron summary maintained by triggers on borrow_records, the fee
+    charged on each return, and an index for paging through returned loans.
+    """
+    conn.execute('ALTER TABLE borrow_records ADD COLUMN fee_charged REAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patron_summary (
+            patron_id TEXT PRIMARY KEY,
+            active_count INTEGER NOT NULL DEFAULT 0,
+            lifetime_loans INTEGER NOT NULL DEFAULT 0,
+            outstanding_fees REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO patron_summary (patron_id, active_count, lifetime_loans, outstanding_fees)
+        SELECT patron_id, SUM(return_date IS NULL), COUNT(*), 0
+        FROM borrow_records GROUP BY patron_id
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS patron_summary_borrow AFTER INSERT ON borrow_records BEGIN
+            INSERT OR IGNORE INTO patron_summary (patron_id) VALUES (new.patron_id);
+            UPDATE patron_summary
+            SET active_count = active_count + (new.return_date IS NULL),
+                lifetime_loans = lifetime_loans + 1
+            WHERE patron_id = new.patron_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS patron_summary_return AFTER UPDATE OF return_date ON borrow_records
+        WHEN old.return_date IS NULL AND new.return_date IS NOT NULL BEGIN
+            UPDATE patron_summary
+            SET active_count = active_count - 1,
+                outstanding_fees = outstanding_fees + COALESCE(new.fee_charged, 0)
+            WHERE patron_id = new.patron_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS patron_summary_delete AFTER DELETE ON borrow_records
+        WHEN old.return_date IS NULL BEGIN
+            UPDATE patron_summary SET active_count = active_count - 1
+            WHERE patron_id = old.patron_id;
+        END
+    ''')
+    # Returned loans per patron, newest return first (keyset-paginated history)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_history
+        ON borrow_records (patron_id, return_date, id) WHERE return_date IS NOT NULL
+    ''')
+
+def _migration_catalog_updated_at(conn):
+    """v5: record when catalog_version last changed (for Last-Modified headers)."""
+    conn.execute('ALTER TABLE catalog_version ADD COLUMN updated_at INTEGER NOT NULL DEFAULT 0')
+    conn.execute("UPDATE catalog_version SET updated_at = CAST(strftime('%s', 'now') AS INTEGER)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'DROP TRIGGER IF EXISTS books_version_{event.lower()}')
+        conn.execute(f'''
+            CREATE TRIGGER books_version_{event.lower()} AFTER {event} ON books BEGIN
+                UPDATE catalog_version
+                SET version = version + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+                WHERE id = 1;
+            END
+        ''')
+
+def _migration_book_changes(conn):
+    """v6: log of changed book IDs, for incremental refresh of in-memory copies."""
+    # REPLACE gives a re-changed book a new seq, so the log holds one row per book
+    conn.execute('''
+        CREATE TABLE book_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER book_changes_insert AFTER INSERT ON books BEGIN
+            INSERT OR REPLACE INTO book_changes (book_id) VALUES (new.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER book_changes_update AFTER UPDATE ON books BEGIN
+            INSERT OR REPLACE INTO book_changes (book_id) SELECT old.id WHERE old.id != new.id;
+            INSERT OR REPLACE INTO book_changes (book_id) VALUES (new.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER book_changes_delete AFTER DELETE ON books BEGIN
+            INSERT OR REPLACE INTO book_changes (book_id) VALUES (old.id);
+        END
+    ''')
+
+def _migration_loan_timestamps(conn):
+    """v7: integer due_ts on borrow_records, indexed for open loans, so overdue checks are SQL predicates."""
+    conn.execute('ALTER TABLE borrow_records ADD COLUMN due_ts INTEGER')
+    conn.execute("UPDATE borrow_records SET due_ts = CAST(strftime('%s', due_date) AS INTEGER)")
+    # Writers that only supply the ISO due_date (older code, bulk loads) get due_ts filled in
+    conn.execute('''
+        CREATE TRIGGER borrow_records_due_ts_insert AFTER INSERT ON borrow_records
+        WHEN new.due_ts IS NULL BEGIN
+            UPDATE borrow_records SET due_ts = CAST(strftime('%s', new.due_date) AS INTEGER)
+            WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER borrow_records_due_ts_update AFTER UPDATE OF due_date ON borrow_records BEGIN
+            UPDATE borrow_records SET due_ts = CAST(strftime('%s', new.due_date) AS INTEGER)
+            WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_borrow_records_open_due
+        ON borrow_records (due_ts) WHERE return_date IS NULL
+    ''')
+
+def _migration_loan_archive(conn):
+    """v8: archive table for long-returned loans, moved out of borrow_records by archive_returned_loans()."""
+    conn.execute('''
+        CREATE TABLE borrow_records_archive (
+            id INTEGER PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT NOT NULL,
+            fee_charged REAL,
+            due_ts INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_borrow_records_archive_history
+        ON borrow_records_archive (patron_id, return_date, id)
+    ''')
+
+def _migration_patron_borrow_locks(conn):
+    """v9: per-patron borrow locks, taken on the patron's home shard when SHARDS is set."""
+    conn.execute('''
+        CREATE TABLE patron_borrow_locks (
+            patron_id TEXT PRIMARY KEY,
+            token TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_search_totals(conn):
+    """
+    v10: trigger-maintained book count and trigram count (what a trigram FTS5
+    index holds) of books, for ranking searches across shards.
+    """
+    trigrams = 'max(length({0}.title) - 2, 0) + max(length({0}.author) - 2, 0)'
+    conn.execute('''
+        CREATE TABLE search_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            books INTEGER NOT NULL,
+            trigrams INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO search_totals (id, books, trigrams)
+        SELECT 1, COUNT(*), COALESCE(SUM({trigrams.format('books')}), 0) FROM books
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER search_totals_insert AFTER INSERT ON books BEGIN
+            UPDATE search_totals SET books = books + 1, trigrams = trigrams + {trigrams.format('new')}
+            WHERE id = 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER search_totals_update AFTER UPDATE OF title, author ON books BEGIN
+            UPDATE search_totals
+            SET trigrams = trigrams - ({trigrams.format('old')}) + {trigrams.format('new')}
+            WHERE id = 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER search_totals_delete AFTER DELETE ON books BEGIN
+            UPDATE search_totals SET books = books - 1, trigrams = trigrams - ({trigrams.format('old')})
+            WHERE id = 1;
+        END
+    ''')
+
+MIGRATIONS = [
+    _migration_catalog_indexes,
+    _migration_borrow_record_indexes,
+    _migration_catalog_version,
+    _migration_patron_summary,
+    _migration_catalog_updated_at,
+    _migration_book_changes,
+    _migration_loan_timestamps,
+    _migration_loan_archive,
+    _migration_patron_borrow_locks,
+    _migration_search_totals,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(conn) -> int:
+    """Get the schema version recorded in PRAGMA user_version."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate_database(conn):
+    """Apply every migration newer than the database's PRAGMA user_version."""
+    while get_schema_version(conn) < SCHEMA_VERSION:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-read under the write lock in case another process migrated first
+            version = get_schema_version(conn)
+            if version < SCHEMA_VERSION:
+                MIGRATIONS[version](conn)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def init_search_index(conn):
+    """
+    Create the books_fts full-text index and the triggers that keep it in sync.
+
+    The trigram tokenizer indexes every 3-character substring, so a phrase
+    query matches anywhere inside a title or author (substring and prefix
+    search) and can be ranked with bm25(). Builds of SQLite without FTS5 fall
+    back to substring scans in search_books().
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    if exists:
+        return
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE books_fts USING fts5(
+                title, author,
+                content='books', content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    
+    # Index any books that existed before the index was created
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
+    if _sharded():
+        return _sharded_add_sample_data()
     conn = get_db_connection()
     book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
     
@@ -79,90 +1020,515 @@ def add_sample_data():
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
         
         conn.commit()
+        cache = get_book_cache()
+        if cache is not None:
+            cache.clear()
+        if _suggest_index is not None:
+            _suggest_index.expire()
     
     conn.close()
 
 # Helper Functions for Database Operations
 
+SECONDS_PER_DAY = 86400
+_EPOCH = datetime(1970, 1, 1)
+
+def to_timestamp(moment: datetime) -> int:
+    """
+    Seconds since 1970-01-01 of a naive (wall-clock) datetime, matching
+    SQLite's strftime('%s', ...) of its ISO text; // SECONDS_PER_DAY gives
+    the day number.
+    """
+    return int((moment - _EPOCH).total_seconds())
+
+def _cached_read(key: Hashable, load):
+    """Return the cached value for `key`, calling load() to fill it on a miss."""
+    cache = get_book_cache()
+    if cache is None:
+        return load()
+    generation = cache.sync()
+    value = cache.get(key)
+    if value is MISSING:
+        value = load()
+        cache.put(key, value, generation)
+    return value
+
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
+    if _sharded():
+        return sorted((book for books in _scatter(get_all_books) for book in books),
+                      key=_title_order)
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return snapshot.get_all_books()
+    def load():
+        conn = get_db_connection()
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+        conn.close()
+        return [dict(book) for book in books]
+    return [dict(book) for book in _cached_read(('all',), load)]
+
+def get_books_page(after: Optional[Tuple[str, int]] = None, limit: int = 50) -> List[Dict]:
+    """
+    Get up to `limit` books ordered by (title, id), starting after the
+    (title, id) keyset cursor `after`.
+    """
+    if _sharded():
+        return list(heapq.merge(*_scatter(get_books_page, after, limit), key=_title_order))[:limit]
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return snapshot.get_books_page(after, limit)
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    if after is None:
+        books = conn.execute(
+            'SELECT * FROM books ORDER BY title, id LIMIT ?', (limit,)
+        ).fetchall()
+    else:
+        books = conn.execute(
+            'SELECT * FROM books WHERE (title, id) > (?, ?) ORDER BY title, id LIMIT ?',
+            (after[0], after[1], limit)
+        ).fetchall()
     conn.close()
     return [dict(book) for book in books]
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
+def iter_books(batch_size: int = 500):
+    """Yield every book ordered by title, fetching `batch_size` rows at a time."""
+    if _sharded():
+        yield from _sharded_iter_pages(lambda last: get_books_page(last and _title_order(last), batch_size))
+        return
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        yield from snapshot.iter_books(batch_size)
+        return
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('SELECT * FROM books ORDER BY title, id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def iter_books_by_id(batch_size: int = 500):
+    """Yield every book in ID order straight from SQL, fetching `batch_size` rows at a time."""
+    if _sharded():
+        yield from _sharded_iter_pages(lambda last: get_books_after_id(last['id'] if last else 0, batch_size))
+        return
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('SELECT * FROM books ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def get_books_after_id(after_id: int = 0, limit: int = 100) -> List[Dict]:
+    """Get up to `limit` books with IDs greater than `after_id`, in ID order."""
+    if _sharded():
+        return list(heapq.merge(*_scatter(get_books_after_id, after_id, limit),
+                                key=lambda book: book['id']))[:limit]
+    conn = get_db_connection()
+    books = conn.execute(
+        'SELECT * FROM books WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit)
+    ).fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+def get_catalog_watermark() -> Watermark:
+    """
+    Get the latest book_changes seq. Books changed after this point are
+    returned by get_book_changes(since=<watermark>). With SHARDS this is a
+    tuple of every shard's latest seq.
+    """
+    if _sharded():
+        return tuple(_scatter(get_catalog_watermark))
+    conn = get_db_connection()
+    watermark = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM book_changes').fetchone()[0]
+    conn.close()
+    return watermark
+
+def get_book_changes(since: Watermark, limit: int = 100) -> List[Tuple[Watermark, int, Optional[Dict]]]:
+    """
+    Get up to `limit` books inserted, updated or deleted after the watermark
+    `since`, oldest change first, as (seq, book_id, book) tuples; `book` is
+    None for deleted books. Each book appears once, at its latest change.
+
+    With SHARDS, `since` is a per-shard watermark tuple, changes come in
+    (shard, seq) order and each carries the tuple watermark just past it.
+    Raises ValueError for a watermark of the wrong shape.
+    """
+    if _sharded():
+        return _sharded_book_changes(since, limit)
+    if not isinstance(since, int):
+        raise ValueError('since must be a book_changes seq')
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT c.seq, c.book_id, b.*
+        FROM book_changes c LEFT JOIN books b ON b.id = c.book_id
+        WHERE c.seq > ?
+        ORDER BY c.seq
+        LIMIT ?
+    ''', (since, limit)).fetchall()
+    conn.close()
+    changes = []
+    for row in rows:
+        book = {column: row[column] for column in row.keys()[2:]} if row['id'] is not None else None
+        changes.append((row['seq'], row['book_id'], book))
+    return changes
+
+def _load_book_by_id(book_id: int) -> Optional[Dict]:
     conn = get_db_connection()
     book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
     conn.close()
     return dict(book) if book else None
 
+def get_book_by_id(book_id: int) -> Optional[Dict]:
+    """Get a specific book by ID."""
+    if _sharded():
+        return _route(_book_shard(book_id), get_book_by_id, book_id)
+    cache = get_book_cache()
+    if cache is None:
+        return _load_book_by_id(book_id)
+    generation = cache.sync()
+    book = cache.get(('id', book_id))
+    if book is MISSING:
+        book = _load_book_by_id(book_id)
+        if book is None:
+            return None  # not cached: the ID may be inserted later
+        cache.put(('id', book_id), book, generation)
+    return dict(book)
+
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
+    if _sharded():
+        return _route(_isbn_shard(isbn), get_book_by_isbn, isbn)
+    def load():
+        conn = get_db_connection()
+        row = conn.execute('SELECT id FROM books WHERE isbn = ?', (isbn,)).fetchone()
+        conn.close()
+        return row['id'] if row else None
+    # ISBNs never change, so the cache maps ISBN -> book ID (or None if absent)
+    book_id = _cached_read(('isbn', isbn), load)
+    return get_book_by_id(book_id) if book_id is not None else None
+
+def search_books(term: str, field: str, limit: Optional[int] = None, offset: int = 0,
+                 missing: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Search books by case-insensitive substring of `field` ('title' or 'author').
+
+    Terms of 3+ characters are served by the books_fts index and ordered by
+    BM25 relevance; shorter terms (which trigrams cannot index) scan with
+    Python's Unicode-aware str.lower() and are ordered by title. With
+    CATALOG_SNAPSHOT enabled every term is matched in memory and results are
+    ordered by title.
+
+    With SHARDS, every shard is searched concurrently and the results merged
+    by (relevance, title, id); shards that time out are left out and their
+    indexes appended to `missing`.
+    """
+    if field not in ('title', 'author'):
+        raise ValueError(f'Unsupported search field: {field}')
+    if _sharded():
+        return _sharded_search_books(term, field, limit, offset, missing)
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        return snapshot.search(term, field, limit, offset)
+    return [book for _, book in _search_rows(term, field, limit, offset)]
+
+def _search_rows(term: str, field: str, limit: Optional[int], offset: int,
+                 average_tokens: Optional[float] = None) -> List[Tuple[float, Dict]]:
+    """
+    search_books() in SQL, as (rank, book) pairs; rank is the BM25 score, or
+    0 for scan matches. With `average_tokens` (the catalog-wide average row
+    size in trigrams) the score is trigram_bm25() instead of bm25(), which
+    uses this database's own average.
+    """
+    limit = -1 if limit is None else limit
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    try:
+        if len(term) >= 3:
+            try:
+                phrase = '"' + term.replace('"', '""') + '"'
+                if average_tokens is None:
+                    rank, params = 'bm25(books_fts)', ()
+                else:
+                    other = 'author' if field == 'title' else 'title'
+                    rank, params = f'trigram_bm25(b.{field}, b.{other}, ?, ?)', (term, average_tokens)
+                books = conn.execute(f'''
+                    SELECT {rank} AS rank, b.* FROM books_fts f
+                    JOIN books b ON b.id = f.rowid
+                    WHERE books_fts MATCH ?
+                    ORDER BY rank, b.title, b.id
+                    LIMIT ? OFFSET ?
+                ''', params + (f'{field} : {phrase}', limit, offset)).fetchall()
+                return [(book[0], {column: book[column] for column in book.keys()[1:]})
+                        for book in books]
+            except sqlite3.OperationalError as e:
+                # Scan only if this database has no FTS5 index; anything else
+                # (e.g. a scatter interrupting a slow shard) must not start one
+                if not str(e).startswith(('no such table', 'no such module')):
+                    raise
+        books = conn.execute(f'''
+            SELECT * FROM books WHERE instr(unicode_lower({field}), ?) > 0
+            ORDER BY title, id
+            LIMIT ? OFFSET ?
+        ''', (term.lower(), limit, offset)).fetchall()
+        return [(0.0, dict(book)) for book in books]
+    finally:
+        conn.close()
+
+def _search_totals() -> Tuple[int, int]:
+    """(books, trigrams) from search_totals: the row count and token count a trigram index of books holds."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT books, trigrams FROM search_totals WHERE id = 1').fetchone()
     conn.close()
-    return dict(book) if book else None
+    return row['books'], row['trigrams']
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
-    """Get currently borrowed books for a patron."""
+def get_patron_borrowed_books(patron_id: str, now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Get currently borrowed books for a patron.
+    
+    is_overdue (due before `now`) and days_overdue (whole calendar days past
+    the due date) are computed in SQL from due_ts.
+    """
+    if _sharded():
+        return list(heapq.merge(*_scatter(get_patron_borrowed_books, patron_id, now),
+                                key=lambda record: record['borrow_date']))
+    now_ts = to_timestamp(now or datetime.now())
     conn = get_db_connection()
     records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+        SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date,
+               br.due_ts < ? AS is_overdue,
+               MAX(0, ? - br.due_ts / ?) AS days_overdue
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ? AND br.return_date IS NULL
         ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
+    ''', (now_ts, now_ts // SECONDS_PER_DAY, SECONDS_PER_DAY, patron_id)).fetchall()
     conn.close()
     
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
-    
-    return borrowed_books
+    return [{
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': datetime.fromisoformat(record['borrow_date']),
+        'due_date': datetime.fromisoformat(record['due_date']),
+        'is_overdue': bool(record['is_overdue']),
+        'days_overdue': record['days_overdue']
+    } for record in records]
 
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
+    return get_patron_summary(patron_id)['active_count']
+
+def get_patron_summary(patron_id: str) -> Dict:
+    """
+    Get a patron's trigger-maintained loan summary: active_count,
+    lifetime_loans and outstanding_fees (late fees charged on returns).
+    """
+    if _sharded():
+        return _sharded_patron_summary(patron_id)
     conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
+    summary = conn.execute(
+        'SELECT * FROM patron_summary WHERE patron_id = ?', (patron_id,)
+    ).fetchone()
     conn.close()
-    return count
+    if summary is None:
+        return {'patron_id': patron_id, 'active_count': 0, 'lifetime_loans': 0, 'outstanding_fees': 0.0}
+    return dict(summary)
+
+def get_patron_history(patron_id: str, before: Optional[Tuple[str, int]] = None,
+                       limit: int = 20) -> List[Dict]:
+    """
+    Get a patron's returned loans, most recently returned first.
+
+    Keyset-paginated on (return_date, id): pass the last row's values as
+    `before` to fetch the next page. Covers both borrow_records and
+    borrow_records_archive; each contributes at most `limit` rows read from
+    its (patron_id, return_date, id) index.
+    """
+    if _sharded():
+        return list(heapq.merge(*_scatter(get_patron_history, patron_id, before, limit),
+                                key=lambda record: (record['return_date'], record['id']),
+                                reverse=True))[:limit]
+    keyset = ' AND (return_date, id) < (?, ?)' if before is not None else ''
+    branch = f'''
+        SELECT * FROM (
+            SELECT id, book_id, borrow_date, due_date, return_date, fee_charged
+            FROM {{table}}
+            WHERE patron_id = ? AND return_date IS NOT NULL{keyset}
+            ORDER BY return_date DESC, id DESC LIMIT ?
+        )
+    '''
+    params = [patron_id] + (list(before) if before is not None else []) + [limit]
+    conn = get_db_connection()
+    records = conn.execute(f'''
+        SELECT h.*, b.title, b.author
+        FROM ({branch.format(table='borrow_records')}
+              UNION ALL
+              {branch.format(table='borrow_records_archive')}) h
+        LEFT JOIN books b ON h.book_id = b.id
+        ORDER BY h.return_date DESC, h.id DESC LIMIT ?
+    ''', params + params + [limit]).fetchall()
+    conn.close()
+    
+    return [{
+        'id': record['id'],
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': datetime.fromisoformat(record['borrow_date']),
+        'due_date': datetime.fromisoformat(record['due_date']),
+        'return_date': datetime.fromisoformat(record['return_date']),
+        'fee_charged': record['fee_charged']
+    } for record in records]
+
+def archive_returned_loans(returned_before: datetime, batch_size: int = 500,
+                           pause: float = 0.0) -> int:
+    """
+    Move loans returned before `returned_before` from borrow_records to
+    borrow_records_archive, `batch_size` rows per short write transaction
+    (sleeping `pause` seconds between batches so other writers get the lock).
+
+    Returns:
+        int: Number of loans archived
+    """
+    if _sharded():
+        return sum(_route(index, archive_returned_loans, returned_before, batch_size, pause)
+                   for index in range(len(SHARDS)))
+    cutoff = returned_before.isoformat()
+    moved = 0
+    last_id = 0
+    conn = get_db_connection()
+    try:
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            ids = [row[0] for row in conn.execute('''
+                SELECT id FROM borrow_records
+                WHERE id > ? AND return_date IS NOT NULL AND return_date < ?
+                ORDER BY id LIMIT ?
+            ''', (last_id, cutoff, batch_size))]
+            if not ids:
+                conn.rollback()
+                break
+            # Same predicate over the rowid range just selected
+            batch = (last_id, ids[-1], cutoff)
+            conn.execute('''
+                INSERT INTO borrow_records_archive
+                    (id, patron_id, book_id, borrow_date, due_date, return_date, fee_charged, due_ts)
+                SELECT id, patron_id, book_id, borrow_date, due_date, return_date, fee_charged, due_ts
+                FROM borrow_records
+                WHERE id > ? AND id <= ? AND return_date IS NOT NULL AND return_date < ?
+            ''', batch)
+            conn.execute('''
+                DELETE FROM borrow_records
+                WHERE id > ? AND id <= ? AND return_date IS NOT NULL AND return_date < ?
+            ''', batch)
+            conn.commit()
+            moved += len(ids)
+            last_id = ids[-1]
+            if pause:
+                time.sleep(pause)
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+    return moved
+
+def _allocate_book_ids(conn, count: int) -> List[Optional[int]]:
+    """
+    IDs for `count` new books in the open write transaction on `conn`: None
+    (let SQLite pick) unless inside a routed call, where IDs must name the shard.
+    """
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        return [None] * count
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'books'").fetchone()
+    return allocate_book_ids(row[0] if row else None, shard, len(SHARDS), count)
 
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
+    if _sharded():
+        return _route(_isbn_shard(isbn), insert_book, title, author, isbn, total_copies, available_copies)
     conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
+        version = _begin_books_write(conn)
+        book_id = conn.execute('''
+            INSERT INTO books (id, title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (_allocate_book_ids(conn, 1)[0], title, author, isbn, total_copies, available_copies)).lastrowid
+        _commit_books_write(conn, version, _book_keys(book_id) + (('isbn', isbn),))
         conn.close()
+        if _suggest_index is not None:
+            _suggest_index.note_insert(book_id, title, author)
         return True
     except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
         conn.close()
         return False
 
+def insert_books(books: List[Tuple[str, str, str, int]], failed: Optional[set] = None) -> Optional[set]:
+    """
+    Insert a batch of (title, author, isbn, total_copies) books in one transaction.
+
+    Books whose ISBN is already in the catalog are skipped. The ISBNs of books
+    not inserted because of an error are added to `failed`. With SHARDS each
+    shard's books go in their own transaction, so part of a batch can fail
+    while the rest is inserted.
+
+    Returns:
+        set: ISBNs that were skipped as duplicates, or None if nothing could be inserted
+    """
+    if _sharded():
+        return _sharded_insert_books(books, failed)
+    conn = get_db_connection()
+    try:
+        version = _begin_books_write(conn)
+        isbns = [book[2] for book in books]
+        existing = set()
+        for start in range(0, len(isbns), 500):
+            chunk = isbns[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            existing.update(row['isbn'] for row in conn.execute(
+                f'SELECT isbn FROM books WHERE isbn IN ({placeholders})', chunk
+            ))
+        new_books = [book for book in books if book[2] not in existing]
+        conn.executemany('''
+            INSERT INTO books (id, title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(book_id, title, author, isbn, copies, copies) for book_id, (title, author, isbn, copies)
+              in zip(_allocate_book_ids(conn, len(new_books)), new_books)])
+        _commit_books_write(conn, version, [('isbn', isbn) for isbn in isbns] + [('all',)])
+        if _suggest_index is not None:
+            _suggest_index.expire()
+        return existing
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        if failed is not None:
+            failed.update(book[2] for book in books)
+        return None
+    finally:
+        conn.close()
+
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
+    if _sharded():
+        return _route(_book_shard(book_id), insert_borrow_record, patron_id, book_id, borrow_date, due_date)
     conn = get_db_connection()
     try:
         conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, due_ts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(), to_timestamp(due_date)))
         conn.commit()
         conn.close()
         return True
@@ -172,20 +1538,27 @@ def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, du
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
+    if _sharded():
+        return _route(_book_shard(book_id), update_book_availability, book_id, change)
     conn = get_db_connection()
     try:
+        version = _begin_books_write(conn)
         conn.execute('''
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
         ''', (change, book_id))
-        conn.commit()
+        _commit_books_write(conn, version, _book_keys(book_id))
         conn.close()
         return True
     except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
         conn.close()
         return False
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
+    if _sharded():
+        return _route(_book_shard(book_id), update_borrow_record_return_date, patron_id, book_id, return_date)
     conn = get_db_connection()
     try:
         conn.execute('''
@@ -199,3 +1572,581 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
     except Exception as e:
         conn.close()
         return False
+
+# Transactional borrow/return operations
+
+BORROW_OK = 'ok'
+BORROW_NOT_FOUND = 'not_found'
+BORROW_UNAVAILABLE = 'unavailable'
+BORROW_LIMIT_REACHED = 'limit_reached'
+BORROW_ERROR = 'error'
+
+RETURN_OK = 'ok'
+RETURN_NOT_BORROWED = 'not_borrowed'
+RETURN_ERROR = 'error'
+
+def _borrow_in_transaction(conn, patron_id: str, book_id: int, borrow_date: datetime,
+                           due_date: datetime, max_borrowed: int):
+    """
+    The body of borrow_book(), run inside an open write transaction.
+    Returns ((status, book), changed cache keys); nothing is written unless status is BORROW_OK.
+    """
+    updated = conn.execute('''
+        UPDATE books SET available_copies = available_copies - 1
+        WHERE id = ? AND available_copies > 0
+          AND COALESCE((SELECT active_count FROM patron_summary WHERE patron_id = ?), 0) < ?
+    ''', (book_id, patron_id, max_borrowed)).rowcount
+    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    
+    if not updated:
+        if book is None:
+            return (BORROW_NOT_FOUND, None), ()
+        if book['available_copies'] <= 0:
+            return (BORROW_UNAVAILABLE, dict(book)), ()
+        return (BORROW_LIMIT_REACHED, dict(book)), ()
+    
+    conn.execute('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, due_ts)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(), to_timestamp(due_date)))
+    return (BORROW_OK, dict(book)), _book_keys(book_id)
+
+def _return_in_transaction(conn, patron_id: str, book_id: int, return_date: datetime,
+                           fee_for: Optional[Callable[[datetime], float]]):
+    """
+    The body of return_book(), run inside an open write transaction.
+    Returns ((status, record), changed cache keys).
+    """
+    record = conn.execute('''
+        SELECT * FROM borrow_records
+        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        ORDER BY borrow_date LIMIT 1
+    ''', (patron_id, book_id)).fetchone()
+    if record is None:
+        return (RETURN_NOT_BORROWED, None), ()
+    
+    due_date = datetime.fromisoformat(record['due_date'])
+    fee = fee_for(due_date) if fee_for else 0.0
+    conn.execute('UPDATE borrow_records SET return_date = ?, fee_charged = ? WHERE id = ?',
+                 (return_date.isoformat(), fee, record['id']))
+    conn.execute('''
+        UPDATE books SET available_copies = available_copies + 1
+        WHERE id = ? AND available_copies < total_copies
+    ''', (book_id,))
+    return (RETURN_OK, {
+        'id': record['id'],
+        'book_id': record['book_id'],
+        'borrow_date': datetime.fromisoformat(record['borrow_date']),
+        'due_date': due_date,
+        'return_date': return_date,
+        'fee_charged': fee
+    }), _book_keys(book_id)
+
+def _run_write(body, args: tuple, error):
+    """
+    Run `body(conn, *args)` in its own BEGIN IMMEDIATE transaction, or hand it
+    to the group-commit writer when GROUP_COMMIT is enabled. Returns the
+    body's result, or `error` if the transaction failed.
+    """
+    writer = get_group_commit_writer()
+    if writer is not None:
+        return writer.submit(body, args, error)
+    conn = get_db_connection()
+    try:
+        version = _begin_books_write(conn)
+        result, keys = body(conn, *args)
+        if keys:
+            _commit_books_write(conn, version, keys)
+        else:
+            conn.rollback()
+        return result
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        return error
+    finally:
+        conn.close()
+
+def borrow_book(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                max_borrowed: int) -> Tuple[str, Optional[Dict]]:
+    """
+    Atomically lend one copy of a book to a patron.
+
+    Runs as a single BEGIN IMMEDIATE transaction: the availability decrement is
+    conditional on a free copy and on the patron holding fewer than
+    `max_borrowed` books, and the borrow record is only written if it applied.
+
+    Returns:
+        tuple: (status: one of the BORROW_* constants, book: dict or None)
+    """
+    if _sharded():
+        return _sharded_borrow_book(patron_id, book_id, borrow_date, due_date, max_borrowed)
+    return _run_write(_borrow_in_transaction,
+                      (patron_id, book_id, borrow_date, due_date, max_borrowed),
+                      (BORROW_ERROR, None))
+
+def return_book(patron_id: str, book_id: int, return_date: datetime,
+                fee_for: Optional[Callable[[datetime], float]] = None) -> Tuple[str, Optional[Dict]]:
+    """
+    Atomically close a patron's open loan of a book and restore the copy.
+
+    `fee_for(due_date)` gives the late fee to charge, which is stored on the
+    record and added to the patron's outstanding fees.
+
+    Returns:
+        tuple: (status: one of the RETURN_* constants,
+                record: the closed borrow record with parsed dates, or None)
+    """
+    if _sharded():
+        return _route(_book_shard(book_id), return_book, patron_id, book_id, return_date, fee_for)
+    return _run_write(_return_in_transaction, (patron_id, book_id, return_date, fee_for),
+                      (RETURN_ERROR, None))
+
+def borrow_books(patron_id: str, book_ids: List[int], borrow_date: datetime, due_date: datetime,
+                 max_borrowed: int) -> List[Tuple[int, str, Optional[Dict]]]:
+    """
+    Lend several books to one patron in a single BEGIN IMMEDIATE transaction.
+
+    The patron's loan count and every requested book are read once; items are
+    then granted in order while copies and borrowing slots remain, and all
+    granted items are written with two executemany() calls.
+
+    Returns:
+        list: (book_id, status: one of the BORROW_* constants, book dict or None)
+              per requested item, in request order
+    """
+    if _sharded():
+        return _sharded_borrow_books(patron_id, book_ids, borrow_date, due_date, max_borrowed)
+    conn = get_db_connection()
+    try:
+        version = _begin_books_write(conn)
+        row = conn.execute(
+            'SELECT active_count FROM patron_summary WHERE patron_id = ?', (patron_id,)
+        ).fetchone()
+        slots = max_borrowed - (row['active_count'] if row else 0)
+        
+        unique_ids = list(dict.fromkeys(book_ids))
+        books = {}
+        for start in range(0, len(unique_ids), 500):
+            chunk = unique_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for book in conn.execute(f'SELECT * FROM books WHERE id IN ({placeholders})', chunk):
+                books[book['id']] = dict(book)
+        
+        results = []
+        granted = []
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None:
+                results.append((book_id, BORROW_NOT_FOUND, None))
+            elif book['available_copies'] <= 0:
+                results.append((book_id, BORROW_UNAVAILABLE, dict(book)))
+            elif slots <= 0:
+                results.append((book_id, BORROW_LIMIT_REACHED, dict(book)))
+            else:
+                book['available_copies'] -= 1
+                slots -= 1
+                granted.append(book_id)
+                results.append((book_id, BORROW_OK, dict(book)))
+        
+        if not granted:
+            conn.rollback()
+            return results
+        
+        conn.executemany('UPDATE books SET available_copies = available_copies - 1 WHERE id = ?',
+                         [(book_id,) for book_id in granted])
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, due_ts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(patron_id, book_id, borrow_date.isoformat(), due_date.isoformat(), to_timestamp(due_date))
+              for book_id in granted])
+        _commit_books_write(conn, version, [key for book_id in set(granted) for key in _book_keys(book_id)])
+        return results
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        return [(book_id, BORROW_ERROR, None) for book_id in book_ids]
+    finally:
+        conn.close()
+
+def return_books(patron_id: str, book_ids: List[int], return_date: datetime,
+                 fee_for: Optional[Callable[[datetime], float]] = None) -> List[Tuple[int, str, Optional[Dict]]]:
+    """
+    Close several of a patron's open loans in a single BEGIN IMMEDIATE transaction.
+
+    Each requested book closes the patron's oldest still-open loan of it; the
+    updates are written with two executemany() calls.
+
+    Returns:
+        list: (book_id, status: one of the RETURN_* constants, closed record or None)
+              per requested item, in request order
+    """
+    if _sharded():
+        return _sharded_return_books(patron_id, book_ids, return_date, fee_for)
+    conn = get_db_connection()
+    try:
+        version = _begin_books_write(conn)
+        open_loans = {}
+        for record in conn.execute('''
+            SELECT * FROM borrow_records
+            WHERE patron_id = ? AND return_date IS NULL
+            ORDER BY borrow_date
+        ''', (patron_id,)):
+            open_loans.setdefault(record['book_id'], []).append(record)
+        
+        results = []
+        closed = []
+        for book_id in book_ids:
+            loans = open_loans.get(book_id)
+            if not loans:
+                results.append((book_id, RETURN_NOT_BORROWED, None))
+                continue
+            record = loans.pop(0)
+            due_date = datetime.fromisoformat(record['due_date'])
+            fee = fee_for(due_date) if fee_for else 0.0
+            closed.append((record['id'], book_id, fee))
+            results.append((book_id, RETURN_OK, {
+                'id': record['id'],
+                'book_id': book_id,
+                'borrow_date': datetime.fromisoformat(record['borrow_date']),
+                'due_date': due_date,
+                'return_date': return_date,
+                'fee_charged': fee
+            }))
+        
+        if not closed:
+            conn.rollback()
+            return results
+        
+        conn.executemany('UPDATE borrow_records SET return_date = ?, fee_charged = ? WHERE id = ?',
+                         [(return_date.isoformat(), fee, record_id) for record_id, _, fee in closed])
+        conn.executemany('''
+            UPDATE books SET available_copies = available_copies + 1
+            WHERE id = ? AND available_copies < total_copies
+        ''', [(book_id,) for _, book_id, _ in closed])
+        _commit_books_write(conn, version,
+                            [key for _, book_id, _ in closed for key in _book_keys(book_id)])
+        return results
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        return [(book_id, RETURN_ERROR, None) for book_id in book_ids]
+    finally:
+        conn.close()
+
+# Reports
+
+def iter_overdue_loans(today: str, fee_per_day: float, fee_cap: float,
+                       batch_size: int = 1000):
+    """
+    Yield every open loan that is overdue on `today` (an ISO date), oldest due first.
+
+    Days overdue and the capped late fee are computed in SQL, and the
+    overdue loans are found on the open-loan due_ts index.
+    """
+    if _sharded():
+        yield from _sharded_overdue_loans(today, fee_per_day, fee_cap, batch_size)
+        return
+    today_day = to_timestamp(datetime.fromisoformat(today)) // SECONDS_PER_DAY
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            SELECT patron_id, book_id, title, author, borrow_date, due_date, days_overdue,
+                   MIN(?, ? * days_overdue) AS fee_amount
+            FROM (
+                SELECT br.patron_id, br.book_id, b.title, b.author, br.borrow_date, br.due_date,
+                       br.due_ts, ? - br.due_ts / ? AS days_overdue
+                FROM borrow_records br
+                JOIN books b ON b.id = br.book_id
+                WHERE br.return_date IS NULL AND br.due_ts < ?
+            )
+            ORDER BY due_ts, patron_id, book_id
+        ''', (fee_cap, fee_per_day, today_day, SECONDS_PER_DAY, today_day * SECONDS_PER_DAY))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def iter_patron_late_fees(today: str, fee_per_day: float, fee_cap: float,
+                          batch_size: int = 1000):
+    """
+    Yield the overdue-loan count and late-fee total of every patron with an
+    overdue loan on `today` (an ISO date), aggregated in one SQL query.
+    """
+    if _sharded():
+        yield from _sharded_patron_late_fees(today, fee_per_day, fee_cap, batch_size)
+        return
+    today_day = to_timestamp(datetime.fromisoformat(today)) // SECONDS_PER_DAY
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            SELECT patron_id,
+                   COUNT(*) AS overdue_count,
+                   MAX(days_overdue) AS max_days_overdue,
+                   SUM(MIN(?, ? * days_overdue)) AS total_late_fees
+            FROM (
+                SELECT patron_id, ? - due_ts / ? AS days_overdue
+                FROM borrow_records
+                WHERE return_date IS NULL AND due_ts < ?
+            )
+            GROUP BY patron_id
+            ORDER BY patron_id
+        ''', (fee_cap, fee_per_day, today_day, SECONDS_PER_DAY, today_day * SECONDS_PER_DAY))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+# Sharded implementations (see "Shard routing" above)
+
+def _title_order(book: Dict) -> Tuple[str, int]:
+    return book['title'], book['id']
+
+def _sharded_iter_pages(fetch_page: Callable[[Optional[Dict]], List[Dict]]):
+    """Yield every row of consecutive fetch_page(last row of previous page) pages."""
+    last = None
+    while True:
+        page = fetch_page(last)
+        if not page:
+            return
+        yield from page
+        last = page[-1]
+
+def _sharded_catalog_version() -> Tuple[int, datetime]:
+    # The sum of per-shard counters moves whenever any shard's does
+    versions = _scatter(get_catalog_version)
+    return sum(version for version, _ in versions), max(updated for _, updated in versions)
+
+def _count_books() -> int:
+    conn = get_db_connection()
+    count = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    conn.close()
+    return count
+
+def _sharded_add_sample_data():
+    if sum(_scatter(_count_books)):
+        return
+    insert_books([
+        ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+        ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+        ('1984', 'George Orwell', '9780451524935', 1)
+    ])
+    # Make 1984 unavailable by lending its only copy
+    borrow_book('123456', get_book_by_isbn('9780451524935')['id'],
+                datetime.now() - timedelta(days=5), datetime.now() + timedelta(days=9), 1)
+
+def _sharded_book_changes(since: Watermark, limit: int) -> List[Tuple[Watermark, int, Optional[Dict]]]:
+    if not isinstance(since, tuple) or len(since) != len(SHARDS):
+        raise ValueError(f'since must hold one book_changes seq per shard ({len(SHARDS)})')
+    # Each shard reads up to `limit` changes past its own seq; the first
+    # `limit` in (shard, seq) order are returned
+    found = _scatter(lambda: get_book_changes(since[_local.shard], limit))
+    position = list(since)
+    changes = []
+    for shard, shard_changes in enumerate(found):
+        for seq, book_id, book in shard_changes[:limit - len(changes)]:
+            position[shard] = seq
+            changes.append((tuple(position), book_id, book))
+    return changes
+
+def _sharded_suggest_books(prefix: str, field: str, limit: int) -> List[str]:
+    completions = []
+    for path in SHARDS:
+        index = _shard_suggest_indexes.get(path)
+        if index is None:
+            with _pool_lock:
+                index = _shard_suggest_indexes.get(path)
+                if index is None:
+                    index = _shard_suggest_indexes[path] = SuggestIndex(
+                        path, BUSY_TIMEOUT, SUGGEST_REFRESH_INTERVAL)
+        completions.append(index.suggest(prefix, field, limit))
+    return merge_completions(prefix, completions, limit)
+
+def _sharded_search_books(term: str, field: str, limit: Optional[int], offset: int,
+                          missing: Optional[List[int]]) -> List[Dict]:
+    # bm25() scores use each index's own average row size, so they do not
+    # compare across shards: first total the shards' search_totals, then rank
+    # every shard's matches against the catalog-wide average. Every shard
+    # returns its best offset + limit rows; the page is cut from their merge.
+    window = None if limit is None or limit < 0 else offset + limit
+    missing = [] if missing is None else missing
+    average_tokens = None
+    if len(term) >= 3:
+        totals = [total for total in _scatter(_search_totals, timeout=SHARD_TIMEOUT, missing=missing)
+                  if total is not None]
+        rows = sum(count for count, _ in totals)
+        average_tokens = sum(tokens for _, tokens in totals) / rows if rows else 1.0
+    answering = [index for index in range(len(SHARDS)) if index not in missing]
+    found = _scatter(_search_rows, term, field, window, 0, average_tokens,
+                     timeout=SHARD_TIMEOUT, missing=missing, shards=answering)
+    rows = heapq.merge(*(rows for rows in found if rows is not None),
+                       key=lambda row: (row[0], row[1]['title'], row[1]['id']))
+    return [book for _, book in rows][offset:window]
+
+def _sharded_patron_summary(patron_id: str) -> Dict:
+    summary = {'patron_id': patron_id, 'active_count': 0, 'lifetime_loans': 0, 'outstanding_fees': 0.0}
+    for shard_summary in _scatter(get_patron_summary, patron_id):
+        for column in ('active_count', 'lifetime_loans', 'outstanding_fees'):
+            summary[column] += shard_summary[column]
+    return summary
+
+def _loans_on_other_shards(patron_id: str, shard: int) -> int:
+    return sum(summary['active_count'] for index, summary
+               in enumerate(_scatter(get_patron_summary, patron_id)) if index != shard)
+
+def _take_patron_lock(patron_id: str, token: str) -> bool:
+    """Take patron_id's borrow lock on this shard unless someone else holds an unexpired one."""
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        now = time.time()
+        taken = conn.execute('''
+            INSERT INTO patron_borrow_locks (patron_id, token, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (patron_id) DO UPDATE SET token = excluded.token, expires_at = excluded.expires_at
+            WHERE expires_at < ?
+        ''', (patron_id, token, now + PATRON_LOCK_TTL, now)).rowcount
+        conn.commit()
+        return taken > 0
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _drop_patron_lock(patron_id: str, token: str):
+    conn = get_db_connection()
+    try:
+        conn.execute('DELETE FROM patron_borrow_locks WHERE patron_id = ? AND token = ?', (patron_id, token))
+        conn.commit()
+    finally:
+        conn.close()
+
+@contextmanager
+def _patron_borrow_lock(patron_id: str):
+    """
+    Hold patron_id's borrow lock, a row on their home shard, for the block.
+    Loans on every shard only grow while it is held, so the limit check and
+    the borrows made under it cannot race another borrow by the same patron.
+    Waits up to BUSY_TIMEOUT seconds for it, then raises TimeoutError.
+    Failing to release it is only logged: the block's borrows are already
+    committed, and the row expires after PATRON_LOCK_TTL seconds.
+    """
+    home = _patron_shard(patron_id)
+    token = os.urandom(16).hex()
+    deadline = time.monotonic() + BUSY_TIMEOUT
+    while not _route(home, _take_patron_lock, patron_id, token):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f'borrow lock of patron {patron_id} is busy')
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        try:
+            _route(home, _drop_patron_lock, patron_id, token)
+        except Exception as e:
+            logger.warning('could not release borrow lock of patron %s: %r', patron_id, e)
+
+def _sharded_borrow_book(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                         max_borrowed: int) -> Tuple[str, Optional[Dict]]:
+    # Under the patron's lock, the loans held on other shards cannot change
+    # (except by returns) before the owning shard's transaction checks the limit
+    shard = _book_shard(book_id)
+    try:
+        with _patron_borrow_lock(patron_id):
+            return _route(shard, borrow_book, patron_id, book_id, borrow_date, due_date,
+                          max_borrowed - _loans_on_other_shards(patron_id, shard))
+    except Exception as e:
+        logger.warning('sharded borrow of book %s by patron %s failed: %r', book_id, patron_id, e)
+        return BORROW_ERROR, None
+
+def _group_by_shard(book_ids: List[int]) -> Dict[int, List[int]]:
+    """Positions in `book_ids` per owning shard."""
+    groups = {}
+    for position, book_id in enumerate(book_ids):
+        groups.setdefault(_book_shard(book_id), []).append(position)
+    return groups
+
+def _sharded_borrow_books(patron_id: str, book_ids: List[int], borrow_date: datetime,
+                          due_date: datetime, max_borrowed: int) -> List[Tuple[int, str, Optional[Dict]]]:
+    # One transaction per shard, lowest shard first, all under the patron's lock
+    results = [None] * len(book_ids)
+    try:
+        with _patron_borrow_lock(patron_id):
+            for shard, positions in sorted(_group_by_shard(book_ids).items()):
+                items = _route(shard, borrow_books, patron_id, [book_ids[p] for p in positions],
+                               borrow_date, due_date, max_borrowed - _loans_on_other_shards(patron_id, shard))
+                for position, item in zip(positions, items):
+                    results[position] = item
+    except Exception as e:
+        logger.warning('sharded borrow of books %s by patron %s failed: %r', book_ids, patron_id, e)
+        return [item or (book_id, BORROW_ERROR, None) for book_id, item in zip(book_ids, results)]
+    return results
+
+def _sharded_return_books(patron_id: str, book_ids: List[int], return_date: datetime,
+                          fee_for: Optional[Callable[[datetime], float]]) -> List[Tuple[int, str, Optional[Dict]]]:
+    results = [None] * len(book_ids)
+    for shard, positions in sorted(_group_by_shard(book_ids).items()):
+        items = _route(shard, return_books, patron_id, [book_ids[p] for p in positions],
+                       return_date, fee_for)
+        for position, item in zip(positions, items):
+            results[position] = item
+    return results
+
+def _sharded_insert_books(books: List[Tuple[str, str, str, int]], failed: Optional[set]) -> Optional[set]:
+    # One transaction per shard; a failed shard does not undo or stop the others
+    groups = {}
+    for book in books:
+        groups.setdefault(_isbn_shard(book[2]), []).append(book)
+    skipped = set()
+    inserted_any = False
+    for shard, shard_books in sorted(groups.items()):
+        existing = _route(shard, insert_books, shard_books, failed)
+        if existing is not None:
+            skipped |= existing
+            inserted_any = True
+    return skipped if inserted_any or not groups else None
+
+def _iter_every_shard(fn: Callable, *args) -> List:
+    """_iter_on_shard(index, fn, *args) for every shard; each fetches its own batches as the merge consumes it."""
+    return [_iter_on_shard(index, fn, *args) for index in range(len(SHARDS))]
+
+def _sharded_overdue_loans(today: str, fee_per_day: float, fee_cap: float, batch_size: int):
+    loans = _iter_every_shard(iter_overdue_loans, today, fee_per_day, fee_cap, batch_size)
+    try:
+        yield from heapq.merge(*loans, key=lambda loan: (datetime.fromisoformat(loan['due_date']),
+                                                         loan['patron_id'], loan['book_id']))
+    finally:
+        for iterator in loans:
+            iterator.close()
+
+def _sharded_patron_late_fees(today: str, fee_per_day: float, fee_cap: float, batch_size: int):
+    fees = _iter_every_shard(iter_patron_late_fees, today, fee_per_day, fee_cap, batch_size)
+    try:
+        yield from _sum_patron_fees(heapq.merge(*fees, key=lambda row: row['patron_id']))
+    finally:
+        for iterator in fees:
+            iterator.close()
+
+def _sum_patron_fees(rows):
+    """Combine consecutive per-shard rows of the same patron."""
+    total = None
+    for row in rows:
+        if total is not None and total['patron_id'] == row['patron_id']:
+            total['overdue_count'] += row['overdue_count']
+            total['max_days_overdue'] = max(total['max_days_overdue'], row['max_days_overdue'])
+            total['total_late_fees'] += row['total_late_fees']
+            continue
+        if total is not None:
+            yield total
+        total = dict(row)
+    if total is not None:
+        yield total
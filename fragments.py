@@ -0,0 +1,101 @@
+"""
+Fragments Module - cached HTML fragments and precompiled templates for catalog pages
+
+A catalog or search results row changes only when the book's copy counts
+change, so each rendered row is cached under (variant, id, available_copies,
+total_copies); templates call book_row(book) and a warm /catalog page is
+mostly the concatenation of cached strings. Misses call the book_row macro of
+_book_row.html directly, which is cheaper than rendering a template per row.
+Rows also remember the title, author and ISBN they were rendered from and are
+re-rendered if those were edited directly in the database.
+
+Rendered search results are cached per (type, term, catalog version), so a
+repeated search is served without querying or rendering until the catalog
+changes.
+
+Compiled templates are kept in a Jinja bytecode cache on disk; the gunicorn
+master fills it with precompile_templates() so forked workers load bytecode
+instead of compiling every template on their first requests.
+
+Configured through app.config:
+    FRAGMENT_CACHE_SIZE          rendered book rows kept (0 disables the row cache)
+    SEARCH_RESULTS_CACHE_SIZE    rendered search results kept (0 disables)
+    TEMPLATE_CACHE_DIR           bytecode cache directory (None: Jinja's per-user temp dir)
+"""
+
+from typing import Callable, Dict, List, Tuple
+
+from flask import current_app, render_template
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from cache import MISSING, ReadCache
+
+# Entries never go stale (the key pins everything they depend on); only LRU eviction drops them
+_NO_EXPIRY = float('inf')
+
+class Fragments:
+    """Row and search-result caches for one app."""
+
+    def __init__(self, row_cache_size: int, search_cache_size: int):
+        self.rows = ReadCache(row_cache_size, _NO_EXPIRY)
+        self.search_results = ReadCache(search_cache_size, _NO_EXPIRY)
+        self.row_macro = None  # the book_row macro of _book_row.html, loaded on first use
+
+def _fragments() -> Fragments:
+    return current_app.extensions['fragments']
+
+def book_row(book: Dict, variant: str = 'catalog') -> Markup:
+    """The rendered table row for `book` ('catalog' or 'search' variant)."""
+    fragments = _fragments()
+    key = (variant, book['id'], book['available_copies'], book['total_copies'])
+    text = (book['title'], book['author'], book['isbn'])
+    entry = fragments.rows.get(key)
+    if entry is not MISSING and entry[0] == text:
+        return entry[1]
+    if fragments.row_macro is None:
+        fragments.row_macro = current_app.jinja_env.get_template('_book_row.html').module.book_row
+    html = Markup(fragments.row_macro(book, variant))
+    fragments.rows.put(key, (text, html))
+    return html
+
+def search_results(search_term: str, search_type: str, version: int,
+                   search: Callable[..., List[Dict]]) -> Tuple[Markup, int, List[int]]:
+    """
+    The rendered results block of search.html, the number of matches and the
+    shards missing from them, calling search(term, type, missing=[]) only if
+    no rendering is cached for this catalog `version`. Results missing a
+    shard are not cached.
+    """
+    results = _fragments().search_results
+    key = (search_type, search_term, version)
+    entry = results.get(key)
+    if entry is MISSING:
+        missing = []
+        books = search(search_term, search_type, missing=missing)
+        html = Markup(render_template('_search_results.html', books=books,
+                                      search_term=search_term, search_type=search_type))
+        if missing:
+            return html, len(books), missing
+        entry = (html, len(books))
+        results.put(key, entry)
+    return entry + ([],)
+
+def precompile_templates(app):
+    """Compile every template once so its bytecode lands in the on-disk cache."""
+    with app.app_context():
+        for name in app.jinja_env.list_templates(extensions=['html']):
+            app.jinja_env.get_template(name)
+
+def cache_stats(app) -> Dict[str, Dict[str, int]]:
+    """Counters of the row and search-result caches."""
+    fragments = app.extensions['fragments']
+    return {'rows': fragments.rows.stats(), 'search_results': fragments.search_results.stats()}
+
+def init_app(app):
+    """Install the bytecode cache and the book_row() template global; call before rendering anything."""
+    app.jinja_options = {**app.jinja_options,
+                         'bytecode_cache': FileSystemBytecodeCache(app.config.get('TEMPLATE_CACHE_DIR'))}
+    app.extensions['fragments'] = Fragments(app.config.get('FRAGMENT_CACHE_SIZE', 20000),
+                                            app.config.get('SEARCH_RESULTS_CACHE_SIZE', 512))
+    app.add_template_global(book_row)
@@ -0,0 +1,168 @@
+"""
+Group Commit Module - single-writer queue that batches write transactions
+
+Request threads submit small write jobs (a borrow, a return) and block until
+their job is done. One writer thread takes every job that queued up while it
+was busy (plus those arriving within an optional window) and runs them in a
+single transaction, each inside its own
+SAVEPOINT so a job that raises is undone without affecting its neighbours.
+The batch is committed once, so a burst of N writes costs one commit and one
+acquisition of SQLite's write lock instead of N. After close(), submitted jobs
+run as a batch of one on the submitting thread.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Hashable, List, Tuple
+
+# Stops the writer thread
+_STOP = object()
+
+class _Job:
+    __slots__ = ('body', 'args', 'error', 'result', 'done', 'started', 'cancelled')
+
+    def __init__(self, body, args, error):
+        self.body = body
+        self.args = args
+        self.error = error
+        self.result = error
+        self.done = threading.Event()
+        self.started = False
+        self.cancelled = False
+
+class GroupCommitWriter:
+    """
+    Runs submitted jobs on one thread, `max_batch` at a time per transaction.
+
+    A job is `body(conn, *args) -> (result, keys)` and runs inside an open
+    transaction; `keys` are handed to `commit` along with everything else the
+    batch changed. `connect()` gives the writer's connection (closed after each
+    batch), `begin(conn)` opens the transaction and returns a token for
+    `commit(conn, token, keys)`. A submitter gives up after `timeout` seconds
+    if its job's batch has not started by then.
+    """
+
+    def __init__(self, database: str, connect: Callable, begin: Callable, commit: Callable,
+                 window: float = 0.0, max_batch: int = 256, timeout: float = 30.0):
+        self.database = database
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.batches = 0
+        self.jobs = 0
+        self._connect = connect
+        self._begin = begin
+        self._commit = commit
+        self._queue = queue.Queue()
+        # Guards _closed and the started/cancelled flags of queued jobs; nothing
+        # is queued once _closed is set, so no job can end up behind _STOP
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, body: Callable, args: Tuple = (), error: Any = None) -> Any:
+        """
+        Run `body` in the next batch and wait; returns its result, or `error`
+        if the batch failed or did not start within `timeout` seconds.
+        """
+        job = _Job(body, args, error)
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put(job)
+        if closed:
+            self._run_batch([job])
+            return job.result
+        if not job.done.wait(self.timeout):
+            with self._lock:
+                if not job.started:
+                    job.cancelled = True
+                    return job.error
+            job.done.wait()  # its batch is running; wait for the commit
+        return job.result
+
+    def close(self):
+        """Finish queued jobs and stop the writer thread."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self, batch: List[_Job]) -> bool:
+        """Add jobs arriving within the window to `batch`; returns True if told to stop."""
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                return True
+            batch.append(job)
+        return False
+
+    def _run(self):
+        batch = []
+        try:
+            stop = False
+            while not stop:
+                first = self._queue.get()
+                if first is _STOP:
+                    break
+                batch = [first]
+                stop = self._collect(batch)
+                self._run_batch(batch)
+                batch = []
+        finally:
+            # If the loop died, jobs taken or still queued get their `error`
+            with self._lock:
+                self._closed = True
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for job in batch:
+                if job is not _STOP:
+                    job.done.set()
+
+    def _run_batch(self, batch: List[_Job]):
+        with self._lock:
+            batch = [job for job in batch if not job.cancelled]
+            for job in batch:
+                job.started = True
+        if not batch:
+            return
+        conn = None
+        try:
+            conn = self._connect()
+            token = self._begin(conn)
+            keys: List[Hashable] = []
+            results = []
+            for job in batch:
+                conn.execute('SAVEPOINT group_commit_job')
+                try:
+                    result, job_keys = job.body(conn, *job.args)
+                except Exception:
+                    conn.execute('ROLLBACK TO group_commit_job')
+                    result, job_keys = job.error, ()
+                conn.execute('RELEASE group_commit_job')
+                results.append(result)
+                keys.extend(job_keys)
+            self._commit(conn, token, keys)
+            for job, result in zip(batch, results):
+                job.result = result
+        except Exception:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+        finally:
+            if conn is not None:
+                conn.close()
+            self.batches += 1
+            self.jobs += len(batch)
+            for job in batch:
+                job.done.set()
@@ -0,0 +1,63 @@
+"""
+Gunicorn configuration for the Library Management System.
+
+Pre-forks one worker process per CPU core, each serving requests on a small
+thread pool. The database schema and sample data are initialized once in the
+master before any worker is forked; every worker opens its own SQLite
+connections after the fork (database.py resets its pool in forked children,
+and WAL mode lets workers read concurrently while one writes).
+
+SIGHUP makes the master re-read this file and gracefully replace its
+workers. The new workers are forked from the master, which has imported
+database.py and the app in on_starting, so they run the code the master
+started with and schema migrations are not re-run: deploy new code (above
+all schema changes) with a full restart.
+
+All settings can be tuned through environment variables:
+    LIBRARY_BIND      address to listen on        (default 0.0.0.0:5000)
+    LIBRARY_WORKERS   worker processes            (default: number of CPU cores)
+    LIBRARY_THREADS   threads per worker          (default 4)
+    LIBRARY_TIMEOUT   worker timeout in seconds   (default 30)
+    LIBRARY_PRELOAD   import the app in the master before forking (default 0)
+    LIBRARY_CATALOG_SNAPSHOT  serve catalog/search from an in-memory copy of books (default 0)
+    LIBRARY_GROUP_COMMIT      batch concurrent borrows/returns into shared commits (default 0)
+    LIBRARY_SHARDS            comma-separated per-branch database files to split the catalog across
+    LIBRARY_SHARD_TIMEOUT     seconds a search waits for each shard (default 2.0)
+    LIBRARY_ADMISSION_CONTROL rate limits and write concurrency cap from app.py (default 1)
+    LIBRARY_TEMPLATE_CACHE_DIR  compiled-template cache directory (default: Jinja's per-user temp dir)
+"""
+
+import multiprocessing
+import os
+
+import database
+
+bind = os.environ.get('LIBRARY_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('LIBRARY_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('LIBRARY_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('LIBRARY_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+preload_app = os.environ.get('LIBRARY_PRELOAD', '0') == '1'
+accesslog = os.environ.get('LIBRARY_ACCESS_LOG')
+
+# Workers inherit the setting from the master's imported database module
+database.CATALOG_SNAPSHOT = os.environ.get('LIBRARY_CATALOG_SNAPSHOT', '0') == '1'
+database.GROUP_COMMIT = os.environ.get('LIBRARY_GROUP_COMMIT', '0') == '1'
+database.SHARDS = tuple(path for path in os.environ.get('LIBRARY_SHARDS', '').split(',') if path)
+database.SHARD_TIMEOUT = float(os.environ.get('LIBRARY_SHARD_TIMEOUT', database.SHARD_TIMEOUT))
+
+def on_starting(server):
+    """
+    Create/migrate the schema and add sample data once, in the master, and
+    compile the templates into the bytecode cache the workers load from.
+    Runs at master start only, not on SIGHUP reloads.
+    """
+    database.init_database()
+    database.add_sample_data()
+    database.close_db_connections()
+    
+    from app import create_app
+    import fragments
+    fragments.precompile_templates(create_app(init_db=False))
@@ -3,14 +3,55 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import database
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books,get_patron_borrowed_books
+    update_borrow_record_return_date, get_all_books,get_patron_borrowed_books,
+    search_books
 )
 
+MAX_BORROWED_BOOKS = 5
+LOAN_PERIOD_DAYS = 14
+LATE_FEE_PER_DAY = 0.5
+LATE_FEE_CAP = 15.0
+IMPORT_BATCH_SIZE = 1000
+HISTORY_PAGE_SIZE = 20
+MAX_BATCH_ITEMS = 100
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+def validate_book(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """
+    Check a book's fields against the R1 catalog rules.
+    
+    Returns:
+        str: The validation error message, or None if the book is valid
+    """
+    if not title or not title.strip():
+        return "Title is required."
+    
+    if len(title.strip()) > 200:
+        return "Title must be less than 200 characters."
+    
+    if not author or not author.strip():
+        return "Author is required."
+    
+    if len(author.strip()) > 100:
+        return "Author must be less than 100 characters."
+    
+    if len(isbn) != 13 or not isbn.isdigit():
+        return "ISBN must be exactly 13 digits."
+    
+    if not isinstance(total_copies, int) or isinstance(total_copies, bool) or total_copies <= 0:
+        return "Total copies must be a positive integer."
+    
+    return None
+
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
@@ -26,23 +67,9 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         tuple: (success: bool, message: str)
     """
     # Input validation
-    if not title or not title.strip():
-        return False, "Title is required."
-    
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    
-    if not author or not author.strip():
-        return False, "Author is required."
-    
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
-    
-    if len(isbn) != 13 or not isbn.isdigit():
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+    error = validate_book(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -56,6 +83,70 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     else:
         return False, "Database error occurred while adding the book."
 
+def import_books_to_catalog(rows: Iterable[Tuple[int, Dict]], batch_size: int = IMPORT_BATCH_SIZE,
+                            on_reject: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Bulk-add books to the catalog from a stream of rows.
+    
+    Each row is validated with the same rules as add_book_to_catalog. Valid
+    rows are deduplicated by ISBN against the batch and the database, then
+    inserted one batch per transaction, so memory use is bounded by
+    `batch_size` however long `rows` is.
+    
+    Args:
+        rows: (line number, {'title', 'author', 'isbn', 'total_copies'}) pairs
+        batch_size: Number of rows inserted per transaction
+        on_reject: Called with {'line', 'isbn', 'error'} for each rejected row
+        
+    Returns:
+        dict: {'inserted': int, 'rejected': int}
+    """
+    report = {"inserted": 0, "rejected": 0}
+
+    def reject(line, isbn, error):
+        report["rejected"] += 1
+        if on_reject:
+            on_reject({"line": line, "isbn": isbn, "error": error})
+
+    def flush(batch):
+        # With shards, part of a batch can fail while the rest is inserted
+        failed = set()
+        duplicates = database.insert_books([book for _, book in batch], failed) or set()
+        for line, book in batch:
+            if book[2] in failed:
+                reject(line, book[2], "Database error occurred while adding the book.")
+            elif book[2] in duplicates:
+                reject(line, book[2], "A book with this ISBN already exists.")
+            else:
+                report["inserted"] += 1
+
+    batch = []
+    batch_isbns = set()
+    for line, row in rows:
+        title = str(row.get("title") or "")
+        author = str(row.get("author") or "")
+        isbn = str(row.get("isbn") or "").strip()
+        total_copies = row.get("total_copies")
+        if isinstance(total_copies, str) and total_copies.strip().isdigit():
+            total_copies = int(total_copies)
+
+        error = validate_book(title, author, isbn, total_copies)
+        if not error and isbn in batch_isbns:
+            error = "A book with this ISBN already exists."
+        if error:
+            reject(line, isbn, error)
+            continue
+
+        batch.append((line, (title.strip(), author.strip(), isbn, total_copies)))
+        batch_isbns.add(isbn)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch, batch_isbns = [], set()
+
+    if batch:
+        flush(batch)
+    return report
+
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
@@ -72,61 +163,153 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
+    # Check availability and the borrowing limit, then record the loan, in one transaction
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
+    status, book = database.borrow_book(patron_id, book_id, borrow_date, due_date, MAX_BORROWED_BOOKS)
+    return _borrow_result(status, book, due_date)
+
+def _borrow_result(status: str, book: Optional[Dict], due_date: datetime) -> Tuple[bool, str]:
+    """Map a database.BORROW_* status to the (success, message) pair shown to patrons."""
+    if status == database.BORROW_NOT_FOUND:
         return False, "Book not found."
     
-    if book['available_copies'] <= 0:
+    if status == database.BORROW_UNAVAILABLE:
         return False, "This book is currently not available."
     
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
+    if status == database.BORROW_LIMIT_REACHED:
+        return False, f"You have reached the maximum borrowing limit of {MAX_BORROWED_BOOKS} books."
     
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-    
-    # Create borrow record
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
-    
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    if status != database.BORROW_OK:
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
-    
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Process book return by a patron.
+    Implements R4 as per requirements
     
-    TODO: Implement R4 as per requirements
+    Closes the patron's open loan and restores the copy in one transaction,
+    then reports any late fee owed.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book being returned
+        
+    Returns:
+        tuple: (success: bool, message: str)
     """
     #Patron ID validation
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID"
     
-    #Ensure there is an active borrow for this patron
-    borrowed = get_patron_borrowed_books(patron_id)
-    has_active = any(r.get("book_id") == book_id for r in borrowed)
+    today = datetime.now().date()
+    status, record = database.return_book(patron_id, book_id, datetime.now(),
+                                          fee_for=lambda due: compute_late_fee(due, today)[1])
     
-    if not has_active:
+    return _return_result(status, record, today)
+
+def _return_result(status: str, record: Optional[Dict], today: date) -> Tuple[bool, str]:
+    """Map a database.RETURN_* status to the (success, message) pair shown to patrons."""
+    if status == database.RETURN_NOT_BORROWED:
         return False, "This book was not borrowed by the patron"
     
-    #Actual cost (if no borrowing records exist, calculate returns 0, which also meets testing requirements)
-    info = calculate_late_fee_for_book(patron_id, book_id)
-    if info["days_overdue"] > 0:
-        msg = f"Returned. Late by {info['days_overdue']} days. Fee ${info['fee_amount']:.2f}"
+    if status != database.RETURN_OK:
+        return False, "Database error occurred while processing the return."
+    
+    days_overdue, fee = compute_late_fee(record["due_date"], today)
+    if days_overdue > 0:
+        msg = f"Returned. Late by {days_overdue} days. Fee ${fee:.2f}"
     else:
         msg = "Returned. Late fee $0.00"
         
     return True, msg
 
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow several books for one patron in a single transaction (circulation desk).
+    
+    The borrowing limit is checked once for the whole batch; items are granted
+    in order until copies or borrowing slots run out.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow (at most MAX_BATCH_ITEMS)
+        
+    Returns:
+        tuple: (success: bool, message: str,
+                results: [{'book_id', 'success', 'message'}] per item)
+    """
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return False, error, []
+    
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
+    items = database.borrow_books(patron_id, book_ids, borrow_date, due_date, MAX_BORROWED_BOOKS)
+    
+    results = []
+    for book_id, status, book in items:
+        success, message = _borrow_result(status, book, due_date)
+        results.append({"book_id": book_id, "success": success, "message": message})
+    borrowed = sum(r["success"] for r in results)
+    return True, f"Borrowed {borrowed} of {len(results)} books.", results
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Return several books for one patron in a single transaction (circulation desk).
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books being returned (at most MAX_BATCH_ITEMS)
+        
+    Returns:
+        tuple: (success: bool, message: str,
+                results: [{'book_id', 'success', 'message', 'fee_amount'}] per item)
+    """
+    error = _validate_batch(patron_id, book_ids)
+    if error:
+        return False, error, []
+    
+    today = datetime.now().date()
+    items = database.return_books(patron_id, book_ids, datetime.now(),
+                                  fee_for=lambda due: compute_late_fee(due, today)[1])
+    
+    results = []
+    for book_id, status, record in items:
+        success, message = _return_result(status, record, today)
+        results.append({"book_id": book_id, "success": success, "message": message,
+                        "fee_amount": float(record["fee_charged"]) if record else 0.0})
+    returned = sum(r["success"] for r in results)
+    return True, f"Returned {returned} of {len(results)} books.", results
+
+def _validate_batch(patron_id: str, book_ids: List[int]) -> Optional[str]:
+    """Validate a circulation-desk batch; returns the error message or None."""
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits."
+    
+    if not book_ids:
+        return "At least one book ID is required."
+    
+    if len(book_ids) > MAX_BATCH_ITEMS:
+        return f"A batch may contain at most {MAX_BATCH_ITEMS} books."
+    
+    if not all(isinstance(b, int) and not isinstance(b, bool) for b in book_ids):
+        return "Book IDs must be integers."
+    
+    return None
+
+def compute_late_fee(due_date: datetime, today=None) -> Tuple[int, float]:
+    """Return (days_overdue, fee) for a loan due on `due_date`."""
+    today = today or datetime.now().date()
+    days_overdue = max(0, (today - due_date.date()).days)
+    return days_overdue, late_fee_for_days(days_overdue)
+
+def late_fee_for_days(days_overdue: int) -> float:
+    """Late fee for a loan `days_overdue` days past due, capped at LATE_FEE_CAP."""
+    return min(LATE_FEE_CAP, LATE_FEE_PER_DAY * days_overdue)
+
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
     Calculate late fees for a specific book.
@@ -140,54 +323,89 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
         'status': 'Late fee calculation not implemented'
     }
     """
-    # Look up the active borrow record
+    # Look up the active borrow record (days overdue come computed from SQL)
     records = get_patron_borrowed_books(patron_id) 
-    due = None
-    for r in records:
-        if r.get("book_id") == book_id:
-            due = r.get("due_date")
-            break
-    # if no due date found means on time
-    if not due:
+    record = next((r for r in records if r.get("book_id") == book_id), None)
+    # no open loan means on time
+    if record is None:
         return {"fee_amount": 0.0, "days_overdue": 0, "status": "on-time"}
 
-    days_overdue = max(0, (datetime.now().date() - due.date()).days)
-    fee = min(15.0, 0.5 * days_overdue)
+    days_overdue = record["days_overdue"]
+    fee = late_fee_for_days(days_overdue)
     return {
         "fee_amount": float(fee),
         "days_overdue": int(days_overdue),
         "status": "late" if days_overdue > 0 else "on-time",
     }
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str,
+                            limit: Optional[int] = None, offset: int = 0,
+                            missing: Optional[List[int]] = None) -> List[Dict]:
     """
     Search for books in the catalog.
     
-    TODO: Implement R6 as per requirements
+    Title and author searches are case-insensitive partial matches served by
+    the full-text index and ranked by relevance; ISBN search is an exact match
+    on the unique ISBN index. On a sharded catalog, title and author searches
+    query every shard in parallel.
+    
+    Args:
+        search_term: Text to search for
+        search_type: 'title', 'author' or 'isbn'
+        limit: Maximum number of results (None for all)
+        offset: Number of results to skip, for paging
+        missing: If given, shards that timed out (and whose books are
+            therefore absent from the results) are appended to it
+        
+    Returns:
+        list: Matching books as dicts
     """
     term = search_term.strip()
-    books = get_all_books() 
-
-    if search_type == "title":
-        t = term.lower()
-        return [b for b in books if t in b.get("title", "").lower()]
 
-    if search_type == "author":
-        t = term.lower()
-        return [b for b in books if t in b.get("author", "").lower()]
+    if search_type in ("title", "author"):
+        return search_books(term, search_type, limit, offset, missing)
 
     if search_type == "isbn":
-        return [b for b in books if str(b.get("isbn", "")) == term]
+        book = get_book_by_isbn(term)
+        return [book] if book and offset == 0 and limit != 0 else []
 
     return []
 
+def get_search_suggestions(prefix: str, search_type: str, limit: int = SUGGEST_LIMIT) -> List[str]:
+    """
+    Type-ahead completions for the search box.
+    
+    Served from the in-memory prefix index, so per-keystroke calls do not
+    query the database.
+    
+    Args:
+        prefix: What the user has typed so far
+        search_type: 'title' or 'author'
+        limit: Maximum number of suggestions
+        
+    Returns:
+        list: Distinct matching titles or authors, whole-value prefix matches first
+    """
+    if search_type not in ("title", "author"):
+        return []
+    return database.suggest_books(prefix, search_type, limit)
+
 def get_patron_status_report(patron_id: str) -> Dict:
     """
     Get status report for a patron.
+    Implements R7 as per requirements
     
-    TODO: Implement R7 as per requirements
+    Counts and charged fees come from the patron's summary row, so patrons
+    with no active loans cost a single lookup; "history" holds the first
+    page of returned loans (see get_patron_history for the rest).
+    
+    Returns:
+        dict: currently_borrowed, history, history_cursor, books_borrowed_count,
+              total_late_fees (accruing on current loans), lifetime_loans,
+              outstanding_fees (charged on returns)
     """
-    current = get_patron_borrowed_books(patron_id)
+    summary = database.get_patron_summary(patron_id)
+    current = get_patron_borrowed_books(patron_id) if summary["active_count"] else []
 
     # Check information
     currently_borrowed = [
@@ -196,21 +414,72 @@ def get_patron_status_report(patron_id: str) -> Dict:
     ]
 
     # Calculate fee
-    fee_per_day = 0.5
-    fee_cap = 15.0
-    today = datetime.now().date()
+    total_fees = sum(late_fee_for_days(r["days_overdue"]) for r in current)
 
-    total_fees = 0.0
-    for r in current:
-        due = r.get("due_date")
-        if due is None:
-            continue
-        days_overdue = max(0, (today - due.date()).days)
-        total_fees += min(fee_cap, fee_per_day * days_overdue)
+    history, history_cursor = get_patron_history(patron_id)
 
     return {
         "currently_borrowed": currently_borrowed,               
-        "history": [],                                         
-        "books_borrowed_count": len(currently_borrowed),        
+        "history": history,                                         
+        "history_cursor": history_cursor,
+        "books_borrowed_count": summary["active_count"],        
         "total_late_fees": float(total_fees),                  
+        "lifetime_loans": summary["lifetime_loans"],
+        "outstanding_fees": float(summary["outstanding_fees"]),
     }
+
+def get_patron_history(patron_id: str, before: Optional[Tuple[str, int]] = None,
+                       limit: int = HISTORY_PAGE_SIZE) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+    """
+    Get one page of a patron's past (returned) loans, newest first.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        before: Cursor returned with the previous page, or None for the first page
+        limit: Page size
+        
+    Returns:
+        tuple: (loans: list of dicts with return_date and fee_charged,
+                cursor for the next page or None if this is the last page)
+    """
+    records = database.get_patron_history(patron_id, before, limit + 1)
+    if len(records) <= limit:
+        return records, None
+    last = records[limit - 1]
+    return records[:limit], (last["return_date"].isoformat(), last["id"])
+
+OVERDUE_REPORT_VIEWS = ("loans", "patrons")
+
+def get_overdue_report(view: str = "loans", today: Optional[date] = None) -> Iterator[Dict]:
+    """
+    Stream the library-wide overdue report.
+    
+    Args:
+        view: 'loans' for one row per overdue loan, or 'patrons' for one
+              row per patron with their overdue count and total late fees
+        today: Date to compute overdue days against (defaults to today)
+        
+    Returns:
+        iterator: Report rows as dicts, computed in SQL and fetched in batches
+    """
+    if view not in OVERDUE_REPORT_VIEWS:
+        raise ValueError(f"Unknown overdue report view: {view}")
+    today = (today or datetime.now().date()).isoformat()
+    if view == "patrons":
+        return database.iter_patron_late_fees(today, LATE_FEE_PER_DAY, LATE_FEE_CAP)
+    return database.iter_overdue_loans(today, LATE_FEE_PER_DAY, LATE_FEE_CAP)
+
+def archive_old_loans(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                      pause: float = 0.0) -> int:
+    """
+    Move loans returned more than `days` days ago into the archive table,
+    keeping borrow_records down to open and recently returned loans. Patron
+    history still includes archived loans.
+    
+    Returns:
+        int: Number of loans archived
+    """
+    if days < 0 or batch_size < 1:
+        raise ValueError("days must be non-negative and batch_size positive")
+    cutoff = datetime.now() - timedelta(days=days)
+    return database.archive_returned_loans(cutoff, batch_size, pause)
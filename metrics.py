@@ -0,0 +1,188 @@
+"""
+Metrics Module - request/query timing and Prometheus text exposition
+
+init_app() installs request hooks that record latency per endpoint plus the
+number and total duration of SQL statements each request ran, and logs slow
+requests together with their queries. Metrics are process-local; with several
+worker processes each one serves its own /metrics.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from flask import current_app, g, has_request_context, request
+
+import database
+
+logger = logging.getLogger('library.slow_requests')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# Slow-request log keeps at most this many statements per request
+MAX_LOGGED_QUERIES = 50
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return f'{{{body}}}' if body else ''
+
+def _format_number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = _format_labels(zip(self.labelnames, key))
+                lines.append(f'{self.name}{labels} {_format_number(value)}')
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., sum, count]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                base = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(base + [('le', _format_number(bound))])
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(base)
+                lines.append(f'{self.name}_sum{labels} {_format_number(series[-2])}')
+                lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+REQUEST_DURATION = Histogram(
+    'library_request_duration_seconds', 'HTTP request latency.',
+    ('blueprint', 'endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram(
+    'library_request_queries', 'SQL statements executed per HTTP request.',
+    ('blueprint', 'endpoint'), COUNT_BUCKETS)
+REQUEST_QUERY_DURATION = Histogram(
+    'library_request_query_duration_seconds', 'Total SQL time per HTTP request.',
+    ('blueprint', 'endpoint'), QUERY_BUCKETS)
+QUERY_DURATION = Histogram(
+    'library_query_duration_seconds', 'Duration of individual SQL statements.',
+    ('statement',), QUERY_BUCKETS)
+SLOW_REQUESTS = Counter(
+    'library_slow_requests_total', 'Requests slower than the slow-request threshold.',
+    ('blueprint', 'endpoint'))
+ADMISSION_DECISIONS = Counter(
+    'library_admission_decisions_total', 'Admission control decisions (see admission.py).',
+    ('blueprint', 'decision', 'reason'))
+
+REGISTRY = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_QUERY_DURATION, QUERY_DURATION, SLOW_REQUESTS,
+            ADMISSION_DECISIONS]
+
+def observe_query(sql: str, seconds: float):
+    """database query observer: records the statement globally and on the current request."""
+    words = sql.split(None, 1)
+    QUERY_DURATION.observe(seconds, statement=words[0].upper() if words else '')
+    if has_request_context():
+        queries = g.get('_metrics_queries')
+        if queries is not None:
+            queries.append((sql, seconds))
+
+def _start_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_queries = []
+
+def _capture_status(response):
+    g._metrics_status = response.status_code
+    return response
+
+def _finish_request(exc=None):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    queries = g.pop('_metrics_queries', [])
+    status = g.pop('_metrics_status', 500)
+    endpoint = request.endpoint or 'unmatched'
+    blueprint = request.blueprint or ''
+
+    REQUEST_DURATION.observe(duration, blueprint=blueprint, endpoint=endpoint,
+                             method=request.method, status=str(status))
+    REQUEST_QUERIES.observe(len(queries), blueprint=blueprint, endpoint=endpoint)
+    REQUEST_QUERY_DURATION.observe(sum(seconds for _, seconds in queries),
+                                   blueprint=blueprint, endpoint=endpoint)
+
+    threshold = current_app.config.get('SLOW_REQUEST_THRESHOLD')
+    if threshold is not None and duration >= threshold:
+        SLOW_REQUESTS.inc(blueprint=blueprint, endpoint=endpoint)
+        logged = '\n'.join(f'  {seconds * 1000:8.3f} ms  {" ".join(sql.split())}'
+                           for sql, seconds in queries[:MAX_LOGGED_QUERIES])
+        logger.warning('Slow request: %s %s -> %s took %.1f ms with %d queries\n%s',
+                       request.method, request.full_path.rstrip('?'), status,
+                       duration * 1000, len(queries), logged)
+
+def render_metrics() -> str:
+    """Render every metric, plus the book cache counters, in Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    cache_stats = database.get_cache_stats()
+    for name in ('hits', 'misses', 'evictions', 'invalidations'):
+        if name in cache_stats:
+            lines.append(f'# TYPE library_book_cache_{name}_total counter')
+            lines.append(f'library_book_cache_{name}_total {cache_stats[name]}')
+    if 'size' in cache_stats:
+        lines.append('# TYPE library_book_cache_size gauge')
+        lines.append(f'library_book_cache_size {cache_stats["size"]}')
+    return '\n'.join(lines) + '\n'
+
+def init_app(app):
+    """Install the request timing hooks and the SQL query observer."""
+    app.before_request(_start_request)
+    app.after_request(_capture_status)
+    app.teardown_request(_finish_request)
+    database.set_query_observer(observe_query)
@@ -0,0 +1,177 @@
+"""
+Query Audit Module - query-plan and query-count checks for the service layer
+
+QueryAudit records every statement run on the app's pooled connections
+(through database.set_query_observer) along with the service call that issued
+it. report() then runs EXPLAIN QUERY PLAN on each distinct statement against
+the same database and lists the problems:
+
+    - a statement issued by a hot-path call whose plan scans a whole table
+      instead of searching an index
+    - a hot-path call that ran more statements than its budget
+
+Plans depend on table sizes and statistics, so audit a seeded database after
+ANALYZE (see benchmarks/audit_queries.py). Statements are explained with NULL
+bound to every parameter; SQLite plans do not depend on the bound values.
+"""
+
+import re
+import sqlite3
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import database
+import library_service
+
+# Hot-path service calls -> most statements (including BEGIN/COMMIT) a single
+# call may run. Every statement they run must search an index.
+HOT_PATHS = {
+    'get_book_by_id': 1,
+    'get_books_page': 1,
+    'search_books_in_catalog': 2,
+    'borrow_book_by_patron': 6,
+    'return_book_by_patron': 6,
+    'borrow_books_by_patron': 7,   # two books per batch in run_service_calls()
+    'return_books_by_patron': 6,
+    'calculate_late_fee_for_book': 1,
+    'get_patron_status_report': 3,
+    'get_patron_history': 1,
+    'get_book_changes': 1,
+}
+
+# Plan steps that read a whole table or index: "SCAN books", "SCAN b USING
+# INDEX ...". Scans of subquery results, constant rows and virtual-table
+# (FTS) cursors are not table scans.
+_TABLE_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!\()(?!.*VIRTUAL TABLE)')
+_INDEX_WALK = re.compile(r'USING (COVERING )?INDEX')
+_LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace so the same statement always gets the same key."""
+    return ' '.join(sql.split())
+
+def parameter_count(sql: str) -> int:
+    """Number of ? placeholders outside string literals."""
+    return _STRING_LITERAL.sub('', sql).count('?')
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    """EXPLAIN QUERY PLAN details for `sql`, or [] for statements without a plan."""
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return []
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, (None,) * parameter_count(sql))
+    return [row[3] for row in rows]
+
+def table_scans(sql: str, plan: List[str]) -> List[str]:
+    """
+    The plan steps of `sql` that scan a whole table or index. Walking an index
+    in ORDER BY order under a LIMIT (the first catalog page) stops early and is
+    not counted.
+    """
+    bounded = _LIMIT.search(sql) is not None and not any('TEMP B-TREE' in step for step in plan)
+    return [step for step in plan
+            if _TABLE_SCAN.match(step) and not (bounded and _INDEX_WALK.search(step))]
+
+class QueryAudit:
+    """
+    Records the statements each service call runs; use as a context manager
+    around call()s, then report().
+    """
+
+    def __init__(self, hot_paths: Optional[Dict[str, int]] = None):
+        self.hot_paths = HOT_PATHS if hot_paths is None else hot_paths
+        self.statements = OrderedDict()  # normalized sql -> set of call names
+        self.max_queries: Dict[str, int] = {}
+        self._current = None
+        self._count = 0
+        self._previous_observer = None
+
+    def __enter__(self):
+        self._previous_observer = database._query_observer
+        database.set_query_observer(self._observe)
+        return self
+
+    def __exit__(self, *exc):
+        database.set_query_observer(self._previous_observer)
+
+    def _observe(self, sql: str, seconds: float):
+        self.statements.setdefault(normalize_sql(sql), set()).add(self._current)
+        self._count += 1
+        if self._previous_observer is not None:
+            self._previous_observer(sql, seconds)
+
+    def call(self, name: str, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) as service call `name`; generators are drained."""
+        self._current, self._count = name, 0
+        try:
+            result = fn(*args, **kwargs)
+            if hasattr(result, '__next__'):
+                result = list(result)
+            return result
+        finally:
+            self.max_queries[name] = max(self.max_queries.get(name, 0), self._count)
+            self._current = None
+
+    def report(self, database_path: Optional[str] = None) -> Dict:
+        """
+        Explain every recorded statement. Returns a dict with
+            plans       {sql: [plan steps]}
+            scans       [(call, sql, step)] table scans on hot paths
+            over_budget [(call, statements, budget)]
+        """
+        conn = sqlite3.connect(database_path or database.DATABASE)
+        database.register_sql_functions(conn)
+        try:
+            plans = {sql: explain(conn, sql) for sql in self.statements}
+        finally:
+            conn.close()
+        scans = []
+        for sql, calls in self.statements.items():
+            hot = sorted(call for call in calls if call in self.hot_paths)
+            for step in table_scans(sql, plans[sql]) if hot else ():
+                scans.append((', '.join(hot), sql, step))
+        over_budget = [(name, count, self.hot_paths[name])
+                       for name, count in self.max_queries.items()
+                       if name in self.hot_paths and count > self.hot_paths[name]]
+        return {'plans': plans, 'scans': scans, 'over_budget': over_budget}
+
+def run_service_calls(audit: QueryAudit, book_ids: List[int], patron_ids: List[str]):
+    """
+    Exercise the service layer: catalog reads, circulation, patron reports and
+    the library-wide reports, against books `book_ids` and patrons `patron_ids`
+    (each needs a free borrowing slot and the books a free copy).
+    """
+    book = audit.call('get_book_by_id', database.get_book_by_id, book_ids[0])
+    first_page = audit.call('get_books_page', database.get_books_page, None, 50)
+    audit.call('get_books_page', database.get_books_page,
+               (first_page[-1]['title'], first_page[-1]['id']), 50)
+    word = max(book['title'].split(), key=len)
+    audit.call('search_books_in_catalog', library_service.search_books_in_catalog, word, 'title', 20)
+    audit.call('search_books_in_catalog', library_service.search_books_in_catalog, book['isbn'], 'isbn')
+    audit.call('get_book_changes', database.get_book_changes, 0, 100)
+
+    patron_id = patron_ids[0]
+    audit.call('borrow_book_by_patron', library_service.borrow_book_by_patron, patron_id, book_ids[0])
+    audit.call('calculate_late_fee_for_book', library_service.calculate_late_fee_for_book,
+               patron_id, book_ids[0])
+    audit.call('get_patron_status_report', library_service.get_patron_status_report, patron_id)
+    _, cursor = audit.call('get_patron_history', library_service.get_patron_history, patron_id, None, 5)
+    if cursor is not None:
+        audit.call('get_patron_history', library_service.get_patron_history, patron_id, cursor, 5)
+    audit.call('return_book_by_patron', library_service.return_book_by_patron, patron_id, book_ids[0])
+
+    batch_patron = patron_ids[1] if len(patron_ids) > 1 else patron_id
+    audit.call('borrow_books_by_patron', library_service.borrow_books_by_patron,
+               batch_patron, book_ids[1:3])
+    audit.call('return_books_by_patron', library_service.return_books_by_patron,
+               batch_patron, book_ids[1:3])
+
+    # Whole-catalog and whole-library work: planned and reported, not budgeted
+    audit.call('get_all_books', database.get_all_books)
+    audit.call('iter_books', database.iter_books)
+    audit.call('search_books_in_catalog (short term)', library_service.search_books_in_catalog,
+               word[:2], 'title', 20)
+    audit.call('get_overdue_report', library_service.get_overdue_report, 'loans')
+    audit.call('get_overdue_report', library_service.get_overdue_report, 'patrons')
+    audit.call('archive_old_loans', library_service.archive_old_loans)
@@ -0,0 +1,76 @@
+"""
+Reports - streamed NDJSON/CSV serialization and CLI for library-wide reports
+
+Usage:
+    python reports.py overdue [--view loans|patrons] [--format ndjson|csv] [--date YYYY-MM-DD] [-o FILE]
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import date
+from typing import Dict, Iterable, Iterator, List
+
+from database import init_database
+from library_service import get_overdue_report, OVERDUE_REPORT_VIEWS
+
+REPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+OVERDUE_REPORT_FIELDS = {
+    'loans': ['patron_id', 'book_id', 'title', 'author', 'borrow_date', 'due_date',
+              'days_overdue', 'fee_amount'],
+    'patrons': ['patron_id', 'overdue_count', 'max_days_overdue', 'total_late_fees'],
+}
+
+def to_ndjson(rows: Iterable[Dict]) -> Iterator[str]:
+    """Serialize rows as newline-delimited JSON, one line at a time."""
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+def to_csv(rows: Iterable[Dict], fields: List[str]) -> Iterator[str]:
+    """Serialize rows as CSV with a header line, one line at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_overdue_report(view: str, fmt: str, today: date = None) -> Iterator[str]:
+    """Stream the overdue report as text chunks in the given format."""
+    rows = get_overdue_report(view, today)
+    if fmt == 'csv':
+        return to_csv(rows, OVERDUE_REPORT_FIELDS[view])
+    return to_ndjson(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate library-wide reports.')
+    parser.add_argument('report', choices=['overdue'])
+    parser.add_argument('--view', choices=OVERDUE_REPORT_VIEWS, default='loans')
+    parser.add_argument('--format', choices=sorted(REPORT_FORMATS), default='ndjson')
+    parser.add_argument('--date', type=date.fromisoformat, help='report date (default: today)')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    init_database()
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in stream_overdue_report(args.view, args.format, args.date):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
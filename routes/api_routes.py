@@ -2,10 +2,69 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+import io
+from datetime import date
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from catalog_import import FORMATS, FeedError, guess_format, iter_lines, iter_rows
+from database import (get_cache_stats, get_books_after_id, get_book_changes, get_catalog_watermark,
+                      iter_books_by_id)
+from library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, import_books_to_catalog,
+    get_patron_history, borrow_books_by_patron, return_books_by_patron, get_search_suggestions,
+    OVERDUE_REPORT_VIEWS, HISTORY_PAGE_SIZE, SUGGEST_LIMIT, MAX_SUGGEST_LIMIT
+)
+from reports import REPORT_FORMATS, stream_overdue_report, to_ndjson
+from .conditional import catalog_conditional
+from .encoding import enable_compression, jsonify
+from .pagination import encode_cursor, decode_cursor
+
+# Cap on rejected rows echoed back by /api/books/import (all are counted)
+MAX_REPORTED_REJECTS = 1000
+
+# Book columns a ?fields= projection may select
+BOOK_FIELDS = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
+enable_compression(api_bp)
+
+def _book_fields():
+    """
+    The columns requested with ?fields=id,title (None for all of them).
+    Raises ValueError naming the first unknown column.
+    """
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    for name in fields:
+        if name not in BOOK_FIELDS:
+            raise ValueError(f'Unknown field: {name}. Choose from: {", ".join(BOOK_FIELDS)}')
+    return tuple(dict.fromkeys(fields))
+
+def _project(books, fields):
+    """Keep only `fields` of each book (all of them if fields is None)."""
+    if fields is None:
+        return books
+    return [{name: book[name] for name in fields} for book in books]
+
+def _encode_watermark(watermark):
+    """A catalog watermark as sent to clients: the seq, or an opaque token for a sharded catalog."""
+    return watermark if isinstance(watermark, int) else encode_cursor(list(watermark))
+
+def _decode_watermark(value):
+    """Inverse of _encode_watermark() for a decoded JSON value or ?since= string; None if malformed."""
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            token = decode_cursor(value, list)
+            value = token[0] if token is not None else None
+    if isinstance(value, list):
+        if value and all(isinstance(seq, int) and not isinstance(seq, bool) and seq >= 0 for seq in value):
+            return tuple(value)
+        return None
+    return value if isinstance(value, int) and not isinstance(value, bool) and value >= 0 else None
 
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
@@ -17,23 +76,266 @@ def get_late_fee(patron_id, book_id):
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
 @api_bp.route('/search')
+@catalog_conditional
 def search_books_api():
     """
     Search for books via API endpoint.
     Alternative API interface for R5: Book Search Functionality
+    
+    ?fields=id,title returns only those columns of each result. On a sharded
+    catalog, `missing_shards` lists shards that did not answer in time.
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
     
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({'error': 'limit and offset must be non-negative integers'}), 400
+    
+    try:
+        fields = _book_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    missing = []
+    books = search_books_in_catalog(search_term, search_type, limit, offset, missing)
     
-    return jsonify({
+    body = {
         'search_term': search_term,
         'search_type': search_type,
-        'results': books,
-        'count': len(books)
+        'results': _project(books, fields),
+        'count': len(books),
+        'limit': limit,
+        'offset': offset
+    }
+    if not missing:
+        return jsonify(body)
+    # Some shards timed out: say so, and keep the partial answer out of caches
+    body['missing_shards'] = missing
+    response = jsonify(body)
+    response.cache_control.no_store = True
+    return response
+
+@api_bp.route('/suggest')
+def suggest_api():
+    """
+    Type-ahead completions for the search box: ?q=<prefix>&type=title|author&limit=N.
+    Answered from the in-memory prefix index without querying the database.
+    """
+    prefix = request.args.get('q', '')
+    search_type = request.args.get('type', 'title')
+    limit = request.args.get('limit', SUGGEST_LIMIT, type=int)
+    
+    if search_type not in ('title', 'author'):
+        return jsonify({'error': 'type must be "title" or "author"'}), 400
+    
+    suggestions = get_search_suggestions(prefix, search_type, max(0, min(limit, MAX_SUGGEST_LIMIT)))
+    return jsonify({'q': prefix, 'type': search_type, 'suggestions': suggestions})
+
+@api_bp.route('/books')
+def books_api():
+    """
+    Page through the whole catalog for downstream sync.
+    
+    Full sync: follow the returned `next` token as ?after= until it is null,
+    then keep the `watermark`. Incremental sync: ?since=<watermark> returns
+    books changed after it (and IDs of deleted books); repeat with the new
+    watermark while `has_more` is true. On a sharded catalog the watermark
+    is an opaque token covering every shard. ?fields= selects the book
+    columns returned.
+    """
+    limit = request.args.get('limit', current_app.config['CATALOG_PAGE_SIZE'], type=int)
+    if limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, current_app.config['CATALOG_MAX_PAGE_SIZE'])
+    
+    try:
+        fields = _book_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if 'since' in request.args:
+        since = _decode_watermark(request.args['since'])
+        try:
+            if since is None:
+                raise ValueError('since must be a watermark returned by this API')
+            changes = get_book_changes(since, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'books': _project([book for _, _, book in changes if book is not None], fields),
+            'deleted': [book_id for _, book_id, book in changes if book is None],
+            'watermark': _encode_watermark(changes[-1][0] if changes else since),
+            'has_more': len(changes) == limit
+        })
+    
+    # The watermark is taken before the first page and carried in the cursor,
+    # so changes made while paging are picked up by the next incremental sync
+    if request.args.get('after'):
+        position = decode_cursor(request.args['after'], int, (int, str))
+        watermark = _decode_watermark(position[1]) if position is not None else None
+        if watermark is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        after_id = position[0]
+    else:
+        after_id, watermark = 0, get_catalog_watermark()
+    
+    books = get_books_after_id(after_id, limit)
+    return jsonify({
+        'books': _project(books, fields),
+        'next': encode_cursor(books[-1]['id'], _encode_watermark(watermark)) if len(books) == limit else None,
+        'watermark': _encode_watermark(watermark)
+    })
+
+@api_bp.route('/books/export')
+def books_export_api():
+    """
+    Stream the entire catalog as NDJSON, in ID order, with constant memory.
+    The X-Catalog-Watermark header is the ?since= for a later /api/books sync.
+    """
+    watermark = get_catalog_watermark()
+    rows = iter_books_by_id(current_app.config['CATALOG_STREAM_BATCH_SIZE'])
+    response = Response(stream_with_context(to_ndjson(rows)), mimetype=REPORT_FORMATS['ndjson'])
+    response.headers['X-Catalog-Watermark'] = str(_encode_watermark(watermark))
+    return response
+
+@api_bp.route('/books/import', methods=['POST'])
+def import_books_api():
+    """
+    Bulk-import books from a CSV or JSON Lines feed.
+    
+    Accepts either a multipart upload in the `file` field or the raw request
+    body. The format comes from ?format=, the upload's file name, or the
+    Content-Type (text/csv or application/x-ndjson). A feed that is not
+    UTF-8 or not valid CSV gets a 400 naming the line; rows before it are
+    still imported and counted.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format')
+    if upload is not None:
+        fmt = fmt or guess_format(upload.filename or '')
+        raw = upload.stream
+    else:
+        content_type = request.mimetype or ''
+        fmt = fmt or ('jsonl' if 'json' in content_type else 'csv')
+        raw = request.stream
+    
+    if fmt not in FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    rejects = []
+    feed_errors = []
+    
+    def collect(reject):
+        if len(rejects) < MAX_REPORTED_REJECTS:
+            rejects.append(reject)
+    
+    def rows():
+        try:
+            yield from iter_rows(iter_lines(raw), fmt)
+        except FeedError as e:
+            feed_errors.append(e)
+    
+    if isinstance(raw, io.RawIOBase):
+        raw = io.BufferedReader(raw)
+    report = import_books_to_catalog(rows(), on_reject=collect)
+    report['rejects'] = rejects
+    if feed_errors:
+        report.update(error=str(feed_errors[0]), line=feed_errors[0].line)
+        return jsonify(report), 400
+    return jsonify(report), 200
+
+@api_bp.route('/reports/overdue')
+def overdue_report_api():
+    """
+    Stream every overdue loan (?view=loans) or every patron's late-fee total
+    (?view=patrons) as NDJSON or CSV (?format=ndjson|csv).
+    """
+    view = request.args.get('view', 'loans')
+    fmt = request.args.get('format', 'ndjson')
+    
+    if view not in OVERDUE_REPORT_VIEWS:
+        return jsonify({'error': f'view must be one of: {", ".join(OVERDUE_REPORT_VIEWS)}'}), 400
+    
+    if fmt not in REPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(REPORT_FORMATS)}'}), 400
+    
+    try:
+        today = date.fromisoformat(request.args['date']) if 'date' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    
+    chunks = stream_overdue_report(view, fmt, today)
+    return Response(stream_with_context(chunks), mimetype=REPORT_FORMATS[fmt])
+
+@api_bp.route('/cache/stats')
+def cache_stats_api():
+    """Hit/miss/eviction counters of the book read cache, for sizing it."""
+    return jsonify(get_cache_stats())
+
+@api_bp.route('/patrons/<patron_id>/history')
+def patron_history_api(patron_id):
+    """
+    Page through a patron's returned loans, newest first.
+    Pass the returned `next` token as ?after= to fetch the following page.
+    """
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    if limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    
+    before = None
+    if request.args.get('after'):
+        before = decode_cursor(request.args['after'], str, int)
+        if before is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    loans, cursor = get_patron_history(patron_id, before, min(limit, 500))
+    return jsonify({
+        'patron_id': patron_id,
+        'history': [dict(loan, borrow_date=loan['borrow_date'].isoformat(),
+                         due_date=loan['due_date'].isoformat(),
+                         return_date=loan['return_date'].isoformat()) for loan in loans],
+        'next': encode_cursor(*cursor) if cursor else None
+    })
+
+@api_bp.route('/borrow/batch', methods=['POST'])
+def borrow_batch_api():
+    """
+    Borrow a stack of books for one patron in one transaction.
+    Body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    return _run_batch(borrow_books_by_patron)
+
+@api_bp.route('/return/batch', methods=['POST'])
+def return_batch_api():
+    """
+    Return a stack of books for one patron in one transaction.
+    Body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    return _run_batch(return_books_by_patron)
+
+def _run_batch(operation):
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object with patron_id and book_ids'}), 400
+    
+    patron_id = str(payload.get('patron_id', '')).strip()
+    book_ids = payload.get('book_ids')
+    if not isinstance(book_ids, list):
+        return jsonify({'error': 'book_ids must be a list'}), 400
+    
+    success, message, results = operation(patron_id, book_ids)
+    if not success:
+        return jsonify({'error': message}), 400
+    
+    return jsonify({
+        'patron_id': patron_id,
+        'message': message,
+        'succeeded': sum(r['success'] for r in results),
+        'results': results
     })
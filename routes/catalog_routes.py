@@ -2,9 +2,14 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+import itertools
+
+from flask import (Blueprint, render_template, request, redirect, url_for, flash,
+                   abort, current_app, stream_template)
+from database import get_books_page, iter_books
 from library_service import add_book_to_catalog
+from .conditional import catalog_conditional
+from .pagination import encode_cursor, decode_cursor
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +19,40 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@catalog_conditional
 def catalog():
     """
     Display all books in the catalog.
     Implements R2: Book Catalog Display
+    
+    Pages are keyset-paginated on (title, id): ?after=<cursor>&page_size=N.
+    ?stream=1 streams the whole catalog in a single response instead.
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    if request.args.get('stream') == '1':
+        rows = iter_books(current_app.config['CATALOG_STREAM_BATCH_SIZE'])
+        first = next(rows, None)
+        books = itertools.chain([first], rows) if first else []
+        return stream_template('catalog.html', books=books)
+    
+    page_size = request.args.get('page_size', current_app.config['CATALOG_PAGE_SIZE'], type=int)
+    page_size = max(1, min(page_size, current_app.config['CATALOG_MAX_PAGE_SIZE']))
+    
+    after = None
+    token = request.args.get('after')
+    if token:
+        after = decode_cursor(token, str, int)
+        if after is None:
+            abort(400)
+    
+    # Fetch one extra row to learn whether another page follows
+    books = get_books_page(after, page_size + 1)
+    next_cursor = None
+    if len(books) > page_size:
+        last = books[page_size - 1]
+        next_cursor = encode_cursor(last['title'], last['id'])
+    
+    return render_template('catalog.html', books=books[:page_size], next_cursor=next_cursor,
+                           page_size=page_size, paginated=True, is_first_page=after is None)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -0,0 +1,49 @@
+"""
+Conditional GET helpers - ETag / Last-Modified for pages that only depend on the catalog
+"""
+
+import hashlib
+from functools import wraps
+
+from flask import make_response, request, session
+from database import get_catalog_version
+from .encoding import negotiate_encoding
+
+def catalog_conditional(view):
+    """
+    Serve `view` with a strong ETag and Last-Modified derived from the
+    catalog version, answering 304 Not Modified when If-None-Match shows the
+    client's copy is current. If-Modified-Since alone never gives a 304:
+    Last-Modified has one-second resolution, so a write later in the same
+    second as the client's fetch would go unnoticed. The view must render
+    only from the books table and the request URL. Requests with pending flash messages are always rendered in full.
+    A compressed copy (ETag "<etag>-gzip", see encoding.py) also validates
+    when the request would be answered with the same encoding. Responses the
+    view marks no-store (e.g. partial search results) get no validators.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+        
+        version, updated_at = get_catalog_version()
+        digest = hashlib.sha1(f'{version}|{request.endpoint}|{request.full_path}'.encode('utf-8'))
+        etag = digest.hexdigest()
+        
+        encoding = negotiate_encoding() if request.if_none_match else None
+        encoded_etag = f'{etag}-{encoding}' if encoding else None
+        if encoded_etag and request.if_none_match.contains(encoded_etag):
+            etag = encoded_etag
+        not_modified = request.if_none_match.contains(etag)
+        
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.cache_control.no_store:
+                return response
+        response.set_etag(etag)
+        response.last_modified = updated_at
+        response.cache_control.no_cache = True  # cache, but revalidate every time
+        return response
+    return wrapper
@@ -0,0 +1,92 @@
+"""
+Response encoding helpers - pluggable JSON serialization and gzip/deflate compression
+
+jsonify() here is a drop-in for flask.jsonify that serializes with the
+encoder named by app.config['API_JSON_ENCODER']: 'orjson' (the default when
+the orjson package is installed), 'flask' (the app's JSON provider), or any
+callable taking the object and returning bytes. Values orjson cannot handle
+natively, dates included, fall back to the Flask provider's default(), so
+both encoders produce the same JSON.
+
+enable_compression(blueprint) compresses that blueprint's responses when the
+client accepts gzip or deflate and the body is at least
+API_COMPRESSION_MIN_SIZE bytes, at API_COMPRESSION_LEVEL (1 by default:
+nearly the ratio of level 6 for a fraction of the CPU time). Compressed
+responses get a distinct strong ETag ("<etag>-gzip"), since their bytes
+differ from the identity encoding. Streamed responses are sent as is.
+"""
+
+import gzip
+import zlib
+from typing import Callable, Dict, Optional
+
+from flask import Blueprint, Response, current_app, request
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the Flask JSON provider
+    orjson = None
+
+ENCODINGS = ('gzip', 'deflate')
+
+# Blueprint names whose responses are compressed
+_compressed_blueprints = set()
+
+def _flask_dumps(obj) -> bytes:
+    return current_app.json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def _orjson_dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=current_app.json.default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+JSON_ENCODERS: Dict[str, Callable] = {'flask': _flask_dumps}
+if orjson is not None:
+    JSON_ENCODERS['orjson'] = _orjson_dumps
+
+DEFAULT_JSON_ENCODER = 'orjson' if orjson is not None else 'flask'
+
+def get_json_encoder() -> Callable:
+    """The configured encoder: a JSON_ENCODERS name or a callable(obj) -> bytes."""
+    encoder = current_app.config.get('API_JSON_ENCODER', DEFAULT_JSON_ENCODER)
+    return encoder if callable(encoder) else JSON_ENCODERS[encoder]
+
+def jsonify(*args, **kwargs) -> Response:
+    """Like flask.jsonify, using the configured encoder."""
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    obj = kwargs or (args[0] if len(args) == 1 else list(args) or None)
+    return current_app.response_class(get_json_encoder()(obj) + b'\n', mimetype='application/json')
+
+def negotiate_encoding() -> Optional[str]:
+    """The content coding the current response would be compressed with, if any."""
+    if request.blueprint not in _compressed_blueprints:
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)  # mtime=0: same bytes every time
+    return zlib.compress(data, level)
+
+def _compress_response(response: Response) -> Response:
+    # Every response of the blueprint varies, including 304s standing in for
+    # a (possibly compressed) 200, so shared caches keep the encodings apart
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    encoding = negotiate_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < current_app.config.get('API_COMPRESSION_MIN_SIZE', 1024):
+        return response
+    response.set_data(compress(data, encoding, current_app.config.get('API_COMPRESSION_LEVEL', 1)))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+def enable_compression(blueprint: Blueprint):
+    """Compress large responses of `blueprint` for clients that accept it."""
+    _compressed_blueprints.add(blueprint.name)
+    blueprint.after_request(_compress_response)
@@ -0,0 +1,13 @@
+"""
+Metrics Routes - Prometheus scrape endpoint
+"""
+
+from flask import Blueprint, Response
+from metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Expose request, query and cache metrics in Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
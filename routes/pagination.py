@@ -0,0 +1,27 @@
+"""
+Pagination helpers - opaque keyset cursors shared by the route blueprints
+"""
+
+import base64
+import binascii
+import json
+
+def encode_cursor(*values):
+    """Encode a keyset position, e.g. (title, id), as an opaque URL token."""
+    raw = json.dumps(list(values)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(token, *types):
+    """
+    Decode a token from encode_cursor() whose values have the given types.
+    Returns the values as a tuple, or None if the token is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    if not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(values, types)):
+        return None
+    return tuple(values)
@@ -2,16 +2,22 @@
 Search Routes - Book search functionality
 """
 
-from flask import Blueprint, render_template, request, flash
+from flask import Blueprint, make_response, render_template, request, flash
+from database import get_catalog_version
+from fragments import search_results
 from library_service import search_books_in_catalog
+from .conditional import catalog_conditional
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@catalog_conditional
 def search_books():
     """
     Search for books in the catalog.
     Web interface for R5: Book Search Functionality
+    
+    The rendered results are cached until the catalog changes.
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
@@ -20,9 +26,16 @@ def search_books():
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
     # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    version, _ = get_catalog_version()
+    results, found, missing = search_results(search_term, search_type, version, search_books_in_catalog)
     
-    if not books:
+    if not found:
         flash('Search functionality is not yet implemented.', 'error')
+    if missing:
+        flash('Some branches did not respond in time; results may be incomplete.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    response = make_response(render_template('search.html', results=results, search_term=search_term,
+                                             search_type=search_type))
+    if missing:
+        response.cache_control.no_store = True
+    return response
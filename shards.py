@@ -0,0 +1,75 @@
+"""
+Shards Module - placement rules for a catalog split across per-branch SQLite files
+
+Each shard is a complete library database (same schema and migrations)
+holding one branch's books and the loans of those books. A book is placed on
+shard crc32(isbn) % N and its ID is allocated so that id % N names the same
+shard: an operation on a book is routed from its ID alone, an ISBN lookup
+touches one shard, and the per-shard UNIQUE(isbn) index keeps ISBNs unique
+across the whole catalog. A patron's loans can span shards; their borrows
+are serialized by a lock row on their home shard. database.py does the
+routing (see SHARDS there).
+"""
+
+import zlib
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# FTS5's bm25() constants
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def shard_for_book(book_id: int, count: int) -> int:
+    """The shard holding book `book_id`."""
+    return book_id % count
+
+def shard_for_isbn(isbn: str, count: int) -> int:
+    """The shard a book with this ISBN is (or would be) stored on."""
+    return zlib.crc32(isbn.encode('utf-8')) % count
+
+def shard_for_patron(patron_id: str, count: int) -> int:
+    """The patron's home shard, which holds the lock serializing their borrows."""
+    return zlib.crc32(patron_id.encode('utf-8')) % count
+
+def allocate_book_ids(last_id: Optional[int], shard: int, count: int, how_many: int) -> List[int]:
+    """
+    The next `how_many` book IDs for `shard` of `count`: each above `last_id`
+    (the shard's highest ID so far, None if it never had a book) and
+    congruent to `shard` modulo `count`.
+    """
+    after = last_id or 0
+    first = after + 1 + (shard - after - 1) % count
+    return list(range(first, first + how_many * count, count))
+
+def trigram_count(text: str) -> int:
+    """Tokens a trigram FTS5 index holds for `text`; the search_totals triggers count the same in SQL."""
+    return max(len(text) - 2, 0)
+
+@lru_cache(maxsize=64)
+def _phrase(term: str) -> Tuple[str, bool]:
+    """The folded term, and whether two matches of it can overlap (then str.count() would miss some)."""
+    needle = term.lower()
+    return needle, any(needle.endswith(needle[:size]) for size in range(1, len(needle)))
+
+def trigram_bm25(text: str, other: str, term: str, average_tokens: float) -> float:
+    """
+    The bm25() a trigram FTS5 index would give a row whose searched column is
+    `text` (and other column `other`) for the phrase `term`, computed with
+    the catalog-wide average row size (from the shards' search_totals) so
+    scores from different shards compare.
+    Leaves out the phrase's IDF, which is the same for every row of a search;
+    like bm25(), lower is better.
+    """
+    needle, overlaps = _phrase(term)
+    haystack = text.lower()
+    if overlaps:
+        hits = 0
+        position = haystack.find(needle)
+        while position >= 0:
+            hits += 1
+            position = haystack.find(needle, position + 1)
+    else:
+        hits = haystack.count(needle)
+    tokens = trigram_count(text) + trigram_count(other)
+    length_norm = 1 - BM25_B + BM25_B * tokens / average_tokens
+    return -hits * (BM25_K1 + 1) / (hits + BM25_K1 * length_norm)
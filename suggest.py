@@ -0,0 +1,216 @@
+"""
+Suggest Module - in-memory prefix index for type-ahead title/author completion
+
+Every title and author is indexed under each of its word starts ("The Great
+Gatsby" under "the great gatsby", "great gatsby" and "gatsby"), lowercased, in
+a sorted array; completing a prefix is a bisect plus a short forward scan.
+Local inserts update the index directly; changes made elsewhere are picked up
+from the book_changes log at most every `refresh_interval` seconds, so most
+keystrokes never reach SQLite.
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+SUGGEST_FIELDS = ('title', 'author')
+
+def _normalize(value: str) -> str:
+    return ' '.join(value.lower().split())
+
+def _inner_word_starts(value: str) -> List[str]:
+    """Lowercased suffixes of `value` beginning at its second, third, ... word."""
+    words = value.lower().split()
+    return [' '.join(words[i:]) for i in range(1, len(words))]
+
+def _insert(keys: List[str], values: List[str], key: str, value: str):
+    i = bisect_left(keys, key)
+    # Equal keys stay ordered by value, so removal can find its entry
+    while i < len(keys) and keys[i] == key and values[i] < value:
+        i += 1
+    keys.insert(i, key)
+    values.insert(i, value)
+
+def _delete(keys: List[str], values: List[str], key: str, value: str):
+    i = bisect_left(keys, key)
+    while i < len(keys) and keys[i] == key:
+        if values[i] == value:
+            del keys[i]
+            del values[i]
+            return
+        i += 1
+
+def _scan(keys: List[str], values: List[str], prefix: str, limit: int, found: List[str]):
+    """Append distinct values whose key starts with `prefix` to `found`, up to `limit` in total."""
+    i = bisect_left(keys, prefix)
+    while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+        if values[i] not in found:
+            found.append(values[i])
+        i += 1
+
+def _sorted_entries(pairs) -> Tuple[List[str], List[str]]:
+    entries = sorted(pairs)
+    return [key for key, _ in entries], [value for _, value in entries]
+
+class PrefixIndex:
+    """
+    Sorted key/value arrays over a set of strings (with reference counts for
+    repeated values): one keyed by the whole value, one by its inner word starts.
+    """
+
+    __slots__ = ('_keys', '_values', '_word_keys', '_word_values', '_counts')
+
+    def __init__(self):
+        self.rebuild([])
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, value: str):
+        count = self._counts.get(value, 0)
+        self._counts[value] = count + 1
+        if count:
+            return
+        _insert(self._keys, self._values, _normalize(value), value)
+        for key in _inner_word_starts(value):
+            _insert(self._word_keys, self._word_values, key, value)
+
+    def remove(self, value: str):
+        count = self._counts.get(value, 0)
+        if count != 1:
+            if count:
+                self._counts[value] = count - 1
+            return
+        del self._counts[value]
+        _delete(self._keys, self._values, _normalize(value), value)
+        for key in _inner_word_starts(value):
+            _delete(self._word_keys, self._word_values, key, value)
+
+    def rebuild(self, values: List[str]):
+        """Replace the contents with `values` in one sort."""
+        self._counts: Dict[str, int] = {}
+        for value in values:
+            self._counts[value] = self._counts.get(value, 0) + 1
+        self._keys, self._values = _sorted_entries(
+            (_normalize(value), value) for value in self._counts)
+        self._word_keys, self._word_values = _sorted_entries(
+            (key, value) for value in self._counts for key in _inner_word_starts(value))
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """Up to `limit` distinct values with a word starting with `prefix`, whole-value matches first."""
+        prefix = _normalize(prefix)
+        found = []
+        if prefix and limit > 0:
+            _scan(self._keys, self._values, prefix, limit, found)
+            _scan(self._word_keys, self._word_values, prefix, limit, found)
+        return found
+
+def merge_completions(prefix: str, completions: List[List[str]], limit: int) -> List[str]:
+    """
+    Combine complete() results of several indexes (e.g. one per shard) into
+    the order a single index over all their values would give.
+    """
+    prefix = _normalize(prefix)
+    def order(value):
+        key = _normalize(value)
+        if key.startswith(prefix):
+            return (0, key, value)
+        return (1, min(word for word in _inner_word_starts(value) if word.startswith(prefix)), value)
+    values = {value for found in completions for value in found}
+    return sorted(values, key=order)[:limit]
+
+class SuggestIndex:
+    """Title and author PrefixIndexes for one database, refreshed from book_changes."""
+
+    def __init__(self, database: str, timeout: float = 5.0, refresh_interval: float = 1.0):
+        self.database = database
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.watermark = None  # last book_changes.seq applied; None until loaded
+        self.indexes = {field: PrefixIndex() for field in SUGGEST_FIELDS}
+        self._books: Dict[int, Tuple[str, str]] = {}
+        self._next_check = 0.0
+        self._conn = None
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    def suggest(self, prefix: str, field: str, limit: int = 10) -> List[str]:
+        """Complete `prefix` against `field` ('title' or 'author')."""
+        self.refresh()
+        with self._lock:
+            return self.indexes[field].complete(prefix, limit)
+
+    def expire(self):
+        """Check the database on the next suggest() (e.g. after a bulk insert)."""
+        self._next_check = 0.0
+
+    def note_insert(self, book_id: int, title: str, author: str):
+        """Index a book this process just inserted, without waiting for a refresh."""
+        with self._lock:
+            if self.watermark is not None:
+                self._set(book_id, title, author)
+
+    def refresh(self, force: bool = False):
+        """Apply changes from the database if the refresh interval has elapsed."""
+        if not force and time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.database, timeout=self.timeout,
+                                             check_same_thread=False, isolation_level=None)
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version or self.watermark is None:
+                self._conn.execute('BEGIN')
+                try:
+                    if self.watermark is None:
+                        self._load_all()
+                    else:
+                        self._apply_changes()
+                finally:
+                    self._conn.execute('COMMIT')
+                self._data_version = data_version
+            self._next_check = time.monotonic() + self.refresh_interval
+
+    def _load_all(self):
+        self.watermark = self._conn.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM book_changes').fetchone()[0]
+        self._books = {book_id: (sys.intern(title), sys.intern(author)) for book_id, title, author
+                       in self._conn.execute('SELECT id, title, author FROM books')}
+        self.indexes['title'].rebuild([title for title, _ in self._books.values()])
+        self.indexes['author'].rebuild([author for _, author in self._books.values()])
+
+    def _apply_changes(self):
+        changes = self._conn.execute('''
+            SELECT c.seq, c.book_id, b.title, b.author
+            FROM book_changes c LEFT JOIN books b ON b.id = c.book_id
+            WHERE c.seq > ?
+            ORDER BY c.seq
+        ''', (self.watermark,)).fetchall()
+        for seq, book_id, title, author in changes:
+            self._set(book_id, title, author)
+        if changes:
+            self.watermark = changes[-1][0]
+
+    def _set(self, book_id: int, title: Optional[str], author: Optional[str]):
+        """Make the index reflect book `book_id` (None title: deleted)."""
+        old = self._books.get(book_id)
+        new = (sys.intern(title), sys.intern(author)) if title is not None else None
+        if old == new:
+            return
+        if old is not None:
+            self.indexes['title'].remove(old[0])
+            self.indexes['author'].remove(old[1])
+            del self._books[book_id]
+        if new is not None:
+            self.indexes['title'].add(new[0])
+            self.indexes['author'].add(new[1])
+            self._books[book_id] = new
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
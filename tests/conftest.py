@@ -1,3 +1,45 @@
 # tests/conftest.py
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from datetime import datetime, timedelta
+
+import pytest
+import database
+
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    """Point the database module at a fresh, initialized SQLite file."""
+    database.close_db_connections()
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'library.db'))
+    database.init_database()
+    yield database.DATABASE
+    database.close_db_connections()
+
+
+@pytest.fixture
+def client(library_db):
+    """Flask test client backed by the temporary library database."""
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+@pytest.fixture
+def add_loans(library_db):
+    """add_loans(patron_id, count, days_late=0): insert returned loans directly, `days_late` days past due."""
+    def add(patron_id, count, days_late=0):
+        conn = database.get_db_connection()
+        base = datetime(2024, 1, 1)
+        conn.executemany(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) '
+            'VALUES (?, 1, ?, ?, ?)',
+            [(patron_id, (base + timedelta(days=i)).isoformat(),
+              (base + timedelta(days=i + 14)).isoformat(),
+              (base + timedelta(days=i + 14 + days_late)).isoformat()) for i in range(count)]
+        )
+        conn.commit()
+        conn.close()
+    return add
@@ -0,0 +1,84 @@
+import pytest
+
+import database
+import metrics
+from admission import TokenBucketLimiter
+
+
+def decisions(**labels):
+    key = tuple(labels.get(name, '') for name in metrics.ADMISSION_DECISIONS.labelnames)
+    return metrics.ADMISSION_DECISIONS._values.get(key, 0)
+
+
+def test_token_bucket_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('admission.time.monotonic', lambda: now[0])
+    limiter = TokenBucketLimiter(rate=2.0, burst=3)
+    assert [limiter.acquire('k') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire('k') == pytest.approx(0.5)
+    assert limiter.acquire('other') == 0.0
+    now[0] += 0.5
+    assert limiter.acquire('k') == 0.0
+
+
+def test_client_rate_limit_returns_429_before_db_work(client):
+    client.application.config['RATE_LIMITS'] = {'api': (0.001, 2)}
+    queries = []
+    database.set_query_observer(lambda sql, seconds: queries.append(sql))
+    rejected_before = decisions(blueprint='api', decision='rejected', reason='client_rate')
+    try:
+        assert client.get('/api/search?q=gatsby').status_code == 200
+        assert client.get('/api/search?q=gatsby').status_code == 200
+        queries.clear()
+        response = client.get('/api/search?q=gatsby')
+    finally:
+        database.set_query_observer(metrics.observe_query)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['error'] == 'Too many requests'
+    assert queries == []
+    assert decisions(blueprint='api', decision='rejected', reason='client_rate') == rejected_before + 1
+
+    # Other blueprints have their own buckets
+    assert client.get('/catalog').status_code == 200
+
+
+def test_patron_rate_limit_across_clients(client):
+    client.application.config['RATE_LIMITS'] = {'borrowing': (0.001, 1)}
+
+    def borrow(address, patron_id, book_id):
+        return client.post('/borrow', data={'patron_id': patron_id, 'book_id': book_id},
+                           environ_base={'REMOTE_ADDR': address})
+
+    assert borrow('10.0.0.1', '123456', '1').status_code == 302
+    # A different kiosk, but the same patron
+    response = borrow('10.0.0.2', '123456', '2')
+    assert response.status_code == 429
+    assert response.mimetype == 'text/plain'
+    assert borrow('10.0.0.3', '654321', '2').status_code == 302
+
+
+def test_write_concurrency_cap(client):
+    app = client.application
+    app.config['RATE_LIMITS'] = {}
+    app.config['MAX_CONCURRENT_WRITES'] = 1
+    slots = app.extensions['admission'].write_semaphore(1)
+    assert slots.acquire(blocking=False)  # a write already in progress
+    try:
+        response = client.post('/api/borrow/batch', json={'patron_id': '123456', 'book_ids': [1]})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/api/search?q=gatsby').status_code == 200  # reads are not capped
+    finally:
+        slots.release()
+    response = client.post('/api/borrow/batch', json={'patron_id': '123456', 'book_ids': [1]})
+    assert response.status_code == 200
+    # The slot was released after the request
+    assert slots.acquire(blocking=False)
+    slots.release()
+
+
+def test_admission_control_can_be_disabled(client):
+    client.application.config['RATE_LIMITS'] = {'api': (0.001, 1)}
+    client.application.config['ADMISSION_CONTROL'] = False
+    assert all(client.get('/api/search?q=gatsby').status_code == 200 for _ in range(3))
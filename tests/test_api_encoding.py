@@ -0,0 +1,74 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from benchmarks.seed import seed_database
+from routes.encoding import JSON_ENCODERS
+
+URL = '/api/search?q=the&type=title'
+
+
+@pytest.fixture
+def api(client):
+    seed_database(200)
+    client.application.config['ADMISSION_CONTROL'] = False
+    return client
+
+
+def test_large_responses_are_compressed_when_accepted(api):
+    plain = api.get(URL)
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    packed = api.get(URL, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert len(packed.data) < len(plain.data)
+    assert gzip.decompress(packed.data) == plain.data
+
+    deflated = api.get(URL, headers={'Accept-Encoding': 'deflate'})
+    assert deflated.headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(deflated.data) == plain.data
+
+
+def test_small_and_streamed_responses_are_not_compressed(api):
+    small = api.get('/api/suggest?q=th', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    export = api.get('/api/books/export', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in export.headers
+
+
+def test_etag_differs_per_encoding(api):
+    plain = api.get(URL)
+    packed = api.get(URL, headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    revalidated = api.get(URL, headers={'Accept-Encoding': 'gzip', 'If-None-Match': packed.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == packed.headers['ETag']
+    assert 'Accept-Encoding' in revalidated.headers['Vary']
+    # The gzip copy does not validate a request that would get the identity encoding
+    assert api.get(URL, headers={'If-None-Match': packed.headers['ETag']}).status_code == 200
+    assert api.get(URL, headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+
+def test_fields_projection(api):
+    results = api.get(URL + '&fields=id,title').get_json()['results']
+    assert results and all(set(book) == {'id', 'title'} for book in results)
+    books = api.get('/api/books?limit=5&fields=isbn').get_json()['books']
+    assert [set(book) for book in books] == [{'isbn'}] * 5
+    response = api.get(URL + '&fields=id,secret')
+    assert response.status_code == 400
+    assert 'secret' in response.get_json()['error']
+
+
+def test_encoders_are_interchangeable(api):
+    outputs = []
+    for name in JSON_ENCODERS:
+        api.application.config['API_JSON_ENCODER'] = name
+        outputs.append(api.get(URL).get_json())
+    assert all(output == outputs[0] for output in outputs)
+
+    api.application.config['API_JSON_ENCODER'] = lambda obj: json.dumps({'custom': True}).encode()
+    assert api.get(URL).get_json() == {'custom': True}
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import archive
+import database
+from library_service import archive_old_loans, get_patron_history, get_patron_status_report
+
+
+def table_count(table):
+    conn = database.get_db_connection()
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_archive_moves_old_returned_loans_in_batches(library_db, add_loans):
+    database.add_sample_data()
+    add_loans('777777', 30)   # returned in 2024
+    hot_before = table_count('borrow_records')
+
+    moved = database.archive_returned_loans(datetime(2024, 1, 25), batch_size=4)
+    # Loans 0..10 were returned before Jan 25 (return date = Jan 15 + i)
+    assert moved == 10
+    assert table_count('borrow_records_archive') == 10
+    assert table_count('borrow_records') == hot_before - 10
+
+    # Open loans are never archived; the rest go with a recent cutoff
+    assert archive_old_loans(days=0) == 20
+    assert table_count('borrow_records') == 1
+    assert database.get_patron_borrow_count('123456') == 1
+    assert database.get_patron_summary('777777')['lifetime_loans'] == 30
+
+
+def test_history_unions_hot_and_archived_loans(library_db, add_loans):
+    database.add_sample_data()
+    add_loans('777777', 45)
+    expected = get_patron_history('777777', limit=100)[0]
+    database.archive_returned_loans(datetime(2024, 2, 1), batch_size=7)
+    assert 0 < table_count('borrow_records_archive') < 45
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = get_patron_history('777777', cursor, limit=10)
+        seen += page
+        if cursor is None:
+            break
+    assert seen == expected
+    assert get_patron_status_report('777777')['history'] == expected[:20]
+
+
+def test_cli(library_db, add_loans, capsys):
+    database.add_sample_data()
+    add_loans('777777', 3)
+    assert archive.main(['--days', '30', '--pause', '0']) == 0
+    assert 'Archived 3 loans.' in capsys.readouterr().out
@@ -0,0 +1,49 @@
+import database
+from library_service import add_book_to_catalog, borrow_books_by_patron, MAX_BORROWED_BOOKS
+
+
+def add_books(count, copies=1):
+    ids = []
+    for i in range(count):
+        isbn = f'{9784000000000 + i}'
+        assert add_book_to_catalog(f'Batch Book {i}', 'Author', isbn, copies)[0]
+        ids.append(database.get_book_by_isbn(isbn)['id'])
+    return ids
+
+
+def test_batch_borrow_applies_limit_once(library_db):
+    ids = add_books(7)
+    success, message, results = borrow_books_by_patron('111222', ids + [9999])
+    assert success
+    assert [r['success'] for r in results] == [True] * MAX_BORROWED_BOOKS + [False, False, False]
+    assert 'maximum borrowing limit' in results[5]['message']
+    assert results[-1]['message'] == 'Book not found.'
+    assert message == f'Borrowed {MAX_BORROWED_BOOKS} of 8 books.'
+    assert database.get_patron_borrow_count('111222') == MAX_BORROWED_BOOKS
+    assert database.get_book_by_id(ids[0])['available_copies'] == 0
+
+
+def test_batch_borrow_same_title_until_copies_run_out(library_db):
+    book_id = add_books(1, copies=2)[0]
+    _, _, results = borrow_books_by_patron('111333', [book_id] * 3)
+    assert [r['success'] for r in results] == [True, True, False]
+    assert database.get_book_by_id(book_id)['available_copies'] == 0
+
+
+def test_batch_endpoints(client):
+    ids = add_books(3)
+    response = client.post('/api/borrow/batch', json={'patron_id': '444555', 'book_ids': ids})
+    assert response.get_json()['succeeded'] == 3
+
+    response = client.post('/api/return/batch', json={'patron_id': '444555', 'book_ids': ids + ids[:1]})
+    body = response.get_json()
+    assert body['succeeded'] == 3
+    assert body['results'][-1]['message'] == 'This book was not borrowed by the patron'
+    assert all(database.get_book_by_id(b)['available_copies'] == 1 for b in ids)
+    assert database.get_patron_summary('444555') == {
+        'patron_id': '444555', 'active_count': 0, 'lifetime_loans': 3, 'outstanding_fees': 0.0
+    }
+
+    assert client.post('/api/borrow/batch', json={'patron_id': '12', 'book_ids': ids}).status_code == 400
+    assert client.post('/api/return/batch', json={'patron_id': '444555', 'book_ids': 'x'}).status_code == 400
+    assert client.post('/api/return/batch', data='nope').status_code == 400
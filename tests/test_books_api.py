@@ -0,0 +1,60 @@
+import json
+import sqlite3
+
+import database
+
+
+def add_books(count):
+    database.insert_books([(f'Sync Book {i:03d}', 'Author', f'97850000{i:05d}', 1) for i in range(count)])
+
+
+def test_full_sync_pages_through_catalog(client):
+    add_books(7)
+    seen, token = [], None
+    while True:
+        url = '/api/books?limit=4' + (f'&after={token}' if token else '')
+        data = client.get(url).get_json()
+        seen += [book['id'] for book in data['books']]
+        token = data['next']
+        if token is None:
+            break
+    assert seen == list(range(1, 11))
+    assert data['watermark'] == database.get_catalog_watermark()
+    assert client.get('/api/books?after=bogus').status_code == 400
+    assert client.get('/api/books?limit=0').status_code == 400
+
+
+def test_incremental_sync_since_watermark(client, library_db):
+    watermark = client.get('/api/books').get_json()['watermark']
+    assert client.get(f'/api/books?since={watermark}').get_json() == {
+        'books': [], 'deleted': [], 'watermark': watermark, 'has_more': False}
+
+    add_books(3)
+    conn = sqlite3.connect(library_db)
+    conn.execute('UPDATE books SET available_copies = 2 WHERE id = 1')
+    conn.execute('DELETE FROM books WHERE id = 2')
+    conn.commit()
+    conn.close()
+
+    data = client.get(f'/api/books?since={watermark}&limit=3').get_json()
+    assert data['has_more'] is True
+    books, deleted = data['books'], data['deleted']
+    data = client.get(f'/api/books?since={data["watermark"]}&limit=3').get_json()
+    books += data['books']
+    deleted += data['deleted']
+    assert sorted(book['id'] for book in books) == [1, 4, 5, 6]
+    assert deleted == [2]
+    assert data['watermark'] == database.get_catalog_watermark()
+    assert client.get('/api/books?since=x').status_code == 400
+
+
+def test_export_streams_ndjson(client):
+    add_books(5)
+    response = client.get('/api/books/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    assert int(response.headers['X-Catalog-Watermark']) == database.get_catalog_watermark()
+    books = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [book['id'] for book in books] == list(range(1, 9))
+    assert books[0]['title'] == 'The Great Gatsby'
@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+import database
+from library_service import add_book_to_catalog, borrow_book_by_patron
+
+
+def test_repeated_lookups_hit_cache(library_db):
+    database.add_sample_data()
+    before = database.get_cache_stats()
+    for _ in range(5):
+        assert database.get_book_by_id(1)['title'] == 'The Great Gatsby'
+        assert database.get_book_by_isbn('9780743273565')['id'] == 1
+    after = database.get_cache_stats()
+    assert after['hits'] - before['hits'] >= 8
+
+
+def test_cached_values_are_copies(library_db):
+    database.add_sample_data()
+    database.get_book_by_id(1)['title'] = 'Mutated'
+    assert database.get_book_by_id(1)['title'] == 'The Great Gatsby'
+
+
+def test_local_writes_invalidate_precisely(library_db):
+    database.add_sample_data()
+    database.get_book_by_id(2)
+    assert database.get_book_by_isbn('9781111111111') is None
+    assert add_book_to_catalog('Cache Book', 'Author', '9781111111111', 2)[0]
+    assert database.get_book_by_isbn('9781111111111')['title'] == 'Cache Book'
+
+    assert borrow_book_by_patron('654321', 1)[0]
+    assert database.get_book_by_id(1)['available_copies'] == 2
+    assert any(b['available_copies'] == 2 for b in database.get_all_books() if b['id'] == 1)
+
+    # The unrelated entry for book 2 survived both writes
+    hits = database.get_cache_stats()['hits']
+    database.get_book_by_id(2)
+    assert database.get_cache_stats()['hits'] == hits + 1
+
+
+def test_writes_from_other_connections_are_seen(library_db):
+    database.add_sample_data()
+    assert database.get_book_by_id(1)['available_copies'] == 3
+    assert len(database.get_all_books()) == 3
+
+    # Simulates another worker process writing to the same file
+    other = sqlite3.connect(library_db)
+    other.execute('UPDATE books SET available_copies = 1 WHERE id = 1')
+    other.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                  "VALUES ('Elsewhere', 'Someone', '9782222222222', 1, 1)")
+    other.commit()
+    other.close()
+
+    time.sleep(database.CACHE_POLL_INTERVAL)
+    assert database.get_book_by_id(1)['available_copies'] == 1
+    assert len(database.get_all_books()) == 4
+    assert database.get_book_by_isbn('9782222222222')['title'] == 'Elsewhere'
+
+
+def test_cache_hits_do_not_poll_between_intervals(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'CACHE_POLL_INTERVAL', 60.0)
+    database.add_sample_data()
+    database.get_book_by_id(1)
+    polls = []
+    database.get_book_cache()._watcher.set_trace_callback(polls.append)
+    for _ in range(50):
+        assert database.get_book_by_id(1)['title'] == 'The Great Gatsby'
+    assert polls == []
+
+
+def test_cache_stats_endpoint(client):
+    client.get('/api/cache/stats')
+    stats = client.get('/api/cache/stats').get_json()
+    assert {'hits', 'misses', 'evictions', 'size'} <= set(stats)
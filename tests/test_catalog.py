@@ -0,0 +1,29 @@
+import re
+
+from library_service import add_book_to_catalog
+
+
+def test_catalog_pages_with_cursor(client):
+    for i in range(7):
+        add_book_to_catalog(f'Paged Book {i}', 'Author', f'{9781000000000 + i}', 1)
+    seen = []
+    url = '/catalog?page_size=4'
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        seen += re.findall(r'<td>(Paged Book \d|The Great Gatsby|To Kill a Mockingbird|1984)</td>', html)
+        match = re.search(r'href="(/catalog\?after=[^"]+)"', html)
+        url = match.group(1).replace('&amp;', '&') if match else None
+    assert len(seen) == 10
+    assert len(set(seen)) == 10
+
+
+def test_catalog_stream(client):
+    response = client.get('/catalog?stream=1')
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert 'The Great Gatsby' in html
+    assert 'Next Page' not in html
+
+
+def test_catalog_bad_cursor(client):
+    assert client.get('/catalog?after=not-a-cursor').status_code == 400
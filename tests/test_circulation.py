@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import database
+from library_service import (
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron, MAX_BORROWED_BOOKS
+)
+
+
+@pytest.fixture(autouse=True, params=[False, True], ids=['direct', 'group_commit'])
+def group_commit(request, monkeypatch):
+    """Run every stress test with and without the group-commit writer."""
+    monkeypatch.setattr(database, 'GROUP_COMMIT', request.param)
+
+
+def add_book(isbn, copies):
+    assert add_book_to_catalog('Stress Test Book', 'Author', isbn, copies)[0]
+    return database.get_book_by_isbn(isbn)['id']
+
+
+def run_concurrently(func, args_list):
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(i, args):
+        barrier.wait()
+        results[i] = func(*args)
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def open_loans(book_id):
+    conn = database.get_db_connection()
+    count = conn.execute(
+        'SELECT COUNT(*) FROM borrow_records WHERE book_id = ? AND return_date IS NULL', (book_id,)
+    ).fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_concurrent_borrows_never_oversell(library_db):
+    copies = 3
+    book_id = add_book('9780000000001', copies)
+    results = run_concurrently(
+        borrow_book_by_patron, [(f'{200000 + i:06d}', book_id) for i in range(32)]
+    )
+    assert sum(success for success, _ in results) == copies
+    assert database.get_book_by_id(book_id)['available_copies'] == 0
+    assert open_loans(book_id) == copies
+
+
+def test_concurrent_borrows_respect_patron_limit(library_db):
+    book_ids = [add_book(f'97800000001{i:02d}', 5) for i in range(12)]
+    results = run_concurrently(borrow_book_by_patron, [('300000', b) for b in book_ids])
+    assert sum(success for success, _ in results) == MAX_BORROWED_BOOKS
+    assert database.get_patron_borrow_count('300000') == MAX_BORROWED_BOOKS
+
+
+def test_concurrent_borrow_and_return_balance(library_db):
+    book_id = add_book('9780000000002', 10)
+    patrons = [f'{400000 + i:06d}' for i in range(10)]
+    run_concurrently(borrow_book_by_patron, [(p, book_id) for p in patrons])
+    results = run_concurrently(return_book_by_patron, [(p, book_id) for p in patrons] * 2)
+    assert sum(success for success, _ in results) == len(patrons)
+    book = database.get_book_by_id(book_id)
+    assert book['available_copies'] == book['total_copies']
+    assert open_loans(book_id) == 0
+
+
+def test_return_requires_open_loan(library_db):
+    book_id = add_book('9780000000003', 1)
+    assert not return_book_by_patron('500000', book_id)[0]
+    assert borrow_book_by_patron('500000', book_id)[0]
+    assert return_book_by_patron('500000', book_id) == (True, 'Returned. Late fee $0.00')
+    assert database.get_book_by_id(book_id)['available_copies'] == 1
@@ -0,0 +1,59 @@
+import pytest
+
+from library_service import add_book_to_catalog, borrow_book_by_patron
+
+
+@pytest.mark.parametrize('path', ['/catalog', '/search?q=gatsby&type=title',
+                                  '/api/search?q=gatsby&type=title'])
+def test_unchanged_catalog_revalidates_with_304(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    assert 'Last-Modified' in first.headers
+
+    again = client.get(path, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+
+def test_book_writes_change_the_etag(client):
+    etag = client.get('/catalog').headers['ETag']
+    assert add_book_to_catalog('Conditional Book', 'Author', '9782222222222', 1)[0]
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Conditional Book' in response.data
+
+    etag = response.headers['ETag']
+    assert borrow_book_by_patron('123456', 1)[0]
+    assert client.get('/catalog', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_etag_depends_on_query(client):
+    title = client.get('/api/search?q=gatsby&type=title').headers['ETag']
+    author = client.get('/api/search?q=gatsby&type=author').headers['ETag']
+    assert title != author
+    response = client.get('/api/search?q=gatsby&type=author', headers={'If-None-Match': title})
+    assert response.status_code == 200
+
+
+def test_if_modified_since_alone_does_not_revalidate(client):
+    first = client.get('/catalog')
+    assert first.headers['Last-Modified']
+    assert add_book_to_catalog('Same Second', 'Author', '9787777777777', 1)[0]  # usually within the same second
+    response = client.get('/catalog', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
+    assert b'Same Second' in response.data
+    response = client.get('/catalog', headers={'If-Modified-Since': response.headers['Last-Modified'],
+                                               'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_pending_flash_messages_bypass_304(client):
+    etag = client.get('/catalog').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('error', 'Flashed message')]
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Flashed message' in response.data
@@ -0,0 +1,75 @@
+import threading
+
+import database
+
+
+def test_helpers_reuse_pooled_connection(library_db):
+    database.get_all_books()
+    opened = database.get_pool().opened
+    for _ in range(20):
+        database.get_all_books()
+        database.get_patron_borrow_count('123456')
+    assert database.get_pool().opened == opened
+
+
+def test_connection_pragmas(library_db):
+    conn = database.get_db_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    conn.close()
+
+
+def test_nested_calls_share_connection(library_db):
+    outer = database.get_db_connection()
+    inner = database.get_db_connection()
+    assert inner is outer
+    inner.close()
+    outer.close()
+
+
+def test_threads_get_distinct_connections(library_db):
+    seen = []
+
+    def worker():
+        conn = database.get_db_connection()
+        seen.append(conn)
+        barrier.wait()
+        conn.close()
+
+    barrier = threading.Barrier(2)
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen[0] is not seen[1]
+
+
+def test_pooling_disabled(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'POOL_SIZE', 0)
+    first = database.get_db_connection()
+    first.close()
+    second = database.get_db_connection()
+    assert second is not first
+    second.close()
+
+
+def test_request_pins_one_connection(client):
+    opened = database.get_pool().opened
+    for _ in range(5):
+        assert client.get('/catalog').status_code == 200
+    assert database.get_pool().opened <= opened + 1
+
+
+def test_books_page_keyset(library_db):
+    conn = database.get_db_connection()
+    conn.executemany(
+        'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 1, 1)',
+        [('Same Title', 'A', f'{9780000000000 + i}') for i in range(5)]
+    )
+    conn.commit()
+    conn.close()
+    first = database.get_books_page(limit=3)
+    rest = database.get_books_page((first[-1]['title'], first[-1]['id']), limit=3)
+    assert [b['id'] for b in first + rest] == [b['id'] for b in database.iter_books(batch_size=2)]
+    assert len(rest) == 2
@@ -0,0 +1,59 @@
+import os
+
+import database
+import fragments
+import routes.search_routes
+from library_service import add_book_to_catalog, borrow_book_by_patron
+
+
+def row_stats(client):
+    return fragments.cache_stats(client.application)['rows']
+
+
+def test_catalog_rows_are_cached_until_counts_change(client):
+    first = client.get('/catalog').get_data(as_text=True)
+    misses = row_stats(client)['misses']
+    assert client.get('/catalog').get_data(as_text=True) == first
+    assert row_stats(client)['misses'] == misses
+
+    assert borrow_book_by_patron('123456', 1)[0]
+    html = client.get('/catalog').get_data(as_text=True)
+    assert row_stats(client)['misses'] == misses + 1
+    book = database.get_book_by_id(1)
+    assert f'{book["available_copies"]}/{book["total_copies"]} Available' in html
+
+
+def test_rows_rerender_after_direct_edit_and_escape(client):
+    client.get('/catalog')
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET title = '<b>Renamed</b>' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    html = client.get('/catalog').get_data(as_text=True)
+    assert '&lt;b&gt;Renamed&lt;/b&gt;' in html
+    assert '<b>Renamed</b>' not in html
+
+
+def test_search_results_cached_per_catalog_version(client, monkeypatch):
+    calls = []
+    search = routes.search_routes.search_books_in_catalog
+    monkeypatch.setattr(routes.search_routes, 'search_books_in_catalog',
+                        lambda *args, **kwargs: calls.append(args) or search(*args, **kwargs))
+
+    first = client.get('/search?q=gatsby&type=title').get_data(as_text=True)
+    assert client.get('/search?q=gatsby&type=title').get_data(as_text=True) == first
+    assert len(calls) == 1
+
+    assert add_book_to_catalog('Gatsby Revisited', 'Someone', '9781111111111', 2)[0]
+    html = client.get('/search?q=gatsby&type=title').get_data(as_text=True)
+    assert len(calls) == 2
+    assert 'Gatsby Revisited' in html
+
+
+def test_precompile_templates_fills_bytecode_cache(library_db, tmp_path, monkeypatch):
+    from app import create_app
+    monkeypatch.setenv('LIBRARY_TEMPLATE_CACHE_DIR', str(tmp_path))
+    app = create_app(init_db=False)
+    fragments.precompile_templates(app)
+    compiled = [name for name in os.listdir(tmp_path) if name.endswith('.cache')]
+    assert len(compiled) == len(app.jinja_env.list_templates(extensions=['html']))
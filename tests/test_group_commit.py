@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+import database
+from group_commit import GroupCommitWriter
+from library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron
+
+
+@pytest.fixture
+def writer(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'GROUP_COMMIT', True)
+    monkeypatch.setattr(database, 'GROUP_COMMIT_WINDOW', 0.05)
+    return database.get_group_commit_writer()
+
+
+def test_concurrent_writes_share_transactions(writer):
+    assert add_book_to_catalog('Group Book', 'Author', '9786666666666', 40)[0]
+    book_id = database.get_book_by_isbn('9786666666666')['id']
+    barrier = threading.Barrier(20)
+    results = []
+
+    def borrow(i):
+        barrier.wait()
+        results.append(borrow_book_by_patron(f'{500000 + i:06d}', book_id))
+
+    threads = [threading.Thread(target=borrow, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(success for success, _ in results)
+    assert writer.jobs == 20
+    assert writer.batches < 20
+    assert database.get_book_by_id(book_id)['available_copies'] == 20
+    assert return_book_by_patron('500000', book_id)[0]
+    assert database.get_book_by_id(book_id)['available_copies'] == 21
+
+
+def test_failing_job_does_not_abort_its_batch(writer):
+    database.add_sample_data()
+
+    def failing(conn):
+        conn.execute('UPDATE books SET available_copies = 99 WHERE id = 1')
+        raise RuntimeError('boom')
+
+    def good(conn):
+        conn.execute('UPDATE books SET available_copies = 1 WHERE id = 2')
+        return 'done', database._book_keys(2)
+
+    results = {}
+    threads = [threading.Thread(target=lambda: results.update(bad=writer.submit(failing, (), 'failed'))),
+               threading.Thread(target=lambda: results.update(good=writer.submit(good)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {'bad': 'failed', 'good': 'done'}
+    assert database.get_book_by_id(1)['available_copies'] == 3
+    assert database.get_book_by_id(2)['available_copies'] == 1
+
+
+def test_submit_after_close_runs_on_the_caller(writer):
+    database.add_sample_data()
+    writer.close()
+
+    def good(conn):
+        conn.execute('UPDATE books SET available_copies = 1 WHERE id = 2')
+        return 'done', database._book_keys(2)
+
+    assert writer.submit(good) == 'done'
+    assert database.get_book_by_id(2)['available_copies'] == 1
+
+
+def test_job_not_started_in_time_is_cancelled(library_db):
+    writer = GroupCommitWriter(database.DATABASE, database.get_db_connection, database._begin_books_write,
+                               database._commit_books_write, timeout=0.05)
+    running, release, ran = threading.Event(), threading.Event(), []
+
+    def slow(conn):
+        running.set()
+        release.wait()
+        return 'slow', ()
+
+    def late(conn):
+        ran.append(True)
+        return 'late', ()
+
+    thread = threading.Thread(target=writer.submit, args=(slow,))
+    thread.start()
+    running.wait()
+    assert writer.submit(late, (), 'timed out') == 'timed out'
+    release.set()
+    thread.join()
+    writer.close()
+    assert ran == []
+
+
+def test_pending_jobs_fail_when_the_writer_dies(writer, monkeypatch):
+    def broken(batch):
+        raise RuntimeError('writer bug')
+
+    monkeypatch.setattr(writer, '_collect', broken)
+    monkeypatch.setattr(threading, 'excepthook', lambda args: None)
+    assert writer.submit(lambda conn: ('done', ()), (), 'failed') == 'failed'
+    writer._thread.join()
+    assert writer.submit(lambda conn: ('done', ()), (), 'failed') == 'done'
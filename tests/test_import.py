@@ -0,0 +1,72 @@
+import io
+import json
+
+import catalog_import
+import database
+from library_service import import_books_to_catalog
+
+CSV_FEED = """title,author,isbn,total_copies
+Dune,Frank Herbert,9780441013593,2
+No Author,,9780000000001,1
+Dune Again,Frank Herbert,9780441013593,1
+Bad Copies,Someone,9780000000002,zero
+The Great Gatsby,F. Scott Fitzgerald,9780743273565,1
+Foundation,Isaac Asimov,9780553293357,3
+"""
+
+
+def test_import_csv_batches_and_rejects(library_db):
+    database.add_sample_data()
+    rejects = []
+    report = import_books_to_catalog(
+        catalog_import.iter_rows(io.StringIO(CSV_FEED), 'csv'), batch_size=2, on_reject=rejects.append
+    )
+    assert report == {'inserted': 2, 'rejected': 4}
+    assert [r['line'] for r in rejects] == [3, 4, 5, 6]
+    assert database.get_book_by_isbn('9780553293357')['available_copies'] == 3
+    assert database.get_book_by_isbn('9780441013593')['title'] == 'Dune'
+
+
+def test_cli_jsonl(library_db, tmp_path, capsys):
+    feed = tmp_path / 'feed.jsonl'
+    feed.write_text('\n'.join([
+        json.dumps({'title': 'Emma', 'author': 'Jane Austen', 'isbn': '9780141439587', 'total_copies': 4}),
+        'not json',
+        json.dumps({'title': 'Persuasion', 'author': 'Jane Austen', 'isbn': '9780141439686', 'total_copies': 1}),
+    ]))
+    rejects = tmp_path / 'rejects.jsonl'
+    assert catalog_import.main([str(feed), '--rejects', str(rejects)]) == 0
+    assert 'Imported 2 books, rejected 1 rows.' in capsys.readouterr().out
+    assert json.loads(rejects.read_text())['line'] == 2
+
+
+def test_import_endpoint(client):
+    response = client.post('/api/books/import', data={
+        'file': (io.BytesIO(CSV_FEED.encode()), 'feed.csv')
+    }, content_type='multipart/form-data')
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['inserted'] == 2
+    assert len(body['rejects']) == body['rejected'] == 4
+
+    response = client.post('/api/books/import', data=b'{"title": "Emma", "author": "Jane Austen", '
+                           b'"isbn": "9780141439587", "total_copies": 1}\n',
+                           content_type='application/x-ndjson')
+    assert response.get_json()['inserted'] == 1
+
+
+def test_import_endpoint_rejects_unreadable_feeds(client):
+    latin1 = ('title,author,isbn,total_copies\nDune,Frank Herbert,9780441013593,2\n'
+              'Les Misérables,Victor Hugo,9780140444308,1\n')
+    response = client.post('/api/books/import', data=latin1.encode('latin-1'), content_type='text/csv')
+    body = response.get_json()
+    assert response.status_code == 400
+    assert body['line'] == 3 and 'utf-8' in body['error']
+    assert body['inserted'] == 1
+
+    oversized = f'title,author,isbn,total_copies\n"{"x" * 200000}",Someone,9780000000009,1\n'
+    response = client.post('/api/books/import', data={
+        'file': (io.BytesIO(oversized.encode()), 'feed.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['line'] == 2
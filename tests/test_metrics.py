@@ -0,0 +1,42 @@
+import logging
+import re
+
+
+def metric_value(text, name, **labels):
+    for line in text.splitlines():
+        if line.startswith(name + '{') and all(f'{k}="{v}"' in line for k, v in labels.items()):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_metrics_report_requests_and_queries(client):
+    def snapshot():
+        text = client.get('/metrics').get_data(as_text=True)
+        return text, {
+            'catalog': metric_value(text, 'library_request_duration_seconds_count',
+                                    endpoint='catalog.catalog', status='200') or 0,
+            'borrow': metric_value(text, 'library_request_duration_seconds_count', blueprint='borrowing',
+                                   endpoint='borrowing.borrow_book', status='302') or 0,
+            'borrow_queries': metric_value(text, 'library_request_queries_sum',
+                                           endpoint='borrowing.borrow_book') or 0,
+        }
+
+    _, before = snapshot()
+    client.get('/catalog')
+    client.post('/borrow', data={'patron_id': '222222', 'book_id': '1'})
+    text, after = snapshot()
+
+    assert after['catalog'] - before['catalog'] == 1
+    assert after['borrow'] - before['borrow'] == 1
+    assert after['borrow_queries'] - before['borrow_queries'] >= 2
+    assert metric_value(text, 'library_query_duration_seconds_count', statement='UPDATE') >= 1
+    assert re.search(r'library_request_duration_seconds_bucket\{.*le="\+Inf"', text)
+    assert 'library_book_cache_hits_total' in text
+
+
+def test_slow_request_log_lists_queries(client, caplog):
+    client.application.config['SLOW_REQUEST_THRESHOLD'] = 0
+    with caplog.at_level(logging.WARNING, logger='library.slow_requests'):
+        client.get('/api/search?q=gatsby')
+    assert 'Slow request: GET /api/search?q=gatsby' in caplog.text
+    assert 'books_fts MATCH' in caplog.text
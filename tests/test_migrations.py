@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+import database
+
+HOT_QUERIES = {
+    'borrow_count': (
+        'SELECT COUNT(*) as count FROM borrow_records WHERE patron_id = ? AND return_date IS NULL',
+        ('123456',),
+    ),
+    'borrowed_books': (
+        '''SELECT br.*, b.title, b.author FROM borrow_records br JOIN books b ON br.book_id = b.id
+           WHERE br.patron_id = ? AND br.return_date IS NULL ORDER BY br.borrow_date''',
+        ('123456',),
+    ),
+    'return_lookup': (
+        '''SELECT * FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+           ORDER BY borrow_date LIMIT 1''',
+        ('123456', 3),
+    ),
+    'mark_returned': (
+        '''UPDATE borrow_records SET return_date = ?
+           WHERE patron_id = ? AND book_id = ? AND return_date IS NULL''',
+        ('2025-01-01', '123456', 3),
+    ),
+    'loans_for_book': ('SELECT COUNT(*) FROM borrow_records WHERE book_id = ?', (3,)),
+    'patron_history': (
+        '''SELECT br.* FROM borrow_records br WHERE br.patron_id = ? AND br.return_date IS NOT NULL
+           AND (br.return_date, br.id) < (?, ?) ORDER BY br.return_date DESC, br.id DESC LIMIT 20''',
+        ('123456', '2025-01-01', 10),
+    ),
+    'archived_history': (
+        '''SELECT * FROM borrow_records_archive br WHERE br.patron_id = ?
+           AND (br.return_date, br.id) < (?, ?) ORDER BY br.return_date DESC, br.id DESC LIMIT 20''',
+        ('123456', '2025-01-01', 10),
+    ),
+    'overdue_loans': (
+        'SELECT br.* FROM borrow_records br WHERE br.return_date IS NULL AND br.due_ts < ? ORDER BY br.due_ts',
+        (1735689600,),
+    ),
+}
+
+
+def query_plan(sql, params):
+    conn = database.get_db_connection()
+    plan = [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    conn.close()
+    return plan
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_queries_use_index(library_db, name):
+    plan = query_plan(*HOT_QUERIES[name])
+    borrow_steps = [step for step in plan if 'borrow_records' in step or ' br' in step]
+    assert borrow_steps, plan
+    for step in borrow_steps:
+        assert 'USING' in step and 'INDEX' in step, plan
+
+
+def test_upgrades_existing_database_in_place(tmp_path, monkeypatch):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+            author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL);
+        CREATE TABLE borrow_records (id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL, borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT);
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES ('Legacy Title', 'Old Author', '9780000000000', 1, 1);
+    ''')
+    conn.close()
+
+    database.close_db_connections()
+    monkeypatch.setattr(database, 'DATABASE', path)
+    database.init_database()
+    database.init_database()  # idempotent
+
+    conn = database.get_db_connection()
+    assert database.get_schema_version(conn) == database.SCHEMA_VERSION
+    indexes = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+    assert {'idx_borrow_records_open_patron', 'idx_borrow_records_book', 'idx_books_title_id'} <= indexes
+    assert [b['title'] for b in database.search_books('legacy', 'title')] == ['Legacy Title']
+    database.close_db_connections()
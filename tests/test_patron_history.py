@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import database
+from library_service import (
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+    get_patron_status_report, get_patron_history
+)
+
+
+def test_history_pages_cover_every_returned_loan(library_db, add_loans):
+    database.add_sample_data()
+    add_loans('777777', 45)
+    seen, cursor = [], None
+    while True:
+        page, cursor = get_patron_history('777777', cursor, limit=20)
+        seen += page
+        if cursor is None:
+            break
+    assert len(seen) == 45
+    assert len({loan['id'] for loan in seen}) == 45
+    assert seen == sorted(seen, key=lambda l: (l['return_date'], l['id']), reverse=True)
+
+
+def test_summary_tracks_borrow_and_return(library_db):
+    assert add_book_to_catalog('Summary Book', 'Author', '9783333333333', 3)[0]
+    book_id = database.get_book_by_isbn('9783333333333')['id']
+    assert borrow_book_by_patron('888888', book_id)[0]
+
+    # Make the loan 4 days overdue, then return it
+    conn = database.get_db_connection()
+    conn.execute('UPDATE borrow_records SET due_date = ? WHERE patron_id = ?',
+                 ((datetime.now() - timedelta(days=4)).isoformat(), '888888'))
+    conn.commit()
+    conn.close()
+    assert borrow_book_by_patron('888888', book_id)[0]
+    assert database.get_patron_borrow_count('888888') == 2
+    assert return_book_by_patron('888888', book_id)[0]
+
+    report = get_patron_status_report('888888')
+    assert report['books_borrowed_count'] == 1
+    assert report['lifetime_loans'] == 2
+    assert report['outstanding_fees'] == 2.0
+    assert [loan['fee_charged'] for loan in report['history']] == [2.0]
+    assert report['history_cursor'] is None
+
+
+def test_summary_maintained_for_sample_data(library_db):
+    database.add_sample_data()
+    assert database.get_patron_summary('123456')['active_count'] == 1
+    assert get_patron_status_report('000000')['books_borrowed_count'] == 0
+
+
+def test_history_endpoint(client, add_loans):
+    add_loans('999999', 3)
+    body = client.get('/api/patrons/999999/history?limit=2').get_json()
+    assert len(body['history']) == 2 and body['next']
+    body = client.get(f"/api/patrons/999999/history?limit=2&after={body['next']}").get_json()
+    assert len(body['history']) == 1 and body['next'] is None
+    assert client.get('/api/patrons/999999/history?after=bogus').status_code == 400
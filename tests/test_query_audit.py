@@ -0,0 +1,57 @@
+import pytest
+
+import database
+from benchmarks.seed import seed_database
+from query_audit import QueryAudit, explain, parameter_count, run_service_calls, table_scans
+
+
+@pytest.fixture
+def seeded_db(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'CACHE_SIZE', 0)
+    seed_database(3000, 20000, patrons=300)
+    conn = database.get_db_connection()
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    return library_db
+
+
+def test_service_calls_use_indexes_within_budget(seeded_db):
+    observer = database._query_observer
+    with QueryAudit() as audit:
+        run_service_calls(audit, [1, 2, 3], ['100001', '100002'])
+    report = audit.report()
+
+    assert report['scans'] == []
+    assert report['over_budget'] == []
+    assert set(audit.hot_paths) <= set(audit.max_queries)
+    assert database._query_observer is observer
+
+
+def test_reports_table_scan_and_over_budget(seeded_db):
+    def lookup_by_author(author):
+        conn = database.get_db_connection()
+        conn.execute('SELECT * FROM books WHERE author = ?', (author,)).fetchall()
+        conn.execute('SELECT * FROM books WHERE id = ?', (1,)).fetchall()
+        conn.close()
+
+    with QueryAudit({'lookup_by_author': 1}) as audit:
+        audit.call('lookup_by_author', lookup_by_author, 'A. Smith')
+    report = audit.report()
+
+    assert [(call, step) for call, _, step in report['scans']] == [('lookup_by_author', 'SCAN books')]
+    assert report['over_budget'] == [('lookup_by_author', 2, 1)]
+
+
+def test_limited_index_walk_is_not_a_scan(seeded_db):
+    conn = database.get_db_connection()
+    sql = 'SELECT * FROM books ORDER BY title, id LIMIT ?'
+    assert table_scans(sql, explain(conn, sql)) == []
+    sql = 'SELECT * FROM books ORDER BY title, id'
+    assert table_scans(sql, explain(conn, sql)) != []
+    assert explain(conn, 'BEGIN IMMEDIATE') == []
+    conn.close()
+
+
+def test_parameter_count_ignores_string_literals():
+    assert parameter_count("SELECT * FROM books WHERE title LIKE ? ESCAPE '?' AND id = ?") == 2
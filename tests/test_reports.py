@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import database
+import reports
+
+TODAY = date(2025, 3, 31)
+
+
+def seed_loans(loans):
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Report Book', 'Author', '9780000000000', 10, 10)")
+    conn.executemany(
+        'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) '
+        'VALUES (?, 1, ?, ?, ?)',
+        [(patron, datetime(2025, 1, 1).isoformat(), due.isoformat(), returned)
+         for patron, due, returned in loans]
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_overdue_report_matches_python_fee_rules(library_db):
+    seed_loans([
+        ('111111', datetime(2025, 3, 30, 23, 59), None),    # 1 day late
+        ('111111', datetime(2025, 3, 1, 8, 0), None),       # 30 days late, capped
+        ('222222', datetime(2025, 3, 21), None),            # 10 days late
+        ('222222', datetime(2025, 3, 31, 9, 0), None),      # due today
+        ('333333', datetime(2025, 2, 1), '2025-02-02'),     # returned
+    ])
+    loans = [json.loads(line) for line in reports.stream_overdue_report('loans', 'ndjson', TODAY)]
+    assert [(l['patron_id'], l['days_overdue'], l['fee_amount']) for l in loans] == [
+        ('111111', 30, 15.0), ('222222', 10, 5.0), ('111111', 1, 0.5)
+    ]
+
+    patrons = list(csv.DictReader(io.StringIO(''.join(
+        reports.stream_overdue_report('patrons', 'csv', TODAY)))))
+    assert [(p['patron_id'], p['overdue_count'], float(p['total_late_fees'])) for p in patrons] == [
+        ('111111', '2', 15.5), ('222222', '1', 5.0)
+    ]
+
+
+def test_overdue_report_endpoint(client):
+    response = client.get('/api/reports/overdue?format=csv&view=patrons')
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert response.get_data(as_text=True).startswith('patron_id,overdue_count')
+    assert client.get('/api/reports/overdue?view=nope').status_code == 400
+    assert client.get('/api/reports/overdue?date=yesterday').status_code == 400
+
+
+def test_cli_writes_file(library_db, tmp_path):
+    seed_loans([('111111', datetime(2025, 3, 1), None)])
+    out = tmp_path / 'overdue.ndjson'
+    assert reports.main(['overdue', '--date', '2025-03-31', '-o', str(out)]) == 0
+    assert json.loads(out.read_text())['fee_amount'] == 15.0
+
+
+def test_due_ts_filled_for_text_only_writers(library_db):
+    seed_loans([('333333', datetime(2025, 3, 30, 12, 0), None)])
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT due_ts FROM borrow_records WHERE patron_id = '333333'").fetchone()
+    assert row['due_ts'] == database.to_timestamp(datetime(2025, 3, 30, 12, 0))
+    conn.execute("UPDATE borrow_records SET due_date = ? WHERE patron_id = '333333'",
+                 (datetime(2025, 3, 1).isoformat(),))
+    row = conn.execute("SELECT due_ts FROM borrow_records WHERE patron_id = '333333'").fetchone()
+    conn.commit()
+    conn.close()
+    assert row['due_ts'] == database.to_timestamp(datetime(2025, 3, 1))
+
+
+def test_borrowed_books_overdue_computed_in_sql(library_db):
+    seed_loans([
+        ('444444', datetime(2025, 3, 30, 23, 59), None),
+        ('444444', datetime(2025, 3, 31, 18, 0), None),
+        ('444444', datetime(2025, 4, 10), None),
+    ])
+    books = sorted(database.get_patron_borrowed_books('444444', now=datetime(2025, 3, 31, 12, 0)),
+                   key=lambda b: b['due_date'])
+    assert [(b['is_overdue'], b['days_overdue']) for b in books] == [(True, 1), (False, 0), (False, 0)]
+    assert set(books[0]) == {'book_id', 'title', 'author', 'borrow_date', 'due_date',
+                             'is_overdue', 'days_overdue'}
+    assert books[0]['due_date'] == datetime(2025, 3, 30, 23, 59)
@@ -0,0 +1,74 @@
+import database
+from library_service import add_book_to_catalog, search_books_in_catalog
+
+
+def seed(books):
+    for i, (title, author) in enumerate(books):
+        assert add_book_to_catalog(title, author, f'{9780000000000 + i}', 1)[0]
+
+
+def substring_matches(term, field):
+    return {b['id'] for b in database.get_all_books() if term.lower() in b[field].lower()}
+
+
+def test_search_matches_substring_semantics(library_db):
+    seed([
+        ('The Great Gatsby', 'F. Scott Fitzgerald'),
+        ('Gatsby Revisited', 'Anne Scott'),
+        ('Great Expectations', 'Charles Dickens'),
+        ('100% Pure', 'Under_Score'),
+    ])
+    for term, field in [('gatsby', 'title'), ('atsb', 'title'), ('GREAT', 'title'),
+                        ('scott', 'author'), ('ck', 'author'), ('e', 'title'),
+                        ('0%', 'title'), ('r_s', 'author'), ('missing', 'title')]:
+        ids = {b['id'] for b in search_books_in_catalog(term, field)}
+        assert ids == substring_matches(term, field), (term, field)
+
+
+def test_short_non_ascii_terms_fold_case(library_db):
+    seed([
+        ('École du Monde', 'Émile Zola'),
+        ('Die Räuber', 'Friedrich Schiller'),
+        ('Les Écrivains', 'Ǆemal Bijedić'),
+        ('ÖL UND WASSER', 'ǅenan Ǆeko'),
+    ])
+    for term, field in [('éc', 'title'), ('ÉC', 'title'), ('ä', 'title'), ('öl', 'title'),
+                        ('ǆe', 'author'), ('ǅe', 'author'), ('é', 'author'),
+                        ('école', 'title'), ('ǆemal', 'author')]:
+        ids = {b['id'] for b in search_books_in_catalog(term, field)}
+        assert ids == substring_matches(term, field), (term, field)
+        assert ids, (term, field)
+
+
+def test_search_ranks_and_pages(library_db):
+    seed([(f'Volume {i} of Gatsby', 'Author') for i in range(10)])
+    everything = search_books_in_catalog('gatsby', 'title')
+    page = search_books_in_catalog('gatsby', 'title', limit=3, offset=3)
+    assert len(everything) == 10
+    assert page == everything[3:6]
+
+
+def test_index_tracks_updates_and_deletes(library_db):
+    seed([('Old Title', 'Someone')])
+    conn = database.get_db_connection()
+    conn.execute("UPDATE books SET title = 'New Title' WHERE isbn = '9780000000000'")
+    conn.commit()
+    assert search_books_in_catalog('old title', 'title') == []
+    assert len(search_books_in_catalog('new title', 'title')) == 1
+    conn.execute('DELETE FROM books')
+    conn.commit()
+    conn.close()
+    assert search_books_in_catalog('title', 'title') == []
+
+
+def test_isbn_search_is_exact(library_db):
+    seed([('A Book', 'Someone')])
+    assert len(search_books_in_catalog('9780000000000', 'isbn')) == 1
+    assert search_books_in_catalog('978000000000', 'isbn') == []
+
+
+def test_api_search_limit_offset(client):
+    response = client.get('/api/search?q=the&type=title&limit=1')
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 1
+    assert client.get('/api/search?q=the&offset=-1').status_code == 400
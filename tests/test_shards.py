@@ -0,0 +1,388 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from shards import allocate_book_ids, shard_for_book, shard_for_isbn, trigram_count
+from library_service import (MAX_BORROWED_BOOKS, add_book_to_catalog, borrow_book_by_patron,
+                             search_books_in_catalog, get_patron_status_report)
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    """Split the catalog across three fresh shard files."""
+    database.close_db_connections()
+    paths = tuple(str(tmp_path / f'branch{index}.db') for index in range(SHARD_COUNT))
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'unused.db'))
+    monkeypatch.setattr(database, 'SHARDS', paths)
+    database.init_database()
+    yield paths
+    database.close_db_connections()
+
+
+def add_books(count, title='River Book'):
+    books = [(f'{title} {i:03d}', f'Author {i % 7}', f'978{i:010d}', 2) for i in range(count)]
+    assert database.insert_books(books) == set()
+    return books
+
+
+def shard_ids(path):
+    conn = sqlite3.connect(path)
+    ids = [row[0] for row in conn.execute('SELECT id FROM books')]
+    conn.close()
+    return ids
+
+
+def test_allocate_book_ids():
+    assert allocate_book_ids(None, 0, 3, 2) == [3, 6]
+    assert allocate_book_ids(None, 2, 3, 2) == [2, 5]
+    assert allocate_book_ids(7, 2, 3, 1) == [8]
+
+
+def test_books_are_placed_by_isbn_and_routed_by_id(shards):
+    books = add_books(30)
+    assert add_book_to_catalog('Lone Title', 'Someone', '9781111111111', 1)[0]
+    assert not add_book_to_catalog('Duplicate', 'Someone', '9781111111111', 1)[0]
+
+    for index, path in enumerate(shards):
+        assert shard_ids(path) and all(book_id % SHARD_COUNT == index for book_id in shard_ids(path))
+    for title, _, isbn, _ in books:
+        book = database.get_book_by_isbn(isbn)
+        assert book['title'] == title
+        assert book['id'] in shard_ids(shards[shard_for_isbn(isbn, SHARD_COUNT)])
+        assert database.get_book_by_id(book['id']) == book
+    assert database.get_book_by_id(10 ** 6) is None
+
+
+def test_catalog_reads_merge_in_stable_order(shards):
+    add_books(40)
+    everything = database.get_all_books()
+    assert [book['title'] for book in everything] == sorted(book['title'] for book in everything)
+    assert list(database.iter_books(batch_size=7)) == everything
+
+    pages, after = [], None
+    while True:
+        page = database.get_books_page(after, 9)
+        if not page:
+            break
+        pages += page
+        after = (page[-1]['title'], page[-1]['id'])
+    assert pages == everything
+    assert [book['id'] for book in database.iter_books_by_id(batch_size=6)] == \
+        sorted(book['id'] for book in everything)
+    assert database.get_catalog_watermark() == tuple(
+        database._route(index, database.get_catalog_watermark) for index in range(SHARD_COUNT))
+
+
+def test_search_fans_out_and_pages_consistently(shards):
+    add_books(40)
+    results = search_books_in_catalog('river', 'title')
+    assert len(results) == 40
+    assert {shard_for_book(book['id'], SHARD_COUNT) for book in results} == {0, 1, 2}
+    assert search_books_in_catalog('river', 'title') == results
+    paged = [book for offset in range(0, 40, 15)
+             for book in search_books_in_catalog('river', 'title', 15, offset)]
+    assert paged == results
+    assert [book['title'] for book in search_books_in_catalog('Bo', 'title', 5)] == \
+        [f'River Book {i:03d}' for i in range(5)]
+
+
+def test_sharded_search_ranks_like_one_database(shards, tmp_path, monkeypatch):
+    from benchmarks.seed import book_rows
+    books = [(title, author, isbn, copies) for title, author, isbn, copies, _ in book_rows(600, 1)]
+    books += [(f'River {"river " * (i % 4)}{"x" * (i * 7 % 40)} {i}', f'Rivera {i}', f'97911{i:08d}', 1)
+              for i in range(60)]
+    assert database.insert_books(books) == set()
+    queries = [('river', 'title', None, 0), ('river', 'title', 10, 5), ('riv', 'author', None, 0),
+               ('the', 'title', 25, 0), ('orchard 1', 'title', None, 0), ('ch', 'author', 10, 0)]
+    sharded = [[book['title'] for book in database.search_books(*query)] for query in queries]
+
+    database.close_db_connections()
+    monkeypatch.setattr(database, 'SHARDS', ())
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'single.db'))
+    database.init_database()
+    assert database.insert_books(books) == set()
+    single = [[book['title'] for book in database.search_books(*query)] for query in queries]
+    assert all(single)
+    assert sharded == single
+
+
+def test_search_totals_track_book_writes(shards):
+    add_books(20)
+    assert add_book_to_catalog('Ça', 'Æsop Ōe', '9781111111111', 1)[0]
+    conn = sqlite3.connect(shards[0])
+    conn.execute("UPDATE books SET title = title || ' Revisited' WHERE id % 2 = 0")
+    conn.execute('DELETE FROM books WHERE id = (SELECT MIN(id) FROM books)')
+    conn.commit()
+    conn.close()
+    for index in range(SHARD_COUNT):
+        books = database._route(index, database.get_all_books)
+        assert database._route(index, database._search_totals) == (
+            len(books), sum(trigram_count(book['title']) + trigram_count(book['author']) for book in books))
+
+
+@pytest.fixture
+def slow_shard(shards, monkeypatch):
+    """Make shard 1 answer searches after 0.5s, past a 0.1s SHARD_TIMEOUT."""
+    search_rows = database._search_rows
+
+    def slow_shard_one(*args):
+        if database._local.shard == 1:
+            time.sleep(0.5)
+        return search_rows(*args)
+
+    monkeypatch.setattr(database, '_search_rows', slow_shard_one)
+    monkeypatch.setattr(database, 'SHARD_TIMEOUT', 0.1)
+    return 1
+
+
+def test_search_returns_partial_results_when_a_shard_times_out(slow_shard):
+    add_books(40)
+    missing = []
+    start = time.perf_counter()
+    results = search_books_in_catalog('river', 'title', missing=missing)
+    assert time.perf_counter() - start < 0.4
+    assert missing == [1]
+    assert results and all(shard_for_book(book['id'], SHARD_COUNT) != 1 for book in results)
+
+
+def test_partial_api_results_are_flagged_and_not_cached(slow_shard):
+    from app import create_app
+    add_books(40)
+    client = create_app(init_db=False).test_client()
+    response = client.get('/api/search?q=river&type=title')
+    assert response.get_json()['missing_shards'] == [1]
+    assert 'no-store' in response.headers['Cache-Control']
+    assert 'ETag' not in response.headers
+    html = client.get('/search?q=river&type=title')
+    assert 'results may be incomplete' in html.get_data(as_text=True)
+    assert 'ETag' not in html.headers
+
+
+def test_slow_query_is_interrupted_on_timeout(shards, monkeypatch):
+    add_books(40)
+    trigram_bm25 = database.trigram_bm25
+
+    def slow_bm25(*args):
+        time.sleep(0.02)
+        return trigram_bm25(*args)
+
+    monkeypatch.setattr(database, 'trigram_bm25', slow_bm25)
+    monkeypatch.setattr(database, 'SHARD_TIMEOUT', 0.1)
+    database.close_db_connections()  # new connections register slow_bm25
+    statements = []
+    monkeypatch.setattr(database, '_query_observer', lambda sql, seconds: statements.append(sql))
+
+    missing = []
+    start = time.perf_counter()
+    assert search_books_in_catalog('river', 'title', missing=missing) == []
+    database.close_db_connections()  # waits for the workers
+    assert missing == [0, 1, 2]
+    assert time.perf_counter() - start < 0.4  # ~0.27s per shard if not interrupted
+    assert not [sql for sql in statements if 'instr(' in sql]  # no fallback scan
+
+
+def test_change_feed_merges_shards(shards):
+    add_books(10)
+    since = database.get_catalog_watermark()
+    with pytest.raises(ValueError):
+        database.get_book_changes(0)
+    book_ids = [book['id'] for book in database.get_books_after_id(0, 10)]
+    for book_id in book_ids[:6]:
+        assert database.update_book_availability(book_id, -1)
+    feed, position = [], since
+    while True:
+        changes = database.get_book_changes(position, 4)
+        feed += changes
+        if len(changes) < 4:
+            break
+        position = changes[-1][0]
+    assert sorted(book_id for _, book_id, _ in feed) == sorted(book_ids[:6])
+    assert [(shard_for_book(book_id, SHARD_COUNT), seq[shard_for_book(book_id, SHARD_COUNT)])
+            for seq, book_id, _ in feed] == sorted(
+        (shard_for_book(book_id, SHARD_COUNT), seq[shard_for_book(book_id, SHARD_COUNT)])
+        for seq, book_id, _ in feed)
+    assert feed[-1][0] == database.get_catalog_watermark()
+
+
+def test_api_syncs_a_sharded_catalog(shards):
+    from app import create_app
+    add_books(10)
+    client = create_app(init_db=False).test_client()
+    seen, token = [], None
+    while True:
+        data = client.get('/api/books?limit=4' + (f'&after={token}' if token else '')).get_json()
+        seen += [book['id'] for book in data['books']]
+        token = data['next']
+        if token is None:
+            break
+    assert seen == sorted(book['id'] for book in database.get_all_books())
+    watermark = data['watermark']
+    export = client.get('/api/books/export')
+    assert export.status_code == 200 and export.headers['X-Catalog-Watermark'] == watermark
+
+    assert database.update_book_availability(seen[0], -1)
+    conn = sqlite3.connect(shards[shard_for_book(seen[1], SHARD_COUNT)])
+    conn.execute('DELETE FROM books WHERE id = ?', (seen[1],))
+    conn.commit()
+    conn.close()
+    books, deleted = [], []
+    while True:
+        data = client.get(f'/api/books?since={watermark}&limit=1').get_json()
+        books += [book['id'] for book in data['books']]
+        deleted += data['deleted']
+        watermark = data['watermark']
+        if not data['has_more']:
+            break
+    assert books == [seen[0]] and deleted == [seen[1]]
+    assert client.get(f'/api/books?since={watermark}').get_json()['books'] == []
+    assert client.get('/api/books?since=0').status_code == 400
+    assert client.get('/api/books?since=bogus').status_code == 400
+
+
+def test_borrow_limit_and_patron_reads_span_shards(shards):
+    add_books(12)
+    books = database.get_books_after_id(0, 12)
+    borrowed = []
+    for book in books:
+        if len(borrowed) == 5:
+            break
+        assert borrow_book_by_patron('654321', book['id'])[0]
+        borrowed.append(book['id'])
+    assert len({shard_for_book(book_id, SHARD_COUNT) for book_id in borrowed}) > 1
+
+    success, message = borrow_book_by_patron('654321', books[5]['id'])
+    assert not success and 'limit' in message.lower()
+    assert database.get_patron_summary('654321')['active_count'] == 5
+    assert sorted(record['book_id'] for record in database.get_patron_borrowed_books('654321')) == \
+        sorted(borrowed)
+
+    results = database.return_books('654321', borrowed[::-1] + [books[6]['id']], datetime.now())
+    assert [book_id for book_id, _, _ in results] == borrowed[::-1] + [books[6]['id']]
+    assert [status for _, status, _ in results] == ['ok'] * 5 + ['not_borrowed']
+    assert database.get_book_by_id(borrowed[0])['available_copies'] == 2
+    report = get_patron_status_report('654321')
+    assert report['books_borrowed_count'] == 0
+    assert report['lifetime_loans'] == 5
+    assert len(report['history']) == 5
+
+
+def test_concurrent_borrows_respect_patron_limit_across_shards(shards, monkeypatch):
+    add_books(12)
+    books = database.get_books_after_id(0, 12)
+    loans_on_other_shards = database._loans_on_other_shards
+
+    def slow_count(*args):
+        count = loans_on_other_shards(*args)
+        time.sleep(0.02)  # let the other borrowers check the limit before this one borrows
+        return count
+
+    monkeypatch.setattr(database, '_loans_on_other_shards', slow_count)
+    barrier = threading.Barrier(len(books))
+    results = [None] * len(books)
+
+    def borrow(i, book_id):
+        barrier.wait()
+        results[i] = borrow_book_by_patron('300000', book_id)
+
+    threads = [threading.Thread(target=borrow, args=(i, book['id'])) for i, book in enumerate(books)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(success for success, _ in results) == MAX_BORROWED_BOOKS
+    assert database.get_patron_summary('300000')['active_count'] == MAX_BORROWED_BOOKS
+    assert database.borrow_books('300000', [books[0]['id']], datetime.now(), datetime.now(), 10)[0][1] == \
+        database.BORROW_OK
+
+
+def test_failed_lock_release_keeps_a_committed_borrow(shards, monkeypatch):
+    add_books(3)
+    book_id = database.get_books_after_id(0, 1)[0]['id']
+
+    def locked(*args):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(database, '_drop_patron_lock', locked)
+    monkeypatch.setattr(database, 'PATRON_LOCK_TTL', 0.05)
+    assert borrow_book_by_patron('300001', book_id)[0]
+    assert database.get_patron_summary('300001')['active_count'] == 1
+    time.sleep(0.1)  # the stale lock row expires
+    status, = [status for _, status, _ in database.borrow_books(
+        '300001', [book_id], datetime.now(), datetime.now() + timedelta(days=14), 5)]
+    assert status == database.BORROW_OK
+
+
+def test_overdue_reports_merge_shards(shards):
+    add_books(9)
+    past = datetime.now().replace(microsecond=0) - timedelta(days=40)
+    for book in database.get_books_after_id(0, 9):
+        due = past + timedelta(days=book['id'])
+        status, _ = database.borrow_book(f'p{book["id"] % 2}', book['id'], past, due, 10)
+        assert status == database.BORROW_OK
+    today = datetime.now().date().isoformat()
+    loans = list(database.iter_overdue_loans(today, 0.5, 15.0))
+    assert [loan['book_id'] for loan in loans] == sorted(book['id'] for book in database.get_all_books())
+    fees = list(database.iter_patron_late_fees(today, 0.5, 15.0))
+    assert [row['patron_id'] for row in fees] == ['p0', 'p1']
+    assert sum(row['overdue_count'] for row in fees) == 9
+
+
+def test_overdue_reports_stream_from_shards(shards, monkeypatch):
+    add_books(30)
+    past = datetime.now() - timedelta(days=40)
+    for book in database.get_books_after_id(0, 30):
+        database.borrow_book(f'p{book["id"]:03d}', book['id'], past, past + timedelta(days=14), 10)
+    produced = []
+    iter_overdue_loans = database.iter_overdue_loans
+
+    def counting(*args):
+        for row in iter_overdue_loans(*args):
+            if database._local.shard is not None:
+                produced.append(row)
+            yield row
+
+    monkeypatch.setattr(database, 'iter_overdue_loans', counting)
+    rows = database.iter_overdue_loans(datetime.now().date().isoformat(), 0.5, 15.0, 2)
+    next(rows)
+    assert len(produced) <= SHARD_COUNT + 1  # the merge pulls rows only as it needs them
+    assert len(list(rows)) == 29
+    assert len(produced) == 30
+
+
+def test_import_reports_books_of_a_failed_shard(shards, monkeypatch):
+    from app import create_app
+    allocate_book_ids = database._allocate_book_ids
+
+    def fail_on_shard_one(*args):
+        if database._local.shard == 1:
+            raise sqlite3.OperationalError('disk I/O error')
+        return allocate_book_ids(*args)
+
+    monkeypatch.setattr(database, '_allocate_book_ids', fail_on_shard_one)
+    feed = ''.join(f'{{"title": "Book {i}", "author": "Someone", "isbn": "978{i:010d}", "total_copies": 1}}\n'
+                   for i in range(12))
+    client = create_app(init_db=False).test_client()
+    body = client.post('/api/books/import', data=feed, content_type='application/x-ndjson').get_json()
+
+    failed = {f'978{i:010d}' for i in range(12) if shard_for_isbn(f'978{i:010d}', SHARD_COUNT) == 1}
+    assert failed and body['inserted'] == len(database.get_all_books()) == 12 - len(failed)
+    assert {reject['isbn'] for reject in body['rejects']} == failed
+    assert all('Database error' in reject['error'] for reject in body['rejects'])
+
+
+def test_app_serves_a_sharded_catalog(shards):
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    assert 'The Great Gatsby' in client.get('/catalog').get_data(as_text=True)
+    payload = client.get('/api/search?q=gatsby&type=title').get_json()
+    assert payload['count'] == 1 and 'missing_shards' not in payload
+    assert database.get_book_by_isbn('9780451524935')['available_copies'] == 0
+    assert database.suggest_books('to k', 'title') == ['To Kill a Mockingbird']
@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+
+import database
+from catalog_snapshot import CatalogSnapshot
+from library_service import (add_book_to_catalog, borrow_book_by_patron,
+                             search_books_in_catalog)
+
+
+@pytest.fixture
+def snapshot_db(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'CATALOG_SNAPSHOT', True)
+    database.add_sample_data()
+    return library_db
+
+
+def sql_books(db_path, sql='SELECT * FROM books ORDER BY title, id', params=()):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute(sql, params)]
+    conn.close()
+    return rows
+
+
+def test_snapshot_matches_sql(snapshot_db):
+    assert database.get_all_books() == sql_books(snapshot_db)
+    assert list(database.iter_books(batch_size=2)) == sql_books(snapshot_db)
+    page = database.get_books_page(('1984', 3), 1)
+    assert [book['title'] for book in page] == ['The Great Gatsby']
+
+
+def test_search_reads_from_snapshot(snapshot_db):
+    snapshot = database.get_catalog_snapshot()
+    assert [b['title'] for b in search_books_in_catalog('GREAT', 'title')] == ['The Great Gatsby']
+    assert [b['author'] for b in search_books_in_catalog('lee', 'author')] == ['Harper Lee']
+    assert search_books_in_catalog('o', 'title', limit=1, offset=1) == \
+        sql_books(snapshot_db, "SELECT * FROM books WHERE title LIKE '%o%' ORDER BY title, id LIMIT 1 OFFSET 1")
+    assert snapshot.full_loads == 1
+
+
+def test_incremental_refresh(snapshot_db):
+    snapshot = database.get_catalog_snapshot()
+    assert add_book_to_catalog('A New Book', 'Harper Lee', '9783333333333', 2)[0]
+    assert borrow_book_by_patron('654321', 1)[0]
+    assert database.get_all_books() == sql_books(snapshot_db)
+    assert snapshot.full_loads == 1 and snapshot.refreshes >= 1
+
+    # Changes made by another connection, including a retitle and a delete
+    conn = sqlite3.connect(snapshot_db)
+    conn.execute("UPDATE books SET title = 'Zebra' WHERE id = 2")
+    conn.execute('DELETE FROM books WHERE id = 3')
+    conn.commit()
+    conn.close()
+    assert database.get_all_books() == sql_books(snapshot_db)
+    assert snapshot.full_loads == 1
+
+    # Interned authors are shared between books
+    slots = [snapshot._slots[book['id']] for book in database.get_all_books()
+             if book['author'] == 'Harper Lee']
+    assert len(slots) == 2
+    assert snapshot.authors[slots[0]] is snapshot.authors[slots[1]]
+
+
+def test_bulk_changes_resort_once(snapshot_db):
+    snapshot = database.get_catalog_snapshot()
+    database.insert_books([(f'Bulk {i:03d}', 'Author', f'97840000{i:05d}', 1) for i in range(50)])
+    assert database.get_all_books() == sql_books(snapshot_db)
+    assert database.get_books_page(('Bulk 010', 0), 3)[0]['title'] == 'Bulk 010'
+
+
+def test_deleted_slots_are_reused(library_db):
+    database.add_sample_data()
+    snapshot = CatalogSnapshot(library_db)
+    snapshot.refresh()
+    conn = sqlite3.connect(library_db)
+    conn.execute('DELETE FROM books WHERE id = 1')
+    conn.commit()
+    snapshot.refresh()
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Reused', 'Someone', '9785555555555', 1, 1)")
+    conn.commit()
+    conn.close()
+    snapshot.refresh()
+    assert len(snapshot.ids) == 3
+    assert [book['title'] for book in snapshot.get_all_books()] == ['1984', 'Reused', 'To Kill a Mockingbird']
+    snapshot.close()
@@ -0,0 +1,68 @@
+import sqlite3
+import time
+
+import database
+from library_service import add_book_to_catalog, get_search_suggestions
+from suggest import PrefixIndex
+
+
+def test_prefix_index_orders_whole_value_matches_first():
+    index = PrefixIndex()
+    for value in ['The Great Gatsby', 'Great Expectations', 'The Great Gatsby', 'Grapes of Wrath']:
+        index.add(value)
+    assert index.complete('gre', 10) == ['Great Expectations', 'The Great Gatsby']
+    assert index.complete('  THE   gr', 10) == ['The Great Gatsby']
+    assert index.complete('gr', 1) == ['Grapes of Wrath']
+    assert index.complete('', 10) == []
+
+    # Values are reference counted
+    index.remove('The Great Gatsby')
+    assert index.complete('gatsby', 10) == ['The Great Gatsby']
+    index.remove('The Great Gatsby')
+    assert index.complete('gatsby', 10) == []
+    assert len(index) == 2
+
+
+def test_suggestions_from_catalog(library_db):
+    database.add_sample_data()
+    assert get_search_suggestions('kill', 'title') == ['To Kill a Mockingbird']
+    assert get_search_suggestions('f', 'author') == ['F. Scott Fitzgerald']
+    assert get_search_suggestions('lee', 'author') == ['Harper Lee']
+    assert get_search_suggestions('lee', 'isbn') == []
+
+
+def test_local_inserts_indexed_without_sql(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'SUGGEST_REFRESH_INTERVAL', 60.0)
+    database.add_sample_data()
+    assert get_search_suggestions('dune', 'title') == []
+    queries = []
+    database.set_query_observer(lambda sql, seconds: queries.append(sql))
+    try:
+        assert add_book_to_catalog('Dune', 'Frank Herbert', '9780441172719', 2)[0]
+        queries.clear()
+        assert get_search_suggestions('dun', 'title') == ['Dune']
+        assert get_search_suggestions('herb', 'author') == ['Frank Herbert']
+        assert queries == []
+    finally:
+        database.set_query_observer(None)
+
+
+def test_changes_from_other_processes_after_interval(library_db, monkeypatch):
+    monkeypatch.setattr(database, 'SUGGEST_REFRESH_INTERVAL', 0.05)
+    database.add_sample_data()
+    assert get_search_suggestions('1984', 'title') == ['1984']
+    conn = sqlite3.connect(library_db)
+    conn.execute("UPDATE books SET title = 'Nineteen Eighty-Four' WHERE id = 3")
+    conn.commit()
+    conn.close()
+    time.sleep(0.1)
+    assert get_search_suggestions('1984', 'title') == []
+    assert get_search_suggestions('eighty', 'title') == ['Nineteen Eighty-Four']
+
+
+def test_suggest_endpoint(client):
+    response = client.get('/api/suggest?q=the&type=title')
+    assert response.status_code == 200
+    assert response.get_json() == {'q': 'the', 'type': 'title', 'suggestions': ['The Great Gatsby']}
+    assert client.get('/api/suggest?q=the&type=isbn').status_code == 400
+    assert client.get('/api/suggest?q=&type=author').get_json()['suggestions'] == []
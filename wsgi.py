@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers.
+
+The schema and sample data are set up once by the server's master process
+(see gunicorn.conf.py), so workers skip that step:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+from app import create_app
+
+app = create_app(init_db=False)
+app.config['ADMISSION_CONTROL'] = os.environ.get('LIBRARY_ADMISSION_CONTROL', '1') == '1'